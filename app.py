@@ -1,16 +1,50 @@
 # app.py
 import os
 import json
+import logging
+import atexit
+import contextlib
+import cProfile
+import pstats
+import io
+import itertools
+import marshal
+import queue
+from collections import OrderedDict, deque
 import threading
 import time
 import re
+import random
 import base64
+import bisect
+from array import array
+import sqlite3
+import tempfile
+import click
+import hashlib
 import requests
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort, send_from_directory
+try:
+    import orjson  # optional fast JSON backend
+except ImportError:
+    orjson = None
+try:
+    import numpy as np  # optional, for the daily-progress matrix
+except ImportError:
+    np = None
+try:
+    import fcntl
+except ImportError:  # non-POSIX (local dev on Windows)
+    fcntl = None
+try:
+    from gevent import monkey as gevent_monkey  # set when served by gunicorn's gevent worker
+except ImportError:
+    gevent_monkey = None
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, abort, send_from_directory
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
 
@@ -110,7 +144,353 @@ def safe_int(x, default=0):
         except Exception:
             return default
 
+# ---------------------- Cooperative blocking (gevent workers) ----------------------
+# Under the gevent worker every request and SSE stream is a greenlet on one event
+# loop, so nothing may wait inside the kernel or SQLite: flock and SQLite's write
+# lock are polled non-blocking with a cooperative sleep in between, and long CPU
+# loops (the contact scan) yield now and then. Under gthread these are plain calls.
+COOPERATIVE_POLL_MAX = 0.05  # seconds between lock polls
+
+def cooperative():
+    """True when threading is monkey-patched by gevent (greenlets share one OS thread)."""
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+def flock_exclusive(fd):
+    if not cooperative():
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    delay = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(delay)  # gevent's sleep: other greenlets run meanwhile
+            delay = min(delay * 2, COOPERATIVE_POLL_MAX)
+
+def cooperative_yield():
+    if cooperative():
+        time.sleep(0)
+
+# ---------------------- Metrics (Prometheus text format) ----------------------
+# In-process counters and latency histograms for the sync phases, load_json /
+# save_json and the GitHub / People API calls, served on /metrics. Each gunicorn
+# worker keeps its own registry; Prometheus tells them apart by instance.
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+
+METRIC_HELP = {
+    "sync_runs_total": ("counter", "Contact syncs by mode and outcome."),
+    "sync_duration_seconds": ("histogram", "Wall time of a whole contact sync."),
+    "sync_phase_seconds": ("histogram", "Wall time of each contact sync phase."),
+    "sync_pages_fetched_total": ("counter", "People API connection pages fetched."),
+    "sync_contacts_scanned_total": ("counter", "Contacts scanned by the classifier loop."),
+    "sync_contacts_changed_total": ("counter", "Contacts whose labels changed."),
+    "sync_matches_total": ("counter", "Contacts counted per group and label."),
+    "classify_cache_hits_total": ("counter", "Contacts whose labels came from the classification cache."),
+    "classify_cache_misses_total": ("counter", "Contacts that had to be classified."),
+    "people_request_seconds": ("histogram", "Latency of People API connections.list calls."),
+    "github_request_seconds": ("histogram", "Latency of GitHub API calls, retries included."),
+    "github_requests_total": ("counter", "GitHub API responses by method and status."),
+    "github_flush_seconds": ("histogram", "Wall time of a batched GitHub commit."),
+    "api_errors_total": ("counter", "Failed outbound API calls by API and reason."),
+    "json_load_seconds": ("histogram", "load_json latency per file."),
+    "json_save_seconds": ("histogram", "save_json latency per file."),
+    "json_cache_hits_total": ("counter", "load_json calls served from the read-through cache."),
+    "json_cache_misses_total": ("counter", "load_json calls that read and parsed the file."),
+    "http_request_seconds": ("histogram", "Wall time of each request up to the response headers."),
+    "http_request_json_seconds": ("histogram", "Time each request spent in load_json/save_json."),
+    "http_request_outbound_calls_total": ("counter", "Outbound HTTP calls made while serving requests."),
+    "sse_rejected_total": ("counter", "Live-update streams refused with 503 (worker at its subscriber cap)."),
+}
+
+_metrics_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+def _metric_labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc_counter(name, value=1, **labels):
+    key = (name, _metric_labels(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    key = (name, _metric_labels(labels))
+    with _metrics_lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+        h[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+        h[-1] += seconds
+
+@contextlib.contextmanager
+def timed(name, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+def _metric_line(name, labels, value):
+    if labels:
+        body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                        for k, v in labels)
+        name = f"{name}{{{body}}}"
+    return f"{name} {value:.6g}" if isinstance(value, float) else f"{name} {value}"
+
+def render_metrics(gauges=None):
+    """Prometheus text exposition (version 0.0.4) of every metric recorded so far, plus `gauges`."""
+    with _metrics_lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    by_name = {}
+    for (name, labels), value in counters:
+        by_name.setdefault(name, []).append(_metric_line(name, labels, value))
+    for (name, labels), h in histograms:
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, n in zip(METRICS_BUCKETS + ("+Inf",), h[:-1]):
+            cumulative += n
+            lines.append(_metric_line(f"{name}_bucket", labels + (("le", str(bound)),), cumulative))
+        lines.append(_metric_line(f"{name}_sum", labels, h[-1]))
+        lines.append(_metric_line(f"{name}_count", labels, cumulative))
+    out = []
+    for name in sorted(by_name):
+        kind, text = METRIC_HELP.get(name, ("untyped", name))
+        out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"] + by_name[name]
+    for name, (text, value) in sorted((gauges or {}).items()):
+        out += [f"# HELP {name} {text}", f"# TYPE {name} gauge", _metric_line(name, (), value)]
+    return "\n".join(out) + "\n"
+
+# ---------------------- Request profiling ----------------------
+# Every request records its wall time, the time spent in load_json/save_json and
+# the number of outbound HTTP calls (GitHub, People API, token refresh) into the
+# http_request_* metrics. A request carrying `X-Profile: <ADMIN_KEY>` (or
+# ?profile=<ADMIN_KEY>) is also run under cProfile; the dump goes to an in-memory
+# ring of PROFILE_RING_SIZE entries served by /profiles. One capture at a time.
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", 20))
+PROFILE_HEADER = "X-Profile"
+REQUEST_SLOW_MS = float(os.getenv("REQUEST_SLOW_MS", 2000))  # log requests slower than this
+
+PROFILES = deque(maxlen=PROFILE_RING_SIZE)
+_profile_ids = itertools.count(1)
+_profile_lock = threading.Lock()
+_request_local = threading.local()
+
+def request_stats():
+    """The I/O counters of the request running on this thread, or None outside a request."""
+    return getattr(_request_local, "stats", None)
+
+@contextlib.contextmanager
+def json_io_timer(op, path):
+    """Time one load_json/save_json call into json_<op>_seconds and the current request's counters."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        observe(f"json_{op}_seconds", elapsed, file=os.path.basename(path))
+        stats = request_stats()
+        if stats is not None:
+            stats[f"{op}_json_s"] += elapsed
+            stats[f"{op}_json_calls"] += 1
+
+def count_outbound_call(api):
+    stats = request_stats()
+    if stats is not None:
+        stats["http_calls"] += 1
+        stats["http_by_api"][api] = stats["http_by_api"].get(api, 0) + 1
+
+def _profile_requested():
+    flag = request.headers.get(PROFILE_HEADER) or request.args.get("profile")
+    if not flag:
+        return False
+    return flag == ADMIN_KEY if ADMIN_KEY else True
+
+def _stop_profiler():
+    profiler = getattr(_request_local, "profiler", None)
+    if profiler is None:
+        return None
+    _request_local.profiler = None
+    profiler.disable()
+    _profile_lock.release()
+    return profiler
+
+@app.before_request
+def _start_request_profile():
+    _request_local.stats = {"load_json_s": 0.0, "load_json_calls": 0, "save_json_s": 0.0, "save_json_calls": 0,
+                            "http_calls": 0, "http_by_api": {}}
+    _request_local.profiler = None
+    if _profile_requested() and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _request_local.profiler = profiler
+        except ValueError:  # another profiler (e.g. a debugger) is already active
+            _profile_lock.release()
+    _request_local.started = time.perf_counter()
+
+@app.after_request
+def _finish_request_profile(response):
+    stats = request_stats()
+    if stats is None:
+        return response
+    wall = time.perf_counter() - _request_local.started
+    profiler = _stop_profiler()
+    endpoint = request.endpoint or "unmatched"
+    observe("http_request_seconds", wall, endpoint=endpoint, method=request.method)
+    observe("http_request_json_seconds", stats["load_json_s"], endpoint=endpoint, op="load")
+    observe("http_request_json_seconds", stats["save_json_s"], endpoint=endpoint, op="save")
+    if stats["http_calls"]:
+        inc_counter("http_request_outbound_calls_total", stats["http_calls"], endpoint=endpoint)
+
+    record = {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "wall_ms": round(wall * 1000, 2),
+        "load_json_ms": round(stats["load_json_s"] * 1000, 2),
+        "load_json_calls": stats["load_json_calls"],
+        "save_json_ms": round(stats["save_json_s"] * 1000, 2),
+        "save_json_calls": stats["save_json_calls"],
+        "http_calls": stats["http_calls"],
+        "http_by_api": stats["http_by_api"],
+    }
+    if record["wall_ms"] >= REQUEST_SLOW_MS:
+        app.logger.warning("[SLOW] %s", dumps_json(record).decode("utf-8"))
+    if profiler is not None:
+        profiler.create_stats()
+        record.update(id=next(_profile_ids), at=int(time.time()), data=marshal.dumps(profiler.stats))
+        PROFILES.append(record)
+        response.headers["X-Profile-Id"] = str(record["id"])
+        response.headers["Server-Timing"] = (
+            f'app;dur={record["wall_ms"]}, '
+            f'load_json;dur={record["load_json_ms"]};desc="{record["load_json_calls"]} calls", '
+            f'save_json;dur={record["save_json_ms"]};desc="{record["save_json_calls"]} calls", '
+            f'http;desc="{record["http_calls"]} outbound calls"'
+        )
+    return response
+
+@app.teardown_request
+def _teardown_request_profile(exc):
+    # after_request is skipped when a view raises; never leave the profiler running
+    _stop_profiler()
+    _request_local.stats = None
+
+def profile_text(entry, sort="cumulative", limit=40):
+    """pstats report of a captured profile."""
+    out = io.StringIO()
+    st = pstats.Stats(stream=out)
+    st.stats = marshal.loads(entry["data"])
+    st.get_top_level_stats()
+    st.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
 # ---------------------- GitHub helpers ----------------------
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", 3))
+GITHUB_RETRY_BACKOFF = float(os.getenv("GITHUB_RETRY_BACKOFF", 0.5))  # seconds, doubled per attempt
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", 30))  # seconds
+
+# One pooled keep-alive session for every GitHub API call
+_github_session = None
+_github_session_lock = threading.Lock()
+GITHUB_RATE_LIMIT = {"remaining": None, "reset": None}
+_github_resolved_branch = {}  # repo -> branch that last served a contents lookup
+
+def _github_http():
+    global _github_session
+    if _github_session is None:
+        with _github_session_lock:
+            if _github_session is None:
+                http = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                http.mount("https://", adapter)
+                http.mount("http://", adapter)
+                _github_session = http
+    return _github_session
+
+def _github_record_rate_limit(r):
+    remaining = r.headers.get("X-RateLimit-Remaining")
+    if remaining is not None:
+        GITHUB_RATE_LIMIT["remaining"] = safe_int(remaining, None)
+        GITHUB_RATE_LIMIT["reset"] = safe_int(r.headers.get("X-RateLimit-Reset"), None)
+
+def _github_rate_limit_wait(r=None):
+    """Seconds to wait before the next call, or None when the rate limit is not exhausted."""
+    if r is not None:
+        retry_after = r.headers.get("Retry-After")
+        if retry_after is not None:
+            return max(0, safe_int(retry_after))
+    if GITHUB_RATE_LIMIT["remaining"] == 0 and GITHUB_RATE_LIMIT["reset"]:
+        return max(0, GITHUB_RATE_LIMIT["reset"] - time.time())
+    return None
+
+def _github_is_rate_limited(r):
+    if r.status_code == 429:
+        return True
+    if r.status_code != 403:
+        return False
+    return r.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in r.headers or "rate limit" in r.text.lower()
+
+def _github_request(method, url, timeout=15, **kwargs):
+    """
+    Call the GitHub API through the pooled session. Retries connection errors,
+    5xx and rate-limit responses (403/429) up to GITHUB_MAX_RETRIES times with
+    exponential backoff, honouring Retry-After / X-RateLimit-Reset (waits longer
+    than GITHUB_RATE_LIMIT_MAX_WAIT give up and return the response).
+    """
+    t0 = time.perf_counter()
+    try:
+        r = _github_request_retrying(method, url, timeout=timeout, **kwargs)
+    except Exception as e:
+        inc_counter("api_errors_total", api="github", reason=type(e).__name__)
+        raise
+    finally:
+        observe("github_request_seconds", time.perf_counter() - t0, method=method)
+    inc_counter("github_requests_total", method=method, status=r.status_code)
+    if r.status_code >= 400 and r.status_code != 404:  # 404 is the normal branch-fallback miss
+        inc_counter("api_errors_total", api="github", reason=f"http_{r.status_code}")
+    return r
+
+def _github_request_retrying(method, url, timeout=15, **kwargs):
+    http = _github_http()
+    last_exc = None
+    r = None
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        wait = _github_rate_limit_wait()
+        if wait:
+            if wait > GITHUB_RATE_LIMIT_MAX_WAIT:
+                raise RuntimeError(f"GitHub rate limit exhausted, resets in {int(wait)}s")
+            time.sleep(wait)
+        count_outbound_call("github")
+        try:
+            r = http.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_exc = e
+            if attempt < GITHUB_MAX_RETRIES:
+                time.sleep(GITHUB_RETRY_BACKOFF * (2 ** attempt))
+            continue
+
+        _github_record_rate_limit(r)
+        retryable = r.status_code >= 500 or _github_is_rate_limited(r)
+        if not retryable or attempt == GITHUB_MAX_RETRIES:
+            return r
+        delay = GITHUB_RETRY_BACKOFF * (2 ** attempt)
+        if _github_is_rate_limited(r):
+            wait = _github_rate_limit_wait(r)
+            if wait is not None:
+                if wait > GITHUB_RATE_LIMIT_MAX_WAIT:
+                    return r
+                delay = max(delay, wait)
+        app.logger.debug(f"[GITHUB] {method} {url} -> {r.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+    if r is not None:
+        return r
+    raise last_exc
+
 def _github_api_headers():
     if not GITHUB_TOKEN:
         return None
@@ -120,177 +500,443 @@ def _github_api_headers():
         "User-Agent": "referral-app-bot"
     }
 
-def _github_get_file_content(repo, path, branch=None):
+def _github_fetch_file(repo, path, branch=None, etag=None):
     """
-    Fetch file content bytes from GitHub. Tries branch (if provided),
+    Fetch a file from the GitHub contents API. Tries branch (if provided),
     then configured GITHUB_BRANCH, then 'main', then 'master'.
-    Returns decoded bytes or None on failure.
+    With `etag`, the first branch is asked with If-None-Match so an unchanged
+    file costs a 304 and no body.
+    Returns {"status": 200|304, "content": bytes, "etag": str, "branch": str} or None on failure.
     """
     headers = _github_api_headers()
     if not headers:
         return None
 
     branches_to_try = []
+    # the branch that resolved last time goes first, so lookups don't walk the list again
+    if _github_resolved_branch.get(repo):
+        branches_to_try.append(_github_resolved_branch[repo])
     if branch:
         branches_to_try.append(branch)
     if GITHUB_BRANCH:
         branches_to_try.append(GITHUB_BRANCH)
     branches_to_try.extend(["main", "master"])
 
-    for b in branches_to_try:
+    for i, b in enumerate(dict.fromkeys(branches_to_try)):
         try:
-            url = f"https://api.github.com/repos/{repo}/contents/{path}?ref={b}"
-            r = requests.get(url, headers=headers, timeout=15)
+            url = f"{GITHUB_API_URL}/repos/{repo}/contents/{path}?ref={b}"
+            req_headers = headers
+            if etag and i == 0:
+                req_headers = dict(headers, **{"If-None-Match": etag})
+            r = _github_request("GET", url, headers=req_headers, timeout=15)
+            if r.status_code == 304:
+                _github_resolved_branch[repo] = b
+                return {"status": 304, "content": None, "etag": etag, "branch": b}
             if r.status_code == 200:
                 data = r.json()
                 content_b64 = data.get("content", "")
                 if content_b64:
+                    _github_resolved_branch[repo] = b
                     # GH API returns content with newlines; base64 decode robustly
                     payload = "".join(content_b64.splitlines())
-                    return base64.b64decode(payload)
+                    return {"status": 200, "content": base64.b64decode(payload), "etag": r.headers.get("ETag"), "branch": b}
             # try next branch if 404 or other
         except Exception as e:
             app.logger.debug(f"[GITHUB] fetch {path}@{b} failed: {e}")
             continue
     return None
 
-def _github_get_file_sha(repo, path, branch="master"):
-    headers = _github_api_headers()
-    if not headers:
-        return None
-    url = f"https://api.github.com/repos/{repo}/contents/{path}?ref={branch}"
-    try:
-        r = requests.get(url, headers=headers, timeout=15)
-        if r.status_code == 200:
-            data = r.json()
-            return data.get("sha")
-        return None
-    except Exception as e:
-        app.logger.debug(f"[GITHUB] GET file sha failed: {e}")
-        return None
+# ---------------------- Batched GitHub persistence (write-behind) ----------------------
+# save_json only marks a file dirty. A flusher thread waits GITHUB_FLUSH_WINDOW
+# seconds after the first pending save, then commits the current contents of every
+# dirty file in a single commit through the Git Data API (tree + commit + ref update).
+GITHUB_FLUSH_WINDOW = float(os.getenv("GITHUB_FLUSH_WINDOW", 15))  # seconds
+
+_github_queue = {}  # path -> commit message
+_github_inflight = set()  # paths flush_github_queue is committing right now
+_github_queue_cond = threading.Condition()
+_github_flusher_started = False
+_github_flush_lock = threading.Lock()
+GITHUB_QUEUE_STATS = {"last_flush_at": None, "last_flush_files": 0, "last_error": None, "flushes": 0}
 
-def _github_put_file(repo, path, content_bytes, message, branch="master", sha=None):
+def _github_api(method, url, **kwargs):
     headers = _github_api_headers()
     if not headers:
         raise RuntimeError("GITHUB_TOKEN not configured")
-    url = f"https://api.github.com/repos/{repo}/contents/{path}"
-    payload = {
-        "message": message,
-        "content": base64.b64encode(content_bytes).decode("utf-8"),
-        "branch": branch
-    }
-    if sha:
-        payload["sha"] = sha
-    r = requests.put(url, headers=headers, json=payload, timeout=20)
-    if r.status_code in (200, 201):
-        return r.json()
-    else:
+    r = _github_request(method, url, headers=headers, timeout=20, **kwargs)
+    if r.status_code not in (200, 201):
         raise RuntimeError(f"GitHub API error {r.status_code}: {r.text}")
+    return r.json()
 
-def push_file_to_github(path, commit_message=None):
+def _github_commit_files(repo, files, message, branch="master"):
+    """
+    Commit several files in one commit. `files` maps repo path -> content bytes
+    (UTF-8 text). Returns the new commit sha.
+    """
+    base = f"{GITHUB_API_URL}/repos/{repo}/git"
+    head = _github_api("GET", f"{base}/ref/heads/{branch}")
+    parent_sha = head["object"]["sha"]
+    parent = _github_api("GET", f"{base}/commits/{parent_sha}")
+    tree = _github_api("POST", f"{base}/trees", json={
+        "base_tree": parent["tree"]["sha"],
+        "tree": [
+            {"path": p, "mode": "100644", "type": "blob", "content": content.decode("utf-8")}
+            for p, content in files.items()
+        ],
+    })
+    commit = _github_api("POST", f"{base}/commits", json={
+        "message": message,
+        "tree": tree["sha"],
+        "parents": [parent_sha],
+    })
+    _github_api("PATCH", f"{base}/refs/heads/{branch}", json={"sha": commit["sha"]})
+    return commit["sha"]
+
+# Called with the pending paths before they are read; lets a store write a file once per flush
+# instead of on every change.
+_github_pre_flush_hooks = []
+
+def flush_github_queue():
+    """Push every queued file in one commit. Failed files are re-queued for the next window."""
+    with _github_flush_lock:
+        with _github_queue_cond:
+            pending = dict(_github_queue)
+            _github_queue.clear()
+            _github_inflight.update(pending)
+        try:
+            return _flush_pending(pending)
+        finally:
+            with _github_queue_cond:
+                _github_inflight.difference_update(pending)
+
+def _flush_pending(pending):
+    """Commit `pending` (path -> message); failed files go back to the queue."""
+    if not pending:
+        return {"skipped": True}
     if not GITHUB_TOKEN or not GITHUB_REPO:
-        app.logger.info("[GITHUB] Skipping push: GITHUB_TOKEN or GITHUB_REPO not set.")
         return {"skipped": True}
 
-    if not os.path.exists(path):
-        app.logger.info(f"[GITHUB] Local file {path} not found, skipping push.")
-        return {"skipped": True}
+    for hook in _github_pre_flush_hooks:
+        try:
+            hook(pending)
+        except Exception as e:
+            app.logger.warning(f"[GITHUB] Pre-flush export failed: {e}")
 
+    files = {}
+    for path in pending:
+        try:
+            with open(path, "rb") as f:
+                files[path] = f.read()
+        except Exception as e:
+            app.logger.warning(f"[GITHUB] Failed to read {path}: {e}")
+
+    branch = GITHUB_BRANCH or "master"
+    messages = list(dict.fromkeys(pending.values()))
+    message = messages[0] if len(messages) == 1 else "Auto-update " + ", ".join(os.path.basename(p) for p in files)
     try:
-        with open(path, "rb") as f:
-            content = f.read()
+        with timed("github_flush_seconds"):
+            sha = _github_commit_files(GITHUB_REPO, files, message, branch=branch) if files else None
     except Exception as e:
-        app.logger.warning(f"[GITHUB] Failed to read {path}: {e}")
+        app.logger.warning(f"[GITHUB] Batched push failed for {list(files)}: {e}")
+        with _github_queue_cond:
+            for path, msg in pending.items():
+                _github_queue.setdefault(path, msg)
+        GITHUB_QUEUE_STATS["last_error"] = str(e)
         return {"error": str(e)}
 
-    repo = GITHUB_REPO
-    branch = GITHUB_BRANCH or "master"
-    commit_message = commit_message or f"Auto-update {os.path.basename(path)}"
+    GITHUB_QUEUE_STATS.update(last_flush_at=time.time(), last_flush_files=len(files), last_error=None)
+    GITHUB_QUEUE_STATS["flushes"] += 1
+    app.logger.info(f"[GITHUB] Pushed {len(files)} file(s) to {GITHUB_REPO}@{branch} in one commit")
+    return {"ok": True, "commit": sha, "files": list(files)}
 
+def _github_flusher():
+    while True:
+        with _github_queue_cond:
+            while not _github_queue:
+                _github_queue_cond.wait()
+        time.sleep(GITHUB_FLUSH_WINDOW)
+        try:
+            flush_github_queue()
+        except Exception as e:
+            app.logger.warning(f"[GITHUB] Flush failed: {e}")
+
+def github_push_pending(path):
+    """True while a save of `path` is queued or being committed (GitHub still has an older copy)."""
+    with _github_queue_cond:
+        return path in _github_queue or path in _github_inflight
+
+def enqueue_github_push(path, commit_message=None):
+    """Mark `path` for the next batched commit (later saves of the same file collapse)."""
+    global _github_flusher_started
+    with _github_queue_cond:
+        _github_queue[path] = commit_message or f"Auto-update {os.path.basename(path)}"
+        if not _github_flusher_started:
+            _github_flusher_started = True
+            threading.Thread(target=_github_flusher, daemon=True).start()
+        _github_queue_cond.notify_all()
+    return {"queued": True, "queue_depth": len(_github_queue)}
+
+def github_queue_status():
+    with _github_queue_cond:
+        depth = len(_github_queue)
+        pending = sorted(_github_queue)
+    return dict(GITHUB_QUEUE_STATS, queue_depth=depth, pending=pending, flush_window=GITHUB_FLUSH_WINDOW)
+
+# ---------------------- JSON serialization ----------------------
+# Machine-owned files are written compact; only files listed in JSON_PRETTY_FILES
+# (basenames, default data.json) keep indent=4 for people reading them on GitHub.
+# orjson is used for compact output when installed (JSON_BACKEND=auto|orjson|json);
+# it can only indent by 2, so pretty files always go through json, whose output
+# then does not depend on which backend wrote the file.
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").strip().lower()
+JSON_PRETTY_FILES = {p.strip() for p in os.getenv("JSON_PRETTY_FILES", "data.json").split(",") if p.strip()}
+
+def _use_orjson():
+    return orjson is not None and JSON_BACKEND in ("auto", "orjson")
+
+def dumps_json(data, pretty=False):
+    """Serialize to UTF-8 bytes: compact by default, indented by 4 when `pretty`."""
+    if pretty:
+        return json.dumps(data, indent=4).encode("utf-8")
+    if _use_orjson():
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+def loads_json(raw):
+    if _use_orjson():
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def is_pretty_json_file(path):
+    return os.path.basename(path) in JSON_PRETTY_FILES
+
+# ---------------------- Per-file write locks ----------------------
+# save_json holds json_file_lock(path) while writing; read-modify-write callers
+# (register, daily snapshots) hold it across load_json + save_json so requests,
+# the updater thread and other gunicorn workers (flock on "<path>.lock") can't
+# interleave. Re-entrant within a thread.
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+@contextlib.contextmanager
+def json_file_lock(path):
+    key = os.path.abspath(path)
+    with _file_locks_guard:
+        entry = _file_locks.setdefault(key, {"lock": threading.RLock(), "depth": 0})
+    with entry["lock"]:
+        if fcntl is None or entry["depth"]:
+            entry["depth"] += 1
+            try:
+                yield
+            finally:
+                entry["depth"] -= 1
+            return
+        lock_dir = os.path.dirname(key)
+        if lock_dir and not os.path.exists(lock_dir):
+            os.makedirs(lock_dir, exist_ok=True)
+        with open(key + ".lock", "a") as lock_file:
+            flock_exclusive(lock_file.fileno())
+            entry["depth"] += 1
+            try:
+                yield
+            finally:
+                entry["depth"] -= 1
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+# ---------------------- JSON read-through cache ----------------------
+# load_json keeps the parsed object per path. Local files are revalidated with a
+# stat() (mtime + size); GitHub-backed files with a conditional GET (ETag), at most
+# once per JSON_CACHE_GITHUB_TTL seconds. save_json writes through, so readers in
+# this process never see data older than the last save; a path whose save is still
+# waiting for the write-behind push is not revalidated against GitHub at all.
+# Returned objects are shared: mutate them only on the way to save_json.
+JSON_CACHE_GITHUB_TTL = float(os.getenv("JSON_CACHE_GITHUB_TTL", 10))  # seconds
+
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+def _file_stat_key(path):
     try:
-        sha = _github_get_file_sha(repo, path, branch=branch)
-        result = _github_put_file(repo, path, content, commit_message, branch=branch, sha=sha)
-        app.logger.info(f"[GITHUB] Pushed {path} to {repo}@{branch}")
-        return {"ok": True, "response": result}
-    except Exception as e:
-        app.logger.warning(f"[GITHUB] Push failed for {path}: {e}")
-        return {"error": str(e)}
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _json_cache_put(path, data, source, **meta):
+    entry = {"data": data, "source": source, "checked": time.time()}
+    entry.update(meta)
+    with _json_cache_lock:
+        _json_cache[path] = entry
+
+def invalidate_json_cache(path=None):
+    with _json_cache_lock:
+        if path is None:
+            _json_cache.clear()
+        else:
+            _json_cache.pop(path, None)
+
+def _load_local_json(path, default, create_dirs=False):
+    key = _file_stat_key(path)
+    if key is None:
+        # create empty with default
+        try:
+            if create_dirs:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # "x": never clobber a file another writer created in the meantime
+            with open(path, "xb") as f:
+                f.write(dumps_json(default))
+        except Exception:
+            pass
+        invalidate_json_cache(path)
+        return default
+
+    entry = _json_cache.get(path)
+    if entry and entry["source"] == "local" and entry.get("stat") == key:
+        inc_counter("json_cache_hits_total", source="local")
+        return entry["data"]
+
+    inc_counter("json_cache_misses_total", source="local")
+    try:
+        with open(path, "rb") as f:
+            data = loads_json(f.read())
+    except Exception:
+        return default
+    _json_cache_put(path, data, "local", stat=key)
+    return data
 
 def load_json(path, default):
     """
     Try to fetch file from GitHub (if configured) *unless* the path is inside
     the Render-mounted directory (local-first for mounted files).
-    Returns parsed JSON (default if can't parse).
+    Returns parsed JSON (default if can't parse), served from the in-process
+    cache while the underlying file is unchanged.
+    With STORAGE_BACKEND=sqlite, DATA_FILE/REF_FILE/DAILY_FILE come from SQLITE_DB_FILE.
     """
+    with json_io_timer("load", path):
+        kind = _sqlite_kind(path)
+        if kind:
+            return sqlite_load(kind, default)
+        return _load_json_files(path, default)
+
+def _load_json_files(path, default):
     # If the file is stored on the Render-mounted disk, prefer local read/write
     try:
         render_dir = os.path.abspath(RENDER_TOKEN_DIR) if 'RENDER_TOKEN_DIR' in globals() else None
         if render_dir and os.path.isabs(path) and os.path.abspath(path).startswith(render_dir):
             # local-first for mounted files
-            if not os.path.exists(path):
-                # create empty with default
-                try:
-                    os.makedirs(os.path.dirname(path), exist_ok=True)
-                    with open(path, "w") as f:
-                        json.dump(default, f)
-                except Exception:
-                    pass
-                return default
-            try:
-                with open(path, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return default
+            return _load_local_json(path, default, create_dirs=True)
     except Exception:
         # fallthrough to normal behavior
         pass
 
     # Normal behavior: try GitHub first (when configured), then fallback to local file
     if GITHUB_TOKEN and GITHUB_REPO:
+        entry = _json_cache.get(path)
+        if github_push_pending(path):
+            # the newest save has not reached GitHub yet: its copy is older than ours
+            if entry:
+                inc_counter("json_cache_hits_total", source="github")
+                return entry["data"]
+            return _load_local_json(path, default)
+        if entry and entry["source"] == "github" and time.time() - entry["checked"] < JSON_CACHE_GITHUB_TTL:
+            inc_counter("json_cache_hits_total", source="github")
+            return entry["data"]
         try:
-            content_bytes = _github_get_file_content(GITHUB_REPO, path, branch=GITHUB_BRANCH)
-            if content_bytes:
+            cached = entry if entry and entry["source"] == "github" else None
+            res = _github_fetch_file(
+                GITHUB_REPO, path,
+                branch=(cached or {}).get("branch") or GITHUB_BRANCH,
+                etag=(cached or {}).get("etag"),
+            )
+            if res and res["status"] == 304 and cached:
+                cached["checked"] = time.time()
+                inc_counter("json_cache_hits_total", source="github")
+                return cached["data"]
+            if res and res["content"]:
+                inc_counter("json_cache_misses_total", source="github")
                 try:
-                    text = content_bytes.decode("utf-8")
-                    return json.loads(text)
+                    data = loads_json(res["content"])
+                    _json_cache_put(path, data, "github", etag=res["etag"], branch=res["branch"])
+                    return data
                 except Exception as e:
                     app.logger.warning(f"[WARN] Failed to parse JSON from GitHub for {path}: {e}")
         except Exception as e:
             app.logger.debug(f"[DEBUG] GitHub fetch failed for {path}: {e}")
 
     # Fallback to local file (create if not exists)
-    if not os.path.exists(path):
-        try:
-            with open(path, "w") as f:
-                json.dump(default, f)
-        except Exception:
-            pass
-        return default
-
-    with open(path, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return default
+    return _load_local_json(path, default)
 
 def save_json(path, data, push_to_github=True):
     """
     Save JSON locally and optionally push to GitHub.
     Files under the Render mount are saved locally and NOT pushed to GitHub.
+    With STORAGE_BACKEND=sqlite, DATA_FILE/REF_FILE/DAILY_FILE go to SQLITE_DB_FILE instead.
+    """
+    with json_io_timer("save", path):
+        kind = _sqlite_kind(path)
+        if kind:
+            sqlite_save(kind, data)
+            result = {"saved_sqlite": True}
+        else:
+            result = _save_json_file(path, data, push_to_github=push_to_github)
+    # only once the new data is readable: a page rendered for the new version must not see the old file
+    bump_data_version()
+    return result
+
+def _atomic_write_json(path, data, pretty=False):
     """
+    Write JSON to a temp file in the same directory, fsync it and rename it over
+    `path`, so readers (and a crash) only ever see the old or the new file.
+    """
+    parent = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=parent or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
     try:
-        # Ensure parent dir exists
-        parent = os.path.dirname(path)
-        if parent and not os.path.exists(parent):
-            try:
-                os.makedirs(parent, exist_ok=True)
-            except Exception:
-                pass
-        with open(path, "w") as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        app.logger.error(f"[ERROR] Failed writing {path}: {e}")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps_json(data, pretty=pretty))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
         raise
+    # persist the rename itself
+    try:
+        dir_fd = os.open(parent or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+def _save_json_file(path, data, push_to_github=True):
+    with json_file_lock(path):
+        try:
+            # Ensure parent dir exists
+            parent = os.path.dirname(path)
+            if parent and not os.path.exists(parent):
+                try:
+                    os.makedirs(parent, exist_ok=True)
+                except Exception:
+                    pass
+            _atomic_write_json(path, data, pretty=is_pretty_json_file(path))
+        except Exception as e:
+            invalidate_json_cache(path)
+            app.logger.error(f"[ERROR] Failed writing {path}: {e}")
+            raise
+
+        # write-through (under the lock, so the cached stat always matches `data`)
+        render_dirs = [RENDER_TOKEN_DIR, RENDER_DATA_DIR]
+        on_render_disk = os.path.isabs(path) and any(os.path.abspath(path).startswith(rd) for rd in render_dirs)
+        if GITHUB_TOKEN and GITHUB_REPO and not on_render_disk:
+            # the ETag is unknown until the push lands; revalidate unconditionally after the TTL
+            previous = _json_cache.get(path) or {}
+            _json_cache_put(path, data, "github", etag=None, branch=previous.get("branch"))
+        else:
+            _json_cache_put(path, data, "local", stat=_file_stat_key(path))
 
     # If file is on Render disk (mounted dir), do not push to GitHub
     try:
@@ -306,8 +952,7 @@ def save_json(path, data, push_to_github=True):
     # Otherwise, follow original push logic (only push if explicitly configured)
     if push_to_github and GITHUB_TOKEN and GITHUB_REPO and path in (DATA_FILE, REF_FILE, DAILY_FILE):
         try:
-            res = push_file_to_github(path, commit_message=f"Auto-update {path}")
-            return res
+            return enqueue_github_push(path, commit_message=f"Auto-update {path}")
         except Exception as e:
             app.logger.warning(f"[WARN] GitHub push failed for {path}: {e}")
             return {"error": str(e)}
@@ -332,6 +977,7 @@ def get_credentials():
 
         if creds and creds.expired and creds.refresh_token:
             try:
+                count_outbound_call("oauth")
                 creds.refresh(Request())
                 # ensure token directory exists before writing
                 token_dir = os.path.dirname(TOKEN_FILE)
@@ -352,20 +998,459 @@ def get_credentials():
 def normalize_ref_id(s):
     return re.sub(r"\s+", "_", (s or "").strip().lower())
 
+# ---------------------- User store (append-only log + index) ----------------------
+# Registrations are appended as one JSON line each to USER_LOG_FILE, and every
+# process keeps an in-memory index on normalized ref_id plus per-type counters,
+# so signup and lookup are O(1). Each access tails lines appended by other
+# workers; a replaced file (compaction) triggers a full reload. The updater leader
+# periodically compacts the log and exports it to DATA_FILE (which /download and
+# the GitHub copy still use). Without the Render disk the log does not survive a
+# redeploy, so every registration also exports DATA_FILE (coalesced by the GitHub
+# write-behind queue); a fresh instance seeds its log from that copy.
+USER_LOG_FILE = os.path.join(RENDER_DATA_DIR, "users.jsonl") if os.path.isdir(RENDER_DATA_DIR) else "users.jsonl"
+USER_LOG_PERSISTENT = os.path.isdir(RENDER_DATA_DIR)
+USER_LOG_COMPACT_INTERVAL = int(os.getenv("USER_LOG_COMPACT_INTERVAL", 300))  # seconds
+
+_user_store = {"users": [], "by_ref": {}, "counts": {}, "offset": 0, "ino": None, "compacted_key": None, "compacted_at": 0, "lock_depth": 0}
+_user_store_lock = threading.RLock()
+
+@contextlib.contextmanager
+def _user_log_locked():
+    """Serialize log writers across threads and (via flock) across worker processes."""
+    with _user_store_lock:
+        # re-entrant: only the outermost holder takes the flock
+        if fcntl is None or _user_store["lock_depth"]:
+            _user_store["lock_depth"] += 1
+            try:
+                yield
+            finally:
+                _user_store["lock_depth"] -= 1
+            return
+        lock_dir = os.path.dirname(USER_LOG_FILE)
+        if lock_dir and not os.path.exists(lock_dir):
+            os.makedirs(lock_dir, exist_ok=True)
+        with open(USER_LOG_FILE + ".lock", "a") as lock_file:
+            flock_exclusive(lock_file.fileno())
+            _user_store["lock_depth"] += 1
+            try:
+                yield
+            finally:
+                _user_store["lock_depth"] -= 1
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _reg_type_of(user):
+    return (user.get("registration_type") or "").strip().lower()
+
+def _user_store_apply(record):
+    op = record.get("op")
+    if op == "add":
+        user = record.get("user") or {}
+        _user_store["users"].append(user)
+        _user_store["by_ref"].setdefault(normalize_ref_id(user.get("ref_id", "")), user)
+        reg_type = _reg_type_of(user)
+        _user_store["counts"][reg_type] = _user_store["counts"].get(reg_type, 0) + 1
+    elif op == "update":
+        user = _user_store["by_ref"].get(record.get("ref_id"))
+        if user is not None:
+            old_type = _reg_type_of(user)
+            user.update(record.get("fields") or {})
+            new_type = _reg_type_of(user)
+            if new_type != old_type:
+                _user_store["counts"][old_type] -= 1
+                _user_store["counts"][new_type] = _user_store["counts"].get(new_type, 0) + 1
+
+def _write_user_log(users):
+    """Atomically replace the log with one 'add' line per user."""
+    tmp = USER_LOG_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        for u in users:
+            f.write(dumps_json({"op": "add", "user": u}) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, USER_LOG_FILE)
+
+def _user_store_refresh():
+    """Bring the index up to date with the log (seeding the log from DATA_FILE on first run)."""
+    with _user_store_lock:
+        try:
+            st = os.stat(USER_LOG_FILE)
+        except FileNotFoundError:
+            with _user_log_locked():
+                if not os.path.exists(USER_LOG_FILE):
+                    users = load_json(DATA_FILE, []) or []
+                    _write_user_log(users if isinstance(users, list) else [])
+                    app.logger.info("[USERS] Seeded %s from %s (%d users).", USER_LOG_FILE, DATA_FILE, len(users))
+            st = os.stat(USER_LOG_FILE)
+
+        if st.st_ino != _user_store["ino"] or st.st_size < _user_store["offset"]:
+            _user_store.update(users=[], by_ref={}, counts={}, offset=0, ino=st.st_ino)
+        if st.st_size == _user_store["offset"]:
+            return
+
+        with open(USER_LOG_FILE, "rb") as f:
+            f.seek(_user_store["offset"])
+            chunk = f.read(st.st_size - _user_store["offset"])
+        complete = chunk[:chunk.rfind(b"\n") + 1]  # ignore a line another process is still writing
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            try:
+                _user_store_apply(loads_json(line))
+            except Exception as e:
+                app.logger.warning("[USERS] Skipping bad log line in %s: %s", USER_LOG_FILE, e)
+        _user_store["offset"] += len(complete)
+
+def _user_log_append(record):
+    with _user_log_locked():
+        _user_store_refresh()
+        with open(USER_LOG_FILE, "ab") as f:
+            f.write(dumps_json(record) + b"\n")
+        _user_store_refresh()
+    bump_data_version()
+
+def get_user(ref_id):
+    """O(1) lookup by (normalized) ref_id. Returns the user dict or None."""
+    if _sqlite_kind(DATA_FILE):
+        return sqlite_get_user(ref_id)
+    _user_store_refresh()
+    return _user_store["by_ref"].get(normalize_ref_id(ref_id))
+
+def all_users():
+    """All registered users in registration order (shared list: do not mutate)."""
+    if _sqlite_kind(DATA_FILE):
+        return sqlite_all_users()
+    _user_store_refresh()
+    return _user_store["users"]
+
+def count_users(reg_type):
+    if _sqlite_kind(DATA_FILE):
+        return sqlite_count_users(reg_type)
+    _user_store_refresh()
+    return _user_store["counts"].get((reg_type or "").strip().lower(), 0)
+
+def add_user(user):
+    """Append a user unless its ref_id is taken. Returns (user, created)."""
+    if _sqlite_kind(DATA_FILE):
+        return sqlite_add_user(user)
+    key = normalize_ref_id(user.get("ref_id", ""))
+    with _user_log_locked():
+        _user_store_refresh()
+        existing = _user_store["by_ref"].get(key)
+        if existing is not None:
+            return existing, False
+        _user_log_append({"op": "add", "user": user})
+    _mark_users_dirty()
+    return _user_store["by_ref"].get(key, user), True
+
+def update_user(ref_id, fields):
+    if _sqlite_kind(DATA_FILE):
+        return sqlite_update_user(ref_id, fields)
+    _user_log_append({"op": "update", "ref_id": normalize_ref_id(ref_id), "fields": fields})
+    _mark_users_dirty()
+
+def _mark_users_dirty():
+    """Without the Render disk, queue DATA_FILE; the export itself runs once per flush."""
+    if not USER_LOG_PERSISTENT and GITHUB_TOKEN and GITHUB_REPO:
+        enqueue_github_push(DATA_FILE, commit_message=f"Auto-update {DATA_FILE}")
+
+def export_users(push_to_github=True):
+    """Save the current users to DATA_FILE (pushed to GitHub through the write-behind queue)."""
+    with _user_log_locked():
+        _user_store_refresh()
+        users = list(_user_store["users"])
+        save_json(DATA_FILE, users, push_to_github=push_to_github)
+    return users
+
+def _export_users_before_flush(pending):
+    if DATA_FILE in pending and not _sqlite_kind(DATA_FILE) and os.path.exists(USER_LOG_FILE):
+        export_users(push_to_github=False)
+
+_github_pre_flush_hooks.append(_export_users_before_flush)
+
+def compact_user_log(force=False):
+    """
+    Rewrite the log as one line per user and export it to DATA_FILE.
+    Skipped when nothing was appended since the last compaction (unless `force`).
+    """
+    if _sqlite_kind(DATA_FILE):
+        return {"skipped": True, "backend": "sqlite"}
+    with _user_log_locked():
+        _user_store_refresh()
+        key = _file_stat_key(USER_LOG_FILE)
+        if not force and key == _user_store["compacted_key"]:
+            return {"skipped": True}
+        users = list(_user_store["users"])
+        _write_user_log(users)
+        _user_store_refresh()
+        _user_store["compacted_key"] = _file_stat_key(USER_LOG_FILE)
+        _user_store["compacted_at"] = time.time()
+        save_json(DATA_FILE, users, push_to_github=True)
+    app.logger.info("[USERS] Compacted %s and exported %d users to %s.", USER_LOG_FILE, len(users), DATA_FILE)
+    return {"ok": True, "users": len(users)}
+
+def maybe_compact_user_log():
+    if time.time() - _user_store["compacted_at"] >= USER_LOG_COMPACT_INTERVAL:
+        return compact_user_log()
+    return {"skipped": True}
+
+def flush_on_exit():
+    """Compact (exporting DATA_FILE) first, so the final GitHub push carries every registration."""
+    if _user_store["ino"] is not None:  # only processes that opened the log (not CLI commands or scripts)
+        try:
+            compact_user_log()
+        except Exception as e:
+            app.logger.warning("[USERS] Compaction on exit failed: %s", e)
+    return flush_github_queue()
+
+# runs when the process exits; gunicorn's worker_exit calls it too
+atexit.register(flush_on_exit)
+
+# ---------------------- SQLite storage backend (optional) ----------------------
+# STORAGE_BACKEND=sqlite keeps users, referral counts and daily snapshots in one
+# WAL-mode database instead of whole-file JSON rewrites. load_json/save_json and
+# the user store dispatch here for DATA_FILE/REF_FILE/DAILY_FILE and return the
+# same shapes as the JSON files. Move existing data with `flask --app app
+# migrate-sqlite`; `flask --app app export-json` (and /download) produce the
+# JSON file formats again.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").strip().lower()
+SQLITE_DB_FILE = os.path.join(RENDER_DATA_DIR, "referrals.db") if os.path.isdir(RENDER_DATA_DIR) else "referrals.db"
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ref_key TEXT NOT NULL,
+    registration_type TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_ref_key ON users (ref_key);
+CREATE INDEX IF NOT EXISTS idx_users_registration_type ON users (registration_type);
+
+CREATE TABLE IF NOT EXISTS label_counts (
+    grp TEXT NOT NULL,
+    key TEXT NOT NULL,
+    team_label TEXT NOT NULL,
+    referrals INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grp, key)
+);
+CREATE INDEX IF NOT EXISTS idx_label_counts_label ON label_counts (team_label);
+
+CREATE TABLE IF NOT EXISTS daily_days (
+    date TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    date TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, label)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_counts_label ON daily_counts (label);
+"""
+
+_sqlite_local = threading.local()
+
+def _sqlite_kind(path):
+    if STORAGE_BACKEND != "sqlite":
+        return None
+    return {DATA_FILE: "users", REF_FILE: "referrals", DAILY_FILE: "daily"}.get(path)
+
+def _sqlite():
+    """Per-thread connection (sqlite3 connections must not be shared across threads)."""
+    conn = getattr(_sqlite_local, "conn", None)
+    if conn is None or getattr(_sqlite_local, "path", None) != SQLITE_DB_FILE:
+        db_dir = os.path.dirname(SQLITE_DB_FILE)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(SQLITE_DB_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SQLITE_SCHEMA)
+        _sqlite_local.conn = conn
+        _sqlite_local.path = SQLITE_DB_FILE
+    return conn
+
+def _sqlite_begin(conn, timeout=30):
+    """BEGIN IMMEDIATE; under gevent the write lock is polled instead of waited for inside SQLite."""
+    if not cooperative():
+        conn.execute("BEGIN IMMEDIATE")
+        return
+    conn.execute("PRAGMA busy_timeout=0")
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, COOPERATIVE_POLL_MAX)
+    finally:
+        conn.execute(f"PRAGMA busy_timeout={timeout * 1000}")
+
+@contextlib.contextmanager
+def _sqlite_tx():
+    conn = _sqlite()
+    _sqlite_begin(conn)
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    bump_data_version()
+
+def sqlite_get_user(ref_id):
+    row = _sqlite().execute(
+        "SELECT data FROM users WHERE ref_key = ? ORDER BY id LIMIT 1", (normalize_ref_id(ref_id),)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def sqlite_all_users():
+    return [json.loads(row[0]) for row in _sqlite().execute("SELECT data FROM users ORDER BY id")]
+
+def sqlite_count_users(reg_type):
+    row = _sqlite().execute(
+        "SELECT COUNT(*) FROM users WHERE registration_type = ?", ((reg_type or "").strip().lower(),)
+    ).fetchone()
+    return row[0]
+
+def _sqlite_insert_users(conn, users):
+    conn.executemany(
+        "INSERT INTO users (ref_key, registration_type, data) VALUES (?, ?, ?)",
+        [(normalize_ref_id(u.get("ref_id", "")), _reg_type_of(u), json.dumps(u)) for u in users],
+    )
+
+def sqlite_add_user(user):
+    key = normalize_ref_id(user.get("ref_id", ""))
+    with _sqlite_tx() as conn:
+        row = conn.execute("SELECT data FROM users WHERE ref_key = ? ORDER BY id LIMIT 1", (key,)).fetchone()
+        if row:
+            return json.loads(row[0]), False
+        _sqlite_insert_users(conn, [user])
+    return user, True
+
+def sqlite_update_user(ref_id, fields):
+    with _sqlite_tx() as conn:
+        row = conn.execute(
+            "SELECT id, data FROM users WHERE ref_key = ? ORDER BY id LIMIT 1", (normalize_ref_id(ref_id),)
+        ).fetchone()
+        if not row:
+            return
+        user = json.loads(row[1])
+        user.update(fields)
+        conn.execute(
+            "UPDATE users SET registration_type = ?, data = ? WHERE id = ?",
+            (_reg_type_of(user), json.dumps(user), row[0]),
+        )
+
+def sqlite_load(kind, default):
+    conn = _sqlite()
+    if kind == "users":
+        return sqlite_all_users()
+    if kind == "referrals":
+        refs = {}
+        for grp, key, label, count in conn.execute(
+            "SELECT grp, key, team_label, referrals FROM label_counts ORDER BY rowid"
+        ):
+            refs.setdefault(grp, {})[key] = {"team_label": label, "referrals": count}
+        return refs
+    if kind == "daily":
+        days = {d: {} for (d,) in conn.execute("SELECT date FROM daily_days ORDER BY date")}
+        for d, label, count in conn.execute("SELECT date, label, count FROM daily_counts ORDER BY date, rowid"):
+            days.setdefault(d, {})[label] = count
+        return {"days": [{"date": d, "counts": counts} for d, counts in days.items()]}
+    return default
+
+def sqlite_save(kind, data):
+    """Replace the stored users / referral counts / daily snapshots with `data` (JSON file shape)."""
+    with _sqlite_tx() as conn:
+        if kind == "users":
+            conn.execute("DELETE FROM users")
+            _sqlite_insert_users(conn, [u for u in (data or []) if isinstance(u, dict)])
+        elif kind == "referrals":
+            conn.execute("DELETE FROM label_counts")
+            conn.executemany(
+                "INSERT INTO label_counts (grp, key, team_label, referrals) VALUES (?, ?, ?, ?)",
+                [
+                    (grp, str(k), str((v or {}).get("team_label") or k), safe_int((v or {}).get("referrals")))
+                    for grp, entries in (data or {}).items() if isinstance(entries, dict)
+                    for k, v in entries.items()
+                ],
+            )
+        elif kind == "daily":
+            days = (data or {}).get("days", [])
+            conn.execute("DELETE FROM daily_days")
+            conn.execute("DELETE FROM daily_counts")
+            conn.executemany("INSERT OR IGNORE INTO daily_days (date) VALUES (?)", [(d.get("date"),) for d in days if d.get("date")])
+            # keyframe/delta histories are stored expanded, one row per (date, label)
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_counts (date, label, count) VALUES (?, ?, ?)",
+                [
+                    (date, str(label), safe_int(c))
+                    for date, counts in iter_daily_counts(days) if date
+                    for label, c in counts.items()
+                ],
+            )
+
+def migrate_json_to_sqlite(force=False):
+    """One-shot copy of the JSON files (and the user log, if present) into SQLITE_DB_FILE."""
+    conn = _sqlite()
+    if not force and conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+        return {"skipped": True, "reason": "database already has users (use force)"}
+    if os.path.exists(USER_LOG_FILE):
+        _user_store_refresh()
+        users = list(_user_store["users"])
+    else:
+        users = _load_json_files(DATA_FILE, []) or []
+    refs = _load_json_files(REF_FILE, {}) or {}
+    daily = _load_json_files(DAILY_FILE, {"days": []}) or {"days": []}
+    sqlite_save("users", users)
+    sqlite_save("referrals", refs)
+    sqlite_save("daily", daily)
+    return {"ok": True, "users": len(users), "groups": len(refs), "days": len(daily.get("days", []))}
+
+def export_sqlite_json(kind):
+    """Serialize one table set in the JSON file format (as save_json writes it)."""
+    default = {"users": [], "referrals": {}, "daily": {"days": []}}[kind]
+    path = {"users": DATA_FILE, "referrals": REF_FILE, "daily": DAILY_FILE}[kind]
+    data = sqlite_load(kind, default)
+    if kind == "daily":
+        data = encode_daily_history(data.get("days", []))
+    return dumps_json(data, pretty=is_pretty_json_file(path))
+
+def export_sqlite_to_json():
+    written = []
+    for kind, path in (("users", DATA_FILE), ("referrals", REF_FILE), ("daily", DAILY_FILE)):
+        with open(path, "wb") as f:
+            f.write(export_sqlite_json(kind))
+        written.append(path)
+    return written
+
+@app.cli.command("migrate-sqlite")
+@click.option("--force", is_flag=True, help="Replace data already in the database.")
+def migrate_sqlite_command(force):
+    """Copy data.json / referrals.json / daily_refs.json into SQLITE_DB_FILE."""
+    click.echo(json.dumps(migrate_json_to_sqlite(force=force)))
+
+@app.cli.command("export-json")
+def export_json_command():
+    """Write the SQLite contents back out as the JSON files."""
+    for path in export_sqlite_to_json():
+        click.echo(f"wrote {path}")
+
 # ---------------------- Team & Registration logic ----------------------
 def assign_team_global():
-    users = load_json(DATA_FILE, [])
-    team_number = (len([u for u in users if (u.get("registration_type") or "").strip().lower() == "team"]) % TEAMS_PER_GROUP) + 1
+    team_number = (count_users("team") % TEAMS_PER_GROUP) + 1
     return team_number
 
 def assign_link(reg_type):
     if reg_type == "team":
-        users = [u for u in load_json(DATA_FILE, []) if (u.get("registration_type") or "").strip().lower() == "team"]
-        team_number = (len(users) % TEAMS_PER_GROUP) + 1
+        team_number = (count_users("team") % TEAMS_PER_GROUP) + 1
         return team_number, TEAM_LINKS.get(team_number)
     elif reg_type == "solo":
-        users = [u for u in load_json(DATA_FILE, []) if (u.get("registration_type") or "").strip().lower() == "solo"]
-        solo_number = (len(users) % SOLO_COUNT) + 1
+        solo_number = (count_users("solo") % SOLO_COUNT) + 1
         return solo_number, SOLO_LINKS.get(solo_number)
     else:
         return 1, TEAM_LINKS.get(1)
@@ -428,33 +1513,548 @@ def contact_mentions_ref(contact, ref_index):
     combined_clean = re.sub(r"[^\w\s]", " ", combined)
     return bool(pat.search(combined_clean))
 
-def fetch_contacts_and_update():
+def contact_mentions_team_local(contact, team_number):
+    """Punctuation-tolerant team detection (strips punctuation before matching)."""
+    token_pattern = re.compile(r"TEAM\s*{}\b".format(team_number), flags=re.I)
+    texts = []
+    for field in ["names", "biographies", "organizations", "userDefined"]:
+        if field in contact:
+            for item in contact[field]:
+                for key in ["displayName", "value", "name", "title"]:
+                    if isinstance(item, dict) and item.get(key):
+                        texts.append(item.get(key))
+                    elif not isinstance(item, dict) and item:
+                        texts.append(str(item))
+    combined = " ".join([t for t in texts if t])
+    combined_clean = re.sub(r"[^\w\s]", "", combined)
+    return bool(token_pattern.search(combined_clean))
+
+# ---------------------- Single-pass contact classifier ----------------------
+# One precompiled pattern per matching rule above. Instead of testing every
+# team/ref number separately, each pattern captures the number it sees and the
+# caller intersects the captured numbers with the labels that actually exist.
+_TEAM_WORD_RE = re.compile(r"\bteam[\s_\-]*0*([0-9]+)\b", flags=re.I)     # contact_mentions_team (token)
+_TEAM_SQUASHED_RE = re.compile(r"team([0-9]+)")                             # contact_mentions_team (no spaces)
+_TEAM_LOOSE_RE = re.compile(r"team[\s_\-]*([0-9]+)", flags=re.I)           # contact_mentions_team (group hint)
+_TEAM_LOCAL_RE = re.compile(r"team\s*([0-9]+)(?!\w)", flags=re.I)          # contact_mentions_team_local
+_REF_WORD_RE = re.compile(r"\bref[\s\-_]*0*([0-9]+)\b", flags=re.I)        # contact_mentions_ref
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_CONTACT_TEXT_FIELDS = ("names", "biographies", "organizations", "userDefined")
+_CONTACT_TEXT_KEYS = ("displayName", "value", "name", "title")
+
+def _contact_texts(contact):
+    """
+    Build, in one walk over the contact, the three texts the legacy matchers
+    derive independently: (team_text, local_text, ref_text).
+    """
+    team_parts, local_parts, ref_parts = [], [], []
+    for field in _CONTACT_TEXT_FIELDS:
+        items = contact.get(field)
+        if not items:
+            continue
+        for item in items:
+            if isinstance(item, dict):
+                for key in _CONTACT_TEXT_KEYS:
+                    v = item.get(key)
+                    if v:
+                        local_parts.append(v)
+                        ref_parts.append(str(v))
+                if field == "names":
+                    v = item.get("displayName")
+                    if v:
+                        team_parts.append(v)
+                elif field == "organizations":
+                    if item.get("name"):
+                        team_parts.append(item.get("name"))
+                    if item.get("title"):
+                        team_parts.append(item.get("title"))
+                elif item.get("value"):
+                    team_parts.append(item.get("value"))
+            else:
+                s = str(item)
+                ref_parts.append(s)
+                if item:
+                    local_parts.extend((s, s, s, s))
+                if field == "userDefined":
+                    team_parts.append(s)
+    return " ".join(team_parts), " ".join(local_parts), " ".join(ref_parts)
+
+def _number_prefixes(digits):
+    """Numbers N whose decimal form is a prefix of `digits` (i.e. `f"...{N}" in text`)."""
+    if digits.startswith("0"):
+        return {0}
+    return {int(digits[:i]) for i in range(1, len(digits) + 1)}
+
+def classify_contact(contact, groups, solo_max=None):
+    """
+    Return every (group, label) a contact is counted for, e.g.
+    [("ALL", "TEAM1"), ("SOLO", "REF003")].
+
+    `groups` maps group name -> iterable of team numbers (as built from
+    DATA_FILE). Gives the same answer as running contact_mentions_team /
+    contact_mentions_team_local for every group x team and contact_mentions_ref
+    for every solo ref, but builds the contact text once and scans it once
+    per rule.
+    """
+    solo_max = SOLO_COUNT if solo_max is None else solo_max
+    team_text, local_text, ref_text = _contact_texts(contact)
+    labels = []
+
+    if groups:
+        team_text = team_text.lower()
+        mentioned = set()
+        loose = set()
+        squashed = team_text.replace(" ", "")
+        if "team" in squashed:
+            mentioned.update(int(m) for m in _TEAM_WORD_RE.findall(team_text))
+            for m in _TEAM_SQUASHED_RE.findall(squashed):
+                mentioned |= _number_prefixes(m)
+            for m in _TEAM_LOOSE_RE.findall(team_text):
+                stripped = m.lstrip("0")
+                if stripped:
+                    loose |= _number_prefixes(stripped)
+                if m.startswith("0"):
+                    loose.add(0)
+        local_clean = _PUNCT_RE.sub("", local_text)
+        for m in _TEAM_LOCAL_RE.findall(local_clean):
+            if m == str(int(m)):
+                mentioned.add(int(m))
+
+        if mentioned or loose:
+            for group, team_nums in groups.items():
+                g = (group or "").strip().lower()
+                group_hint = bool(loose) and bool(g) and g in team_text
+                for team_num in team_nums:
+                    if team_num in mentioned or (group_hint and team_num in loose):
+                        labels.append((group, f"TEAM{team_num}"))
+
+    if solo_max > 0:
+        ref_clean = _PUNCT_RE.sub(" ", ref_text)
+        seen = set()
+        for m in _REF_WORD_RE.findall(ref_clean):
+            i = int(m)
+            if 1 <= i <= solo_max and i not in seen:
+                seen.add(i)
+                labels.append(("SOLO", f"REF{str(i).zfill(3)}"))
+
+    return labels
+
+# ---------------------- Leaderboard view (materialized at sync time) ----------------------
+# Ranks are computed once whenever referrals.json is rewritten (sync or registration)
+# and stored next to it, so page views look ranks up instead of re-sorting every group.
+LEADERBOARD_FILE = os.path.join(os.path.dirname(REF_FILE), "leaderboard.json")
+LEADERBOARD_TOP_N = int(os.getenv("LEADERBOARD_TOP_N", 5))
+
+def _rank_entries(entries):
+    """Sort entries by referrals (desc) and fill in competition rank and gap to the next rank up."""
+    entries.sort(key=lambda e: e["referrals"], reverse=True)
+    rank, above, prev = 0, None, None
+    for pos, e in enumerate(entries):
+        if e["referrals"] != prev:
+            rank, above, prev = pos + 1, prev, e["referrals"]
+        e["rank"] = rank
+        e["gap"] = (above - e["referrals"]) if above is not None else 0
+    return entries
+
+def build_leaderboard(referrals, top_n=None):
+    top_n = LEADERBOARD_TOP_N if top_n is None else top_n
+    groups, index, flat = {}, {}, []
+    for group, teams in (referrals or {}).items():
+        if not isinstance(teams, dict):
+            continue
+        entries = [{
+            "key": str(k),
+            "team_label": (v or {}).get("team_label") or f"TEAM{k}",
+            "referrals": safe_int((v or {}).get("referrals", 0)),
+        } for k, v in teams.items()]
+        groups[group] = _rank_entries(entries)
+        index[group] = {e["key"]: pos for pos, e in enumerate(entries)}
+        if group != "SOLO":
+            flat.extend(dict(e, group=group) for e in entries)
+    return {
+        "generated_at": int(time.time()),
+        "groups": groups,
+        "index": index,
+        "top": _rank_entries(flat)[:top_n],
+    }
+
+def update_leaderboard(referrals):
+    view = build_leaderboard(referrals)
+    save_json(LEADERBOARD_FILE, view, push_to_github=False)
+    publish_leaderboard(view)
+    return view
+
+def get_leaderboard():
+    view = load_json(LEADERBOARD_FILE, {})
+    if not view.get("groups") and not view.get("generated_at"):
+        # First read after deploy: materialize from the current referrals once
+        with json_file_lock(REF_FILE):
+            view = update_leaderboard(load_json(REF_FILE, {}))
+    return view
+
+def leaderboard_rank(view, group, key):
+    """Return the ranked entry for `key` in `group` (rank, gap, referrals) or None."""
+    pos = ((view or {}).get("index") or {}).get(group, {}).get(str(key))
+    if pos is None:
+        return None
+    entry = view["groups"][group][pos]
+    return dict(entry, total=len(view["groups"][group]))
+
+def user_leaderboard_key(user, view):
+    """(group, key) of the user's team or REF entry in the leaderboard view."""
+    label = (user.get("team_label") or "").strip().upper()
+    reg_type = _reg_type_of(user) or ("solo" if label.startswith("REF") else "team")
+    if reg_type == "solo":
+        return "SOLO", label
+    group = (user.get("group") or "").strip() or "ALL"
+    if group not in ((view or {}).get("index") or {}):
+        group = "ALL"
+    number = user.get("team_number") if user.get("team_number") is not None else user.get("assigned_number")
+    try:
+        number = int(number)
+    except Exception:
+        number = 1
+    return group, str(number)
+
+def leaderboard_groups(view, only=None):
+    """Ordered {group: {key: {team_label, referrals}}} mapping for the templates."""
+    return {
+        group: {e["key"]: {"team_label": e["team_label"], "referrals": e["referrals"]} for e in entries}
+        for group, entries in ((view or {}).get("groups") or {}).items()
+        if only is None or group == only
+    }
+
+# ---------------------- Incremental contact sync (People API syncToken) ----------------------
+SYNC_STATE_FILE = os.path.join(os.path.dirname(TOKEN_FILE), "sync_state.json")
+PERSON_FIELDS = "names,emailAddresses,organizations,biographies,userDefined"
+CLASSIFY_CACHE_FILE = os.path.join(os.path.dirname(TOKEN_FILE), "classify_cache.json")
+CLASSIFY_CACHE_MAX = int(os.getenv("CLASSIFY_CACHE_MAX", 200000))  # contacts
+SYNC_PAGE_SIZE = 2000  # People API maximum
+SYNC_PREFETCH_PAGES = int(os.getenv("SYNC_PREFETCH_PAGES", 1))  # pages fetched ahead of the classifier; 0 = no prefetch thread
+
+class SyncTokenExpired(Exception):
+    pass
+
+def _read_state_file(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            data = loads_json(f.read())
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        app.logger.warning("Failed to read %s: %s", path, e)
+        return {}
+
+def _write_state_file(path, data):
+    try:
+        state_dir = os.path.dirname(path)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir, exist_ok=True)
+        _atomic_write_json(path, data)
+    except Exception as e:
+        app.logger.warning("Failed to write %s: %s", path, e)
+
+def load_sync_state():
+    """
+    Read the incremental sync state stored next to TOKEN_FILE:
+    {"sync_token", "signature", "counts": {group: {label: n}}, "contacts": {resourceName: [[group, label], ...]}}
+    """
+    return _read_state_file(SYNC_STATE_FILE)
+
+def save_sync_state(state):
+    _write_state_file(SYNC_STATE_FILE, state)
+
+def load_classify_cache(signature):
+    """
+    Per-contact classification cache: {resourceName: [etag, labels]}.
+    Entries are discarded wholesale when the classifier signature changed.
+    """
+    cache = _read_state_file(CLASSIFY_CACHE_FILE)
+    if cache.get("signature") != signature:
+        return {}
+    entries = cache.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+def save_classify_cache(signature, entries):
+    # dicts keep insertion order and hits are re-inserted, so the oldest entries are the least recently seen
+    overflow = len(entries) - CLASSIFY_CACHE_MAX
+    if overflow > 0:
+        for resource_name in list(entries.keys())[:overflow]:
+            del entries[resource_name]
+    _write_state_file(CLASSIFY_CACHE_FILE, {"signature": signature, "entries": entries})
+
+def _is_expired_sync_token_error(e):
+    # People API answers an expired/invalid syncToken with 410 (EXPIRED_SYNC_TOKEN)
+    if not isinstance(e, HttpError):
+        return False
+    status = getattr(e.resp, "status", None)
+    text = str(e)
+    return status == 410 or "EXPIRED_SYNC_TOKEN" in text or (status == 400 and "sync token" in text.lower())
+
+def _connection_pages(service, sync_token=None):
+    """
+    Yield people/me connections.list responses one page at a time. With
+    `sync_token`, only contacts added, changed or deleted since that token are
+    returned (deleted ones carry metadata.deleted); the last page carries
+    nextSyncToken. Raises SyncTokenExpired when Google rejects the token.
+    """
+    page_token = None
+    while True:
+        params = {
+            "resourceName": "people/me",
+            "personFields": PERSON_FIELDS,
+            "pageSize": SYNC_PAGE_SIZE,
+            "pageToken": page_token,
+            "requestSyncToken": True,
+        }
+        if sync_token:
+            params["syncToken"] = sync_token
+        t0 = time.perf_counter()
+        count_outbound_call("people")
+        try:
+            results = service.people().connections().list(**params).execute()
+        except HttpError as e:
+            if sync_token and _is_expired_sync_token_error(e):
+                inc_counter("api_errors_total", api="people", reason="expired_sync_token")
+                raise SyncTokenExpired(str(e))
+            inc_counter("api_errors_total", api="people", reason=f"http_{getattr(e.resp, 'status', 'unknown')}")
+            raise
+        except Exception as e:
+            inc_counter("api_errors_total", api="people", reason=type(e).__name__)
+            raise
+        finally:
+            observe("people_request_seconds", time.perf_counter() - t0)
+        inc_counter("sync_pages_fetched_total")
+
+        yield results
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
+def iter_connection_pages(service, sync_token=None, prefetch=None):
+    """
+    _connection_pages with a fetcher thread that requests the next pages while
+    the caller is still working on the current one. At most `prefetch` pages
+    (SYNC_PREFETCH_PAGES) wait in the queue, so memory stays bounded by the
+    page size. The service is only ever used from the fetcher thread; its
+    errors are re-raised in the caller. Closing the generator stops the fetcher.
+    """
+    prefetch = SYNC_PREFETCH_PAGES if prefetch is None else prefetch
+    if prefetch <= 0:
+        yield from _connection_pages(service, sync_token)
+        return
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    caller_stats = request_stats()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetcher():
+        _request_local.stats = caller_stats  # outbound calls count toward the request that started the sync
+        try:
+            for page in _connection_pages(service, sync_token):
+                if not put(("page", page)):
+                    return
+            put(("done", None))
+        except BaseException as e:
+            put(("error", e))
+
+    threading.Thread(target=fetcher, name="people-prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, value = pages.get()
+            if kind == "error":
+                raise value
+            if kind == "done":
+                return
+            yield value
+    finally:
+        stop.set()
+
+def stream_connections(service, sync_token=None, info=None):
+    """
+    Yield contacts one by one as their pages arrive (see iter_connection_pages).
+    `info` is filled in along the way: pages, fetched, next_sync_token and
+    wait_s, the time spent blocked on the network.
+    """
+    info = {} if info is None else info
+    info.update(pages=0, fetched=0, next_sync_token=None, wait_s=0.0)
+    pages = iter_connection_pages(service, sync_token)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            page = next(pages, None)
+            info["wait_s"] += time.perf_counter() - t0
+            if page is None:
+                break
+            contacts = page.get("connections", [])
+            info["pages"] += 1
+            info["fetched"] += len(contacts)
+            info["next_sync_token"] = page.get("nextSyncToken") or info["next_sync_token"]
+            del page
+            yield from contacts
+    finally:
+        pages.close()
+
+def _classifier_signature(group_team_nums, solo_max):
+    """Stored labels are only reusable while the set of groups/teams/refs is unchanged."""
+    return json.dumps({"groups": {g: sorted(t) for g, t in group_team_nums.items()}, "solo_max": solo_max}, sort_keys=True)
+
+def _adjust_counts(counts, labels, delta):
+    for group, label in labels:
+        group_counts = counts.setdefault(group, {})
+        group_counts[label] = max(0, safe_int(group_counts.get(label)) + delta)
+
+# ---------------------- Sync logging ----------------------
+# One structured record per sync instead of per-contact output: match counts per
+# label, a reservoir sample of SYNC_LOG_SAMPLE example matches, and the time the
+# logging itself took. Per-match debug lines are formatted only when DEBUG is on.
+SYNC_LOG_SAMPLE = int(os.getenv("SYNC_LOG_SAMPLE", 10))  # example matches kept per sync
+SYNC_LOG_HISTORY = int(os.getenv("SYNC_LOG_HISTORY", 20))  # summaries kept in memory
+
+SYNC_LOGS = deque(maxlen=SYNC_LOG_HISTORY)
+
+def _contact_display_name(contact):
+    try:
+        return contact.get("names", [{"displayName": "Unknown"}])[0].get("displayName", "Unknown")
+    except Exception:
+        return "Unknown"
+
+def new_sync_log():
+    return {
+        "matches": {},
+        "samples": [],
+        "matched_contacts": 0,
+        "debug": app.logger.isEnabledFor(logging.DEBUG),
+        "log_time": 0.0,
+        "rng": random.Random(),
+        "started": time.perf_counter(),
+    }
+
+def sync_log_match(log, contact, labels):
+    t0 = time.perf_counter()
+    matches = log["matches"]
+    for group, label in labels:
+        key = f"{group}/{label}"
+        matches[key] = matches.get(key, 0) + 1
+    log["matched_contacts"] += 1
+    seen = log["matched_contacts"]
+    slot = len(log["samples"]) if seen <= SYNC_LOG_SAMPLE else log["rng"].randrange(seen)
+    if slot < SYNC_LOG_SAMPLE:
+        example = {"resourceName": contact.get("resourceName"), "name": _contact_display_name(contact),
+                   "labels": [f"{g}/{l}" for g, l in labels]}
+        if slot == len(log["samples"]):
+            log["samples"].append(example)
+        else:
+            log["samples"][slot] = example
+    if log["debug"]:
+        app.logger.debug("[MATCH] %s counted for %s", _contact_display_name(contact),
+                         ", ".join(f"{g} {l}" for g, l in labels))
+    log["log_time"] += time.perf_counter() - t0
+
+def sync_log_summary(log, **fields):
+    """Emit and keep the per-sync summary record; returns it."""
+    t0 = time.perf_counter()
+    duration = t0 - log["started"]
+    summary = dict(fields)
+    summary.update({
+        "at": int(time.time()),
+        "duration_ms": round(duration * 1000, 1),
+        "matched_contacts": log["matched_contacts"],
+        "matches_by_label": dict(sorted(log["matches"].items())),
+        "samples": log["samples"],
+    })
+    line = dumps_json(summary).decode("utf-8")
+    app.logger.info("[SYNC] %s", line)
+    log["log_time"] += time.perf_counter() - t0
+    summary["log_ms"] = round(log["log_time"] * 1000, 2)
+    summary["log_share"] = round(log["log_time"] / duration, 4) if duration > 0 else 0.0
+    SYNC_LOGS.append(summary)
+    return summary
+
+def sync_phase_record(phases, name, seconds):
+    """Record one sync phase in sync_phase_seconds and in `phases` (ms, for the sync log)."""
+    observe("sync_phase_seconds", seconds, phase=name)
+    phases[name] = round(seconds * 1000, 1)
+
+def sync_phase_done(phases, name, since):
+    """Close the phase that started at `since` (perf_counter); returns now, the start of the next one."""
+    now = time.perf_counter()
+    sync_phase_record(phases, name, now - since)
+    return now
+
+def _scan_contacts(contacts, state, previous_cache, classify_cache, group_team_nums, solo_max, sync_log):
+    """
+    Classify `contacts` (any iterable, consumed once) and move the per-label
+    counters in state["counts"] from each contact's old labels to its new ones.
+    Pops reused entries from `previous_cache` and fills `classify_cache`.
+    """
+    counts = state.setdefault("counts", {})
+    contact_labels = state.setdefault("contacts", {})
+    changed = cache_hits = cache_misses = 0
+    for n, contact in enumerate(contacts):
+        if not n % 500:
+            cooperative_yield()  # let SSE streams and requests run during a long scan
+        resource_name = contact.get("resourceName")
+        old_labels = contact_labels.pop(resource_name, []) if resource_name else []
+        _adjust_counts(counts, old_labels, -1)
+        cached = previous_cache.pop(resource_name, None) if resource_name else None
+        if (contact.get("metadata") or {}).get("deleted"):
+            changed += bool(old_labels)
+            continue
+
+        etag = contact.get("etag")
+        if cached and etag and cached[0] == etag:
+            labels = cached[1]
+            cache_hits += 1
+        else:
+            labels = [list(l) for l in classify_contact(contact, group_team_nums, solo_max)]
+            cache_misses += 1
+        if resource_name and etag:
+            classify_cache[resource_name] = [etag, labels]
+        _adjust_counts(counts, labels, +1)
+        if labels and resource_name:
+            contact_labels[resource_name] = labels
+        changed += sorted(old_labels) != sorted(labels)
+
+        if labels:
+            sync_log_match(sync_log, contact, labels)
+    return {"changed": changed, "cache_hits": cache_hits, "cache_misses": cache_misses}
+
+def fetch_contacts_and_update(full=False):
+    """
+    Sync referral counts from Google Contacts into REF_FILE.
+
+    The first sync (or `full=True`, or a changed set of teams/refs, or an
+    expired sync token) downloads every connection and counts from zero.
+    Later syncs ask the People API only for contacts changed since the stored
+    nextSyncToken and adjust the per-label counters by those deltas.
+    Contacts are classified as their pages arrive while the next page is
+    being fetched, so the raw connections are never all in memory at once.
+    """
+    sync_started = phase_started = time.perf_counter()
+    phases = {}
     creds = get_credentials()
     if not creds:
         app.logger.info("[INFO] No credentials yet. Visit /auth to connect Google Contacts.")
+        inc_counter("sync_runs_total", mode="none", status="no-credentials")
         return {"status": "no-credentials"}
 
+    mode = "full"
     try:
+        sync_log = new_sync_log()
         service = build("people", "v1", credentials=creds)
-        
-        # ---------------------- PAGINATED FETCH ----------------------
-        connections = []
-        page_token = None
-        while True:
-            results = service.people().connections().list(
-                resourceName="people/me",
-                personFields="names,emailAddresses,organizations,biographies,userDefined",
-                pageSize=2000,
-                pageToken=page_token
-            ).execute()
-            
-            connections.extend(results.get("connections", []))
-            page_token = results.get("nextPageToken")
-            if not page_token:
-                break
-        # --------------------------------------------------------------
 
-        users = load_json(DATA_FILE, []) or []
+        users = all_users()
 
         # Prepare groups -> teams structure from registered users (only TEAM registrations)
         groups = {}
@@ -471,53 +2071,47 @@ def fetch_contacts_and_update():
         SOLO_MAX = SOLO_COUNT
         solo_refs = {i: {"ref_label": f"REF{str(i).zfill(3)}", "count": 0} for i in range(1, SOLO_MAX + 1)}
 
-        # Local helper for punctuation-tolerant team detection
-        def contact_mentions_team_local(contact, team_number):
-            token_pattern = re.compile(r"TEAM\s*{}\b".format(team_number), flags=re.I)
-            texts = []
-            for field in ["names", "biographies", "organizations", "userDefined"]:
-                if field in contact:
-                    for item in contact[field]:
-                        for key in ["displayName", "value", "name", "title"]:
-                            if isinstance(item, dict) and item.get(key):
-                                texts.append(item.get(key))
-                            elif not isinstance(item, dict) and item:
-                                texts.append(str(item))
-            combined = " ".join([t for t in texts if t])
-            combined_clean = re.sub(r"[^\w\s]", "", combined)
-            return bool(token_pattern.search(combined_clean))
-
-        # ---------------------- SCAN CONTACTS ----------------------
-        for contact in connections:
-            # --- Print the full contact for inspection ---
-            print("CONTACT:", contact)  # <--- added line to print all contact data
-
-            for group, teams in groups.items():
-                for team_num in list(teams.keys()):
-                    if contact_mentions_team(contact, group, team_num) or contact_mentions_team_local(contact, team_num):
-                        teams[team_num]["count"] = safe_int(teams[team_num].get("count")) + 1
-                        try:
-                            name = contact.get("names", [{"displayName": "Unknown"}])[0].get("displayName", "Unknown")
-                        except Exception:
-                            name = "Unknown"
-                        app.logger.debug(f"[MATCH] {name} counted for {group} TEAM{team_num}")
-
-            # SOLO refs: REF001..REFNN
-            for i in range(1, SOLO_MAX + 1):
-                if contact_mentions_ref(contact, i):
-                    solo_refs[i]["count"] = safe_int(solo_refs[i].get("count")) + 1
-                    try:
-                        name = contact.get("names", [{"displayName": "Unknown"}])[0].get("displayName", "Unknown")
-                    except Exception:
-                        name = "Unknown"
-                    app.logger.debug(f"[MATCH] {name} counted for SOLO {solo_refs[i]['ref_label']}")
+        group_team_nums = {group: list(teams.keys()) for group, teams in groups.items()}
+        signature = _classifier_signature(group_team_nums, SOLO_MAX)
+
+        state = {} if full else load_sync_state()
+        if state.get("sync_token") and state.get("signature") == signature:
+            mode = "incremental"
+        phase_started = sync_phase_done(phases, "setup", phase_started)
+
+        # ---------------------- FETCH + SCAN (streamed, incremental when possible) ----------------------
+        while True:
+            if mode == "full":
+                state = {"counts": {}, "contacts": {}}
+            # Classification cache: a full fetch rebuilds it from the contacts actually
+            # returned, which evicts the ones that disappeared from the address book.
+            previous_cache = load_classify_cache(signature)
+            classify_cache = previous_cache if mode == "incremental" else {}
+            stream = {}
+            contacts = stream_connections(service, state.get("sync_token") if mode == "incremental" else None, stream)
+            try:
+                scan = _scan_contacts(contacts, state, previous_cache, classify_cache, group_team_nums, SOLO_MAX, sync_log)
+                break
+            except SyncTokenExpired:
+                app.logger.info("[SYNC] Sync token expired, falling back to a full resync.")
+                mode = "full"
+                sync_log = new_sync_log()
+            finally:
+                contacts.close()
+        # pages are fetched while the previous one is classified: "fetch" is the time spent waiting on them
+        sync_phase_record(phases, "fetch", stream["wait_s"])
+        sync_phase_record(phases, "classify", time.perf_counter() - phase_started - stream["wait_s"])
+        phase_started = time.perf_counter()
+        counts = state["counts"]
+        connections_fetched, next_sync_token = stream["fetched"], stream["next_sync_token"]
+        changed, cache_hits, cache_misses = scan["changed"], scan["cache_hits"], scan["cache_misses"]
 
         # Build referrals dict
         referrals = {}
         for group, teams in groups.items():
             referrals[group] = {}
             for team_num, info in teams.items():
-                count = safe_int(info.get("count"))
+                count = safe_int((counts.get(group) or {}).get(info["team_label"]))
                 referrals[group][str(team_num)] = {
                     "team_label": info.get("team_label", f"TEAM{team_num}"),
                     "referrals": count
@@ -526,31 +2120,259 @@ def fetch_contacts_and_update():
         # Add SOLO group
         referrals.setdefault("SOLO", {})
         for i, info in solo_refs.items():
-            count = safe_int(info.get("count"))
             key = f"REF{str(i).zfill(3)}"
+            count = safe_int((counts.get("SOLO") or {}).get(key))
             referrals["SOLO"][key] = {
                 "team_label": info.get("ref_label", key),
                 "referrals": count
             }
 
-        # Save locally and push to GitHub if configured
+        phase_started = sync_phase_done(phases, "aggregate", phase_started)
+
+        # Save locally and push to GitHub if configured (the push itself is timed in github_flush_seconds)
         save_json(REF_FILE, referrals, push_to_github=True)
-        app.logger.info("[AUTO-UPDATE] Referral counts per group/team and SOLO synced from Google Contacts.")
-        return {"status": "ok", "groups": len(referrals)}
+        update_leaderboard(referrals)
+        phase_started = sync_phase_done(phases, "save", phase_started)
+
+        state["sync_token"] = next_sync_token
+        state["signature"] = signature
+        state["synced_at"] = int(time.time())
+        save_sync_state(state)
+        save_classify_cache(signature, classify_cache)
+        sync_phase_done(phases, "state", phase_started)
+
+        inc_counter("sync_contacts_scanned_total", connections_fetched, mode=mode)
+        inc_counter("sync_contacts_changed_total", changed, mode=mode)
+        inc_counter("classify_cache_hits_total", cache_hits)
+        inc_counter("classify_cache_misses_total", cache_misses)
+        for key, n in sync_log["matches"].items():
+            group, _, label = key.partition("/")
+            inc_counter("sync_matches_total", n, group=group, label=label)
+        summary = sync_log_summary(sync_log, mode=mode, fetched=connections_fetched, pages=stream["pages"],
+                                   changed=changed, cache_hits=cache_hits, cache_misses=cache_misses, phases_ms=phases)
+        inc_counter("sync_runs_total", mode=mode, status="ok")
+        observe("sync_duration_seconds", time.perf_counter() - sync_started, mode=mode)
+        return {"status": "ok", "groups": len(referrals), "mode": mode, "fetched": connections_fetched, "changed": changed,
+                "cache_hits": cache_hits, "cache_misses": cache_misses, "duration_ms": summary["duration_ms"],
+                "log_ms": summary["log_ms"], "phases_ms": phases}
 
     except Exception as e:
         app.logger.error(f"[ERROR] Failed to update referrals: {e}")
+        inc_counter("sync_runs_total", mode=mode, status="error")
+        observe("sync_duration_seconds", time.perf_counter() - sync_started, mode=mode)
         return {"status": "error", "message": str(e)}
-        
+
+# ---------------------- Sync coordinator (single-flight) ----------------------
+# Only one fetch_contacts_and_update runs per process. Callers arriving while a
+# sync is in flight wait for (and share) its result instead of starting another;
+# routes never sync inline, they read the last computed REF_FILE and at most
+# trigger a background sync when that snapshot is stale. Across workers, each
+# sync holds a non-blocking flock on SYNC_LOCK_FILE, so a route-triggered sync in
+# a follower never overlaps the updater leader's.
+SYNC_MIN_INTERVAL = int(os.getenv("SYNC_MIN_INTERVAL", 30))  # seconds between syncs
+SYNC_LOCK_FILE = os.path.join(os.path.dirname(TOKEN_FILE), "sync.lock")
+SYNC_STALE_MARGIN = int(os.getenv("SYNC_STALE_MARGIN", 60))  # seconds followers allow the leader beyond its schedule
+
+_sync_cond = threading.Condition()
+_sync_running = False
+_sync_generation = 0
+LAST_SYNC = {"at": None, "result": None, "started_at": None, "finished_at": None}
+
+@contextlib.contextmanager
+def sync_lock():
+    """
+    Non-blocking flock on SYNC_LOCK_FILE for the length of one sync, shared by
+    every worker. Yields False when another process is already syncing.
+    """
+    if fcntl is None:
+        yield True
+        return
+    lock_dir = os.path.dirname(SYNC_LOCK_FILE)
+    if lock_dir and not os.path.exists(lock_dir):
+        os.makedirs(lock_dir, exist_ok=True)
+    with open(SYNC_LOCK_FILE, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _sync_worker(kwargs):
+    global _sync_running, _sync_generation
+    try:
+        with sync_lock() as acquired:
+            if acquired:
+                result = fetch_contacts_and_update(**kwargs)
+            else:
+                app.logger.info("[SYNC] Skipped: another worker is syncing.")
+                result = {"status": "in-progress", "message": "another worker is syncing"}
+    except Exception as e:
+        app.logger.warning("[WARN] Sync failed: %s", e)
+        result = {"status": "error", "message": str(e)}
+    with _sync_cond:
+        LAST_SYNC["result"] = result
+        LAST_SYNC["finished_at"] = time.time()
+        if result.get("status") == "ok":
+            LAST_SYNC["at"] = int(LAST_SYNC["finished_at"])
+        _sync_running = False
+        _sync_generation += 1
+        _sync_cond.notify_all()
+    if result.get("status") == "ok":
+        try:
+            run_daily_snapshot_job()
+        except Exception as e:
+            app.logger.warning("[SNAPSHOT] Scheduled snapshot failed: %s", e)
+    return result
+
+def run_sync(wait=True, force=False, **kwargs):
+    """
+    Run fetch_contacts_and_update through the single-flight coordinator.
+
+    wait=True blocks until a sync result is available: either the sync this
+    call started or the one already in flight. wait=False starts the sync in
+    a background thread and returns {"status": "started"} (or "in-progress").
+    Unless `force`, a sync finished less than SYNC_MIN_INTERVAL seconds ago is
+    reused instead of starting a new one (returned with "throttled": True).
+    """
+    global _sync_running
+    with _sync_cond:
+        if _sync_running:
+            if not wait:
+                return {"status": "in-progress"}
+            generation = _sync_generation
+            while _sync_generation == generation:
+                _sync_cond.wait()
+            return LAST_SYNC["result"]
+
+        finished_at = LAST_SYNC["finished_at"]
+        if not force and finished_at and time.time() - finished_at < SYNC_MIN_INTERVAL:
+            return dict(LAST_SYNC["result"] or {}, throttled=True)
+
+        _sync_running = True
+        LAST_SYNC["started_at"] = time.time()
+
+    if wait:
+        return _sync_worker(kwargs)
+    threading.Thread(target=_sync_worker, args=(kwargs,), daemon=True).start()
+    return {"status": "started"}
+
+def sync_in_progress():
+    return _sync_running
+
+def get_last_synced_at():
+    """
+    Unix time of the last successful sync by any worker: SYNC_STATE_FILE is
+    rewritten after every successful sync, so its mtime covers syncs run by
+    the updater leader in another process.
+    """
+    last = LAST_SYNC["at"]
+    try:
+        mtime = int(os.path.getmtime(SYNC_STATE_FILE))
+        if last is None or mtime > last:
+            last = mtime
+    except OSError:
+        pass
+    return last
+
+def trigger_sync(force=False):
+    """Non-blocking: start a background sync unless one is running. Returns True if started."""
+    return run_sync(wait=False, force=force).get("status") == "started"
+
+def sync_stale_after():
+    """
+    Age at which routes refresh the data. The updater leader syncs every
+    UPDATE_INTERVAL on its own; other workers only step in once it is a full
+    poll plus SYNC_STALE_MARGIN late (the leader is down or its syncs fail).
+    """
+    if is_updater_leader():
+        return UPDATE_INTERVAL
+    return UPDATE_INTERVAL + UPDATER_POLL_INTERVAL + SYNC_STALE_MARGIN
+
+def trigger_sync_if_stale(max_age=None):
+    max_age = sync_stale_after() if max_age is None else max_age
+    last = get_last_synced_at()
+    if last is None or time.time() - last >= max_age:
+        return trigger_sync()
+    return False
+
+def format_synced_at(ts):
+    if not ts:
+        return None
+    return datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+# ---------------------- Background updater (leader-elected) ----------------------
+# Under gunicorn every worker starts an updater thread (see gunicorn.conf.py), but
+# only the worker holding an exclusive flock on UPDATER_LOCK_FILE syncs. The OS
+# drops the lock when that worker dies, and a follower takes over on its next poll.
+UPDATER_LOCK_FILE = os.path.join(os.path.dirname(TOKEN_FILE), "updater.lock")
+UPDATER_POLL_INTERVAL = int(os.getenv("UPDATER_POLL_INTERVAL", min(UPDATE_INTERVAL, 30)))  # seconds
+
+_updater_lock_fd = None
+_updater_started = False
+_updater_start_lock = threading.Lock()
+
+def acquire_updater_leadership():
+    """Try (non-blocking) to become the updater leader. Returns True while this process holds the lock."""
+    global _updater_lock_fd
+    if _updater_lock_fd is not None:
+        return True
+    if fcntl is None:
+        # no flock on this platform: single-process deployments only
+        _updater_lock_fd = -1
+        return True
+    try:
+        lock_dir = os.path.dirname(UPDATER_LOCK_FILE)
+        if lock_dir and not os.path.exists(lock_dir):
+            os.makedirs(lock_dir, exist_ok=True)
+        fd = os.open(UPDATER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        app.logger.warning("Failed to open updater lock %s: %s", UPDATER_LOCK_FILE, e)
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode("utf-8"))
+    _updater_lock_fd = fd
+    app.logger.info("[UPDATER] pid %s is now the background updater leader.", os.getpid())
+    return True
+
+def is_updater_leader():
+    return _updater_lock_fd is not None
+
 def background_updater():
     while True:
-        fetch_contacts_and_update()
-        time.sleep(UPDATE_INTERVAL)
+        try:
+            if acquire_updater_leadership():
+                last = max(get_last_synced_at() or 0, LAST_SYNC["finished_at"] or 0)
+                if time.time() - last >= UPDATE_INTERVAL:
+                    run_sync()
+                maybe_compact_user_log()
+        except Exception as e:
+            app.logger.warning("[UPDATER] Periodic sync failed: %s", e)
+        time.sleep(UPDATER_POLL_INTERVAL)
+
+def start_background_updater():
+    """Start the updater thread once per process (safe to call from every gunicorn worker)."""
+    global _updater_started
+    with _updater_start_lock:
+        if _updater_started:
+            return False
+        _updater_started = True
+    threading.Thread(target=background_updater, daemon=True).start()
+    return True
 
 # ---------------------- Daily snapshot helpers & routes ----------------------
-def build_today_snapshot():
+def _snapshot_counts():
     """
-    Read REF_FILE and produce {'date': 'YYYY-MM-DD', 'counts': {label: count}}
+    Read REF_FILE and produce {label: count}: TEAMn for teams, REF labels for solos,
+    and every label known in the user store (zero if it has no count yet).
     """
     refs = load_json(REF_FILE, {})
     counts = {}
@@ -587,106 +2409,636 @@ def build_today_snapshot():
             counts[label] = counts.get(label, 0) + c
 
     # Ensure teams known in DATA_FILE are present with zero if missing
-    users = load_json(DATA_FILE, []) or []
+    users = all_users()
     if isinstance(users, list):
         for u in users:
             tl = (u.get("team_label") or "").strip()
             if tl:
                 counts.setdefault(tl, 0)
+    return counts
 
+def build_today_snapshot():
+    """
+    Read REF_FILE and produce {'date': 'YYYY-MM-DD', 'counts': {label: count}}
+    """
     date_str = datetime.utcnow().date().isoformat()
-    return {"date": date_str, "counts": counts}
-
-
-
+    return {"date": date_str, "counts": _snapshot_counts()}
 
 def build_yesterday_snapshot_from_actual_counts():
     """
     Build a snapshot for yesterday using the actual referral counts in REF_FILE.
+    Nothing is written: pass the result to append_daily_snapshot to record it.
     """
-    refs = load_json(REF_FILE, {})  # load current REF_FILE for counts
-    counts = {}
-
-    if isinstance(refs, dict):
-        # Teams: prefer ALL group if present
-        if "ALL" in refs and isinstance(refs["ALL"], dict):
-            source = refs["ALL"]
-            for k, v in source.items():
-                try:
-                    label = f"TEAM{int(k)}"
-                except Exception:
-                    label = str((v or {}).get("team_label") or f"TEAM{str(k)}")
-                counts[label] = safe_int((v or {}).get("referrals", 0))
-        else:
-            # Aggregate from all groups
-            for g, teams in refs.items():
-                if g == "SOLO" or not isinstance(teams, dict):
-                    continue
-                for k, v in teams.items():
-                    try:
-                        label = f"TEAM{int(k)}"
-                    except Exception:
-                        label = str((v or {}).get("team_label") or f"TEAM{str(k)}")
-                    counts[label] = counts.get(label, 0) + safe_int((v or {}).get("referrals", 0))
-
-        # Solos
-        solo = refs.get("SOLO", {}) or {}
-        for k, v in solo.items():
-            label = str((v or {}).get("team_label") or k)
-            counts[label] = counts.get(label, 0) + safe_int((v or {}).get("referrals", 0))
-
-    # Ensure teams known in DATA_FILE are present
-    users = load_json(DATA_FILE, []) or []
-    for u in users:
-        tl = (u.get("team_label") or "").strip()
-        if tl:
-            counts.setdefault(tl, 0)
-
     yesterday_str = (datetime.utcnow().date() - timedelta(days=1)).isoformat()
-    snapshot = {"date": yesterday_str, "counts": counts}
-
-    # Save snapshot
-    save_json(f"snapshot_{yesterday_str}.json", snapshot)
-    app.logger.info(f"[SNAPSHOT] Snapshot for {yesterday_str} created from actual counts.")
-    return snapshot
+    return {"date": yesterday_str, "counts": _snapshot_counts()}
+
+# daily_refs.json (format 2): a keyframe with the full cumulative counts every
+# DAILY_KEYFRAME_INTERVAL days, and in between only the labels whose count changed
+# since the previous day:
+#   {"format": 2, "keyframe_interval": 30, "days": [
+#       {"date": "2025-11-10", "counts": {...}},                        keyframe
+#       {"date": "2025-11-11", "changed": {...}, "removed": [...]}]}    delta
+# Legacy files (every day a full "counts" dict) read as all-keyframe histories and
+# are re-encoded on the next append. Any day is rebuilt from the keyframe before it.
+DAILY_FORMAT = 2
+DAILY_KEYFRAME_INTERVAL = max(1, int(os.getenv("DAILY_KEYFRAME_INTERVAL", 30)))  # days
+
+_daily_index = {"key": None, "days": None, "dates": {}, "keyframes": []}
+_daily_index_lock = threading.Lock()
 
 def read_daily_file():
     return load_json(DAILY_FILE, {"days": []})
 
+def _apply_daily_entry(counts, entry):
+    if "counts" in entry:
+        counts.clear()
+        counts.update(entry.get("counts") or {})
+        return
+    counts.update(entry.get("changed") or {})
+    for label in entry.get("removed") or ():
+        counts.pop(label, None)
+
+def iter_daily_counts(days):
+    """Yield (date, counts) for every day in order. `counts` is one running dict: copy it to keep it."""
+    counts = {}
+    for entry in days:
+        _apply_daily_entry(counts, entry)
+        yield entry.get("date"), counts
+
+def daily_index(days):
+    """{date: position} plus the keyframe positions, rebuilt only when the history changes."""
+    key = _daily_key(days)
+    with _daily_index_lock:
+        if _daily_index["key"] != key:
+            _daily_index["dates"] = {d.get("date"): i for i, d in enumerate(days)}
+            _daily_index["keyframes"] = [i for i, d in enumerate(days) if "counts" in d]
+            _daily_index["key"], _daily_index["days"] = key, days
+        return _daily_index
+
+def daily_counts_at(days, pos):
+    """Full counts of day `pos`: the keyframe at or before it plus the deltas up to it."""
+    keyframes = daily_index(days)["keyframes"]
+    k = bisect.bisect_right(keyframes, pos) - 1
+    start = keyframes[k] if k >= 0 else 0
+    counts = {}
+    for entry in days[start:pos + 1]:
+        _apply_daily_entry(counts, entry)
+    return counts
+
+def get_daily_counts(date, daily=None):
+    """Counts recorded for `date` (YYYY-MM-DD), or None when there is no snapshot for it."""
+    days = (daily if daily is not None else read_daily_file()).get("days", [])
+    pos = daily_index(days)["dates"].get(date)
+    return None if pos is None else daily_counts_at(days, pos)
+
+def encode_daily_entry(date, counts, previous, pos):
+    if previous is None or pos % DAILY_KEYFRAME_INTERVAL == 0:
+        return {"date": date, "counts": dict(counts)}
+    entry = {"date": date, "changed": {l: c for l, c in counts.items() if previous.get(l) != c}}
+    removed = [l for l in previous if l not in counts]
+    if removed:
+        entry["removed"] = removed
+    return entry
+
+def encode_daily_history(days):
+    """Re-encode any history (legacy or format 2) as keyframes + deltas."""
+    encoded, previous = [], None
+    for pos, (date, counts) in enumerate(iter_daily_counts(days)):
+        encoded.append(encode_daily_entry(date, counts, previous, pos))
+        previous = dict(counts)
+    return {"format": DAILY_FORMAT, "keyframe_interval": DAILY_KEYFRAME_INTERVAL, "days": encoded}
+
 def append_daily_snapshot(snapshot):
     """
-    Append today's snapshot only if not already present for today's date.
-    Keep at most 90 entries.
+    Append a snapshot unless its date is already recorded (O(1) through the date index).
+    The full history is kept; only the changed labels are stored between keyframes.
     Returns (ok: bool, reason: str)
     """
     if not isinstance(snapshot, dict) or "date" not in snapshot or "counts" not in snapshot:
         return False, "invalid-snapshot"
 
-    data = read_daily_file()
-    days = data.get("days", [])
+    with json_file_lock(DAILY_FILE):
+        data = read_daily_file()
+        days = data.get("days", [])
+
+        # avoid duplicates
+        if snapshot["date"] in daily_index(days)["dates"]:
+            return False, "duplicate-date"
 
-    # avoid duplicates
-    if any(d.get("date") == snapshot["date"] for d in days):
-        return False, "duplicate-date"
+        if days and data.get("format") != DAILY_FORMAT:
+            data = encode_daily_history(days)
+            days = data["days"]
+        data["format"] = DAILY_FORMAT
+        data["keyframe_interval"] = DAILY_KEYFRAME_INTERVAL
 
-    days.append(snapshot)
-    # cap at 90
-    if len(days) > 90:
-        days = days[-90:]
-    data["days"] = days
+        key_before = _daily_key(days)
+        previous = daily_counts_at(days, len(days) - 1) if days else None
+        days.append(encode_daily_entry(snapshot["date"], snapshot["counts"], previous, len(days)))
+        data["days"] = days
 
-    # save and push to GitHub (we now allow DAILY_FILE to be pushed)
+        # save and push to GitHub (we now allow DAILY_FILE to be pushed)
+        try:
+            save_json(DAILY_FILE, data, push_to_github=True)
+            _daily_matrix_appended(key_before, days, snapshot["counts"])
+            return True, "saved"
+        except Exception as e:
+            app.logger.error(f"[ERROR] append_daily_snapshot save failed: {e}")
+            return False, str(e)
+
+# ---------------------- Daily progress matrix ----------------------
+# The daily history as a dense label x day integer matrix (NumPy when installed,
+# one array('q') row per label otherwise), with row/column reductions computed
+# once per change instead of per page view. append_daily_snapshot fills the new
+# column in place; other writers (another worker, a restore) and re-encoded
+# legacy histories are picked up through _daily_key.
+DAILY_MATRIX_BACKEND = os.getenv("DAILY_MATRIX_BACKEND", "auto").strip().lower()  # auto|numpy|array
+DAILY_MIN_COLUMNS = 30  # the daily-progress page always shows Day 1..30
+
+_daily_matrix = {"key": None, "days": None, "matrix": None}
+_daily_matrix_lock = threading.Lock()
+
+def _use_numpy():
+    return np is not None and DAILY_MATRIX_BACKEND in ("auto", "numpy")
+
+def _daily_key(days):
+    """
+    Cache key of a history: the list's identity (load_json hands out the same list
+    until the file changes; a reload or a re-encode makes a new one) plus its
+    length and end dates (appends grow the same list). The caches keep a reference
+    to the list they were built from, so its id cannot be reused meanwhile.
+    """
+    return (id(days), len(days), days[0].get("date"), days[-1].get("date")) if days else (id(days), 0, None, None)
+
+def _daily_set_column(mx, col, counts):
+    index, cells = mx["index"], mx["cells"]
+    if mx["backend"] == "numpy":
+        rows = [index[str(l)] for l in counts]
+        cells[rows, col] = [safe_int(c) for c in counts.values()]
+    else:
+        for label, c in counts.items():
+            cells[index[str(label)]][col] = safe_int(c)
+
+def _daily_copy_column(mx, src, dst):
+    cells = mx["cells"]
+    if mx["backend"] == "numpy":
+        cells[:, dst] = cells[:, src]
+    else:
+        for row in cells:
+            row[dst] = row[src]
+
+def build_daily_matrix(days):
+    labels = sorted({str(l) for d in days for l in (d.get("counts") or d.get("changed") or {})})
+    width = max(DAILY_MIN_COLUMNS, len(days))
+    mx = {
+        "labels": labels,
+        "index": {l: i for i, l in enumerate(labels)},
+        "dates": [d.get("date") for d in days] + [None] * (width - len(days)),
+        "days": len(days),
+        "backend": "numpy" if _use_numpy() else "array",
+    }
+    if mx["backend"] == "numpy":
+        mx["cells"] = np.zeros((len(labels), width), dtype=np.int64)
+    else:
+        mx["cells"] = [array("q", bytes(8 * width)) for _ in labels]
+    for col, d in enumerate(days):
+        if "counts" in d or col == 0:
+            _daily_set_column(mx, col, d.get("counts") or d.get("changed") or {})
+            continue
+        # delta day: yesterday's column with the changed labels overwritten
+        _daily_copy_column(mx, col - 1, col)
+        _daily_set_column(mx, col, d.get("changed") or {})
+        _daily_set_column(mx, col, dict.fromkeys(d.get("removed") or (), 0))
+    mx["stats"] = _daily_matrix_stats(mx)
+    return mx
+
+def _daily_add_column(mx):
+    """Make room for one more day past the displayed width (NumPy grows its capacity by doubling)."""
+    mx["dates"].append(None)
+    width = len(mx["dates"])
+    cells = mx["cells"]
+    if mx["backend"] == "numpy":
+        if width > cells.shape[1]:
+            grown = np.zeros((cells.shape[0], max(width, 2 * cells.shape[1])), dtype=np.int64)
+            grown[:, :cells.shape[1]] = cells
+            mx["cells"] = grown
+    else:
+        for row in cells:
+            row.append(0)
+
+def _daily_matrix_stats(mx):
+    """Vectorized reductions: day/label totals, clamped per-day deltas, growth and display orders."""
+    latest_index = max(0, mx["days"] - 1)
+    cells = mx["cells"]
+    if mx["backend"] == "numpy":
+        cells = cells[:, :len(mx["dates"])]
+        day_totals = cells.sum(axis=0)
+        label_totals = cells.sum(axis=1)
+        deltas = np.diff(cells, axis=1, prepend=0) if cells.size else cells
+        np.maximum(deltas, 0, out=deltas)
+        delta_totals = deltas.sum(axis=0)
+        prev = day_totals[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth = np.where(prev > 0, delta_totals[1:] / np.where(prev > 0, prev, 1), np.nan)
+        latest = cells[:, latest_index] if cells.size else np.zeros(0, dtype=np.int64)
+        stats = {
+            "day_counts": cells.tolist(),
+            "day_totals": day_totals.tolist(),
+            "label_totals": label_totals.tolist(),
+            "latest": latest.tolist(),
+            "delta_totals": delta_totals.tolist(),
+            "growth": [None] + [None if g != g else round(float(g), 4) for g in growth.tolist()],
+            "order_latest": np.argsort(-latest, kind="stable").tolist(),
+            "order_total": np.argsort(-label_totals, kind="stable").tolist(),
+        }
+    else:
+        width = len(mx["dates"])
+        day_totals = [sum(col) for col in zip(*cells)] if cells else [0] * width
+        label_totals = [sum(row) for row in cells]
+        delta_totals = [0] * width
+        for row in cells:
+            prev = 0
+            for j, cur in enumerate(row):
+                if cur > prev:
+                    delta_totals[j] += cur - prev
+                prev = cur
+        latest = [row[latest_index] for row in cells]
+        stats = {
+            "day_counts": [row.tolist() for row in cells],
+            "day_totals": day_totals,
+            "label_totals": label_totals,
+            "latest": latest,
+            "delta_totals": delta_totals,
+            "growth": [None] + [round(d / p, 4) if p > 0 else None for d, p in zip(delta_totals[1:], day_totals[:-1])],
+            "order_latest": sorted(range(len(cells)), key=lambda i: -latest[i]),
+            "order_total": sorted(range(len(cells)), key=lambda i: -label_totals[i]),
+        }
+    stats["latest_index"] = latest_index
+    return stats
+
+def get_daily_matrix(daily=None):
+    days = (daily if daily is not None else read_daily_file()).get("days", [])
+    key = _daily_key(days)
+    with _daily_matrix_lock:
+        if _daily_matrix["key"] != key:
+            _daily_matrix["matrix"] = build_daily_matrix(days)
+            _daily_matrix["key"], _daily_matrix["days"] = key, days
+        return _daily_matrix["matrix"]
+
+def _daily_matrix_appended(days_before_key, days, counts):
+    """Called after a snapshot (full `counts`) was appended: fill one column when possible, else rebuild."""
+    with _daily_matrix_lock:
+        mx = _daily_matrix["matrix"]
+        snapshot = days[-1] if days else {}
+        if (mx is None or _daily_matrix["key"] != days_before_key or mx["days"] + 1 != len(days)
+                or any(str(l) not in mx["index"] for l in counts)):
+            _daily_matrix["matrix"] = build_daily_matrix(days)
+        else:
+            if mx["days"] >= len(mx["dates"]):
+                _daily_add_column(mx)
+            _daily_set_column(mx, mx["days"], counts)
+            mx["dates"][mx["days"]] = snapshot.get("date")
+            mx["days"] += 1
+            mx["stats"] = _daily_matrix_stats(mx)
+        _daily_matrix["key"], _daily_matrix["days"] = _daily_key(days), days
+
+# ---------------------- Scheduled daily snapshots ----------------------
+# After every successful sync, run_daily_snapshot_job records the synced counts
+# under the day they close (syncs after DAILY_SNAPSHOT_CUTOFF count towards the
+# next day) and appends a snapshot for every closed day missing from DAILY_FILE
+# that was observed, using the last counts synced before that day's cutoff. Days
+# no sync observed (downtime, the days before the first run) are left out rather
+# than filled with another day's counts. The job runs under a file lock and
+# append_daily_snapshot skips dates already recorded, so workers racing on the
+# same cutoff write each day once. While it is enabled, the manual and lazy
+# snapshot paths go through the job too: a day is only written once it closed.
+DAILY_SNAPSHOT_ENABLED = os.getenv("DAILY_SNAPSHOT_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+DAILY_SNAPSHOT_CUTOFF = os.getenv("DAILY_SNAPSHOT_CUTOFF", "23:55")  # HH:MM, UTC
+DAILY_SNAPSHOT_MAX_BACKFILL = int(os.getenv("DAILY_SNAPSHOT_MAX_BACKFILL", 31))  # days
+DAILY_SCHEDULE_FILE = os.path.join(os.path.dirname(TOKEN_FILE), "daily_schedule.json")
+
+def _cutoff_minutes():
     try:
-        save_json(DAILY_FILE, data, push_to_github=True)
-        return True, "saved"
-    except Exception as e:
-        app.logger.error(f"[ERROR] append_daily_snapshot save failed: {e}")
-        return False, str(e)
+        hours, minutes = DAILY_SNAPSHOT_CUTOFF.split(":")
+        return min(24 * 60 - 1, max(0, int(hours) * 60 + int(minutes)))
+    except Exception:
+        app.logger.warning("Invalid DAILY_SNAPSHOT_CUTOFF %r, using 23:55", DAILY_SNAPSHOT_CUTOFF)
+        return 23 * 60 + 55
+
+def _closing_day(ts):
+    """The day whose snapshot a sync at `ts` counts towards."""
+    dt = datetime.utcfromtimestamp(ts)
+    day = dt.date()
+    return day + timedelta(days=1) if dt.hour * 60 + dt.minute >= _cutoff_minutes() else day
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def run_daily_snapshot_job(now=None, counts=None):
+    """Record this sync's counts and append snapshots for closed days that are missing."""
+    if not DAILY_SNAPSHOT_ENABLED:
+        return {"skipped": True, "reason": "disabled"}
+    now = now or time.time()
+    t0 = time.perf_counter()
+    with json_file_lock(DAILY_SCHEDULE_FILE):
+        state = _read_state_file(DAILY_SCHEDULE_FILE)
+        history = state.setdefault("history", {})
+        current = {"at": int(now), "counts": counts if counts is not None else _snapshot_counts()}
+        history[_closing_day(now).isoformat()] = current
+
+        latest_closed = _closing_day(now) - timedelta(days=1)
+        days = read_daily_file().get("days", [])
+        last_recorded = _parse_day(days[-1].get("date")) if days else None
+        first_due = last_recorded + timedelta(days=1) if last_recorded else latest_closed
+        first_due = max(first_due, latest_closed - timedelta(days=DAILY_SNAPSHOT_MAX_BACKFILL - 1))
+
+        taken, skipped, unobserved = [], [], []
+        day = first_due
+        while day <= latest_closed:
+            date_str = day.isoformat()
+            source = history.get(date_str)
+            if source is None:
+                unobserved.append(date_str)
+            else:
+                ok, reason = append_daily_snapshot({"date": date_str, "counts": source["counts"]})
+                if ok:
+                    taken.append({"date": date_str, "counts_from": source["at"]})
+                elif reason != "duplicate-date":
+                    skipped.append(date_str)
+            day += timedelta(days=1)
+
+        # drop observations past the backfill window
+        oldest = (latest_closed - timedelta(days=DAILY_SNAPSHOT_MAX_BACKFILL)).isoformat()
+        for key in [k for k in history if k < oldest]:
+            history.pop(key)
+
+        run = {
+            "at": int(now),
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "snapshots": taken,
+            "backfilled": sum(1 for t in taken if t["date"] != latest_closed.isoformat()),
+            "skipped": skipped,
+            "unobserved": unobserved,
+        }
+        state["last_run"] = run
+        if taken or skipped:
+            state["runs"] = (state.get("runs") or [])[-49:] + [run]
+        _write_state_file(DAILY_SCHEDULE_FILE, state)
+
+    if taken:
+        app.logger.info("[SNAPSHOT] Recorded %s in %.1f ms (%d backfilled).",
+                        ", ".join(t["date"] for t in taken), run["duration_ms"], run["backfilled"])
+    return run
+
+def daily_schedule_status():
+    state = _read_state_file(DAILY_SCHEDULE_FILE)
+    return {
+        "enabled": DAILY_SNAPSHOT_ENABLED,
+        "cutoff_utc": DAILY_SNAPSHOT_CUTOFF,
+        "observed_days": sorted(state.get("history") or {}),
+        "last_run": state.get("last_run"),
+        "runs": state.get("runs") or [],
+    }
+
+# ---------------------- Rendered page cache ----------------------
+# Rendered HTML is kept per (route, args) together with the data version it was
+# rendered from. The version combines an in-process counter bumped by every write
+# (save_json, user store) with the stat of the shared files, so writes made by
+# other workers invalidate it too. Entries are evicted LRU past HTML_CACHE_MAX_BYTES.
+HTML_CACHE_MAX_BYTES = int(os.getenv("HTML_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+
+_html_cache = OrderedDict()  # key -> {"version", "body", "etag"}
+_html_cache_lock = threading.Lock()
+_html_cache_state = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+_data_version = [0]
+
+def bump_data_version():
+    with _html_cache_lock:
+        _data_version[0] += 1
+
+def data_version():
+    if _sqlite_kind(DATA_FILE):
+        files = (SQLITE_DB_FILE, SQLITE_DB_FILE + "-wal", LEADERBOARD_FILE)
+    else:
+        files = (REF_FILE, LEADERBOARD_FILE, USER_LOG_FILE, DATA_FILE)
+    return (_data_version[0],) + tuple(_file_stat_key(p) for p in files)
+
+def _html_cache_store(key, entry):
+    size = len(entry["body"])
+    if size > HTML_CACHE_MAX_BYTES:
+        return
+    with _html_cache_lock:
+        old = _html_cache.pop(key, None)
+        if old:
+            _html_cache_state["bytes"] -= len(old["body"])
+        _html_cache[key] = entry
+        _html_cache_state["bytes"] += size
+        while _html_cache_state["bytes"] > HTML_CACHE_MAX_BYTES:
+            _, evicted = _html_cache.popitem(last=False)
+            _html_cache_state["bytes"] -= len(evicted["body"])
+            _html_cache_state["evictions"] += 1
+
+def cached_html(key, render):
+    """
+    Serve `render()` (a str of HTML) from the page cache while the data version is
+    unchanged, with a strong ETag so repeat visitors get 304 Not Modified.
+    Non-str results (redirects, error tuples) are returned as-is and not cached.
+    """
+    version = data_version()
+    with _html_cache_lock:
+        entry = _html_cache.get(key)
+        if entry and entry["version"] == version:
+            _html_cache.move_to_end(key)
+            _html_cache_state["hits"] += 1
+        else:
+            entry = None
+            _html_cache_state["misses"] += 1
+    if entry is None:
+        body = render()
+        if not isinstance(body, str):
+            return body
+        body = body.encode("utf-8")
+        entry = {"version": version, "body": body, "etag": hashlib.sha1(body).hexdigest()}
+        _html_cache_store(key, entry)
+
+    resp = Response(entry["body"], mimetype="text/html")
+    resp.set_etag(entry["etag"])
+    resp.headers["Cache-Control"] = "no-cache"  # always revalidate; 304 is cheap
+    return resp.make_conditional(request)
+
+def html_cache_status():
+    with _html_cache_lock:
+        return dict(_html_cache_state, entries=len(_html_cache), max_bytes=HTML_CACHE_MAX_BYTES,
+                    data_version=_data_version[0])
+
+# ---------------------- Live updates (Server-Sent Events) ----------------------
+# Leaderboard changes are published as events to every open /events stream. The
+# worker that writes the leaderboard publishes right away; every other worker
+# notices the new leaderboard.json through a stat() poll (one watcher thread per
+# process, started by the first subscriber). Streams only block on a Condition
+# with a timeout. Under the gevent worker (the default, see gunicorn.conf.py) an
+# open stream costs a greenlet; under gthread it pins a thread. Either way each
+# worker admits at most sse_max_subscribers() streams and answers the rest with
+# 503, after which the progress page polls /api/v1/progress instead.
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", 2))   # seconds
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))          # seconds between keep-alive comments
+SSE_MAX_DURATION = float(os.getenv("SSE_MAX_DURATION", 300))   # seconds; browsers reconnect on their own
+SSE_BACKLOG = int(os.getenv("SSE_BACKLOG", 64))                # events kept for slow readers
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", 0))  # per worker; 0 = derive from the worker config
+
+_sse_cond = threading.Condition()
+_sse_state = {"id": 0, "events": deque(maxlen=SSE_BACKLOG), "view": None, "stat": None,
+              "subscribers": 0, "watcher": None}
+
+def _leaderboard_changes(old, new):
+    """{group: {key: entry}} for every entry whose referrals, rank or gap moved."""
+    changes = {}
+    old_groups = (old or {}).get("groups") or {}
+    for group, entries in (new.get("groups") or {}).items():
+        before = {e["key"]: e for e in old_groups.get(group, [])}
+        for e in entries:
+            prev = before.get(e["key"])
+            if not prev or (prev["referrals"], prev["rank"], prev["gap"]) != (e["referrals"], e["rank"], e["gap"]):
+                changes.setdefault(group, {})[e["key"]] = dict(e, total=len(entries))
+    return changes
+
+def publish_leaderboard(view, stat=None):
+    with _sse_cond:
+        previous = _sse_state["view"]
+        _sse_state["view"] = view
+        _sse_state["stat"] = stat or _file_stat_key(LEADERBOARD_FILE)
+        if previous is None:
+            return 0
+        changes = _leaderboard_changes(previous, view)
+        if not changes:
+            return 0
+        _sse_state["id"] += 1
+        _sse_state["events"].append({"id": _sse_state["id"], "changes": changes, "top": view.get("top", [])})
+        _sse_cond.notify_all()
+        return len(changes)
+
+def _sse_poll():
+    stat = _file_stat_key(LEADERBOARD_FILE)
+    if stat is not None and stat != _sse_state["stat"]:
+        publish_leaderboard(load_json(LEADERBOARD_FILE, {}), stat=stat)
+
+def _sse_watcher():
+    while True:
+        time.sleep(SSE_POLL_INTERVAL)
+        if _sse_state["subscribers"]:
+            try:
+                _sse_poll()
+            except Exception as e:
+                app.logger.warning("[WARN] SSE leaderboard poll failed: %s", e)
+
+def _sse_start_watcher():
+    if _sse_state["view"] is None:
+        # loaded outside _sse_cond: get_leaderboard takes the REF_FILE lock, and
+        # writers such as register publish while holding that lock
+        stat = _file_stat_key(LEADERBOARD_FILE)
+        view = get_leaderboard()
+        with _sse_cond:
+            if _sse_state["view"] is None:
+                _sse_state["stat"], _sse_state["view"] = stat, view
+    with _sse_cond:
+        if _sse_state["watcher"] is None:
+            _sse_state["watcher"] = threading.Thread(target=_sse_watcher, daemon=True, name="sse-watcher")
+            _sse_state["watcher"].start()
+
+def sse_max_subscribers():
+    """
+    Streams one worker admits. gevent: 90% of GUNICORN_WORKER_CONNECTIONS, the
+    rest is left for ordinary requests. gthread: half of GUNICORN_THREADS.
+    """
+    if SSE_MAX_SUBSCRIBERS > 0:
+        return SSE_MAX_SUBSCRIBERS
+    if cooperative():
+        return max(1, int(int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000)) * 0.9))
+    return max(1, int(os.getenv("GUNICORN_THREADS", 32)) // 2)
+
+def _sse_admit():
+    with _sse_cond:
+        if _sse_state["subscribers"] >= sse_max_subscribers():
+            return False
+        _sse_state["subscribers"] += 1
+        return True
+
+def _sse_release():
+    with _sse_cond:
+        _sse_state["subscribers"] -= 1
+
+def _sse_format(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {dumps_json(data).decode('utf-8')}\n\n"
+
+def sse_stream(select):
+    """
+    Yield an SSE stream: a `snapshot` event, then `update` events as syncs change
+    the leaderboard. `select(view, changes)` picks the payload for this subscriber
+    (changes is None for a snapshot) and returns None to skip an event.
+    """
+    _sse_start_watcher()
+    with _sse_cond:
+        last_id, view = _sse_state["id"], _sse_state["view"]
+    yield f"retry: {int(SSE_POLL_INTERVAL * 1000) + 1000}\n\n"
+    yield _sse_format("snapshot", select(view, None), last_id)
+    deadline = time.time() + SSE_MAX_DURATION
+    while time.time() < deadline:
+        with _sse_cond:
+            _sse_cond.wait_for(lambda: _sse_state["id"] > last_id, timeout=SSE_HEARTBEAT)
+            events = [e for e in _sse_state["events"] if e["id"] > last_id]
+            missed = bool(events) and events[0]["id"] > last_id + 1
+            last_id, view = _sse_state["id"], _sse_state["view"]
+        if not events:
+            yield ": ping\n\n"
+        elif missed:
+            # fell further behind than the backlog: resend the full state
+            yield _sse_format("snapshot", select(view, None), last_id)
+        else:
+            for e in events:
+                payload = select(view, e)
+                if payload is not None:
+                    yield _sse_format("update", payload, e["id"])
+
+def sse_select_label(group, key):
+    def select(view, event):
+        if event is None:
+            return leaderboard_rank(view, group, key) or {"group": group, "key": key, "referrals": 0}
+        return (event["changes"].get(group) or {}).get(key)
+    return select
+
+def sse_select_leaderboard(view, event):
+    if event is None:
+        return {"groups": leaderboard_groups(view), "top": view.get("top", [])}
+    return {"changes": event["changes"], "top": event["top"]}
+
+def sse_response(select):
+    """
+    Stream sse_stream(select), or 503 when this worker is at sse_max_subscribers().
+    The slot is released when the server closes the response, even one never iterated.
+    """
+    if not _sse_admit():
+        inc_counter("sse_rejected_total")
+        return Response("Too many live subscribers, poll the JSON API instead\n", status=503, mimetype="text/plain",
+                        headers={"Retry-After": str(int(SSE_MAX_DURATION)), "Cache-Control": "no-cache"})
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            _sse_release()
+
+    response = Response(sse_stream(select), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(release)
+    return response
 
 # ---------------------- Routes ----------------------
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return cached_html(("index",), lambda: render_template("index.html"))
 
 @app.route("/register", methods=["POST"])
 def register():
@@ -704,8 +3056,7 @@ def register():
 
     ref_id = normalize_ref_id(name)
 
-    users = load_json(DATA_FILE, [])
-    existing = next((u for u in users if normalize_ref_id(u.get("ref_id", "")) == ref_id), None)
+    existing = get_user(ref_id)
     if existing:
         return redirect(url_for("progress", ref_id=ref_id))
 
@@ -727,33 +3078,38 @@ def register():
         "registered_at": int(time.time())
     }
 
-    users.append(new_user)
-    save_json(DATA_FILE, users, push_to_github=True)
+    _, created = add_user(new_user)
+    if not created:
+        return redirect(url_for("progress", ref_id=ref_id))
 
-    referrals = load_json(REF_FILE, {})
-    referrals.setdefault("ALL", {})
+    with json_file_lock(REF_FILE):
+        referrals = load_json(REF_FILE, {})
+        referrals.setdefault("ALL", {})
 
-    if reg_type == "team":
-        referrals["ALL"].setdefault(str(assigned_number), {"team_label": label, "referrals": 0})
-    else:
-        referrals.setdefault("SOLO", {})
-        # store by canonical REF label so counting matches
-        referrals["SOLO"].setdefault(f"REF{int(assigned_number):03d}", {"team_label": label, "referrals": 0})
+        if reg_type == "team":
+            referrals["ALL"].setdefault(str(assigned_number), {"team_label": label, "referrals": 0})
+        else:
+            referrals.setdefault("SOLO", {})
+            # store by canonical REF label so counting matches
+            referrals["SOLO"].setdefault(f"REF{int(assigned_number):03d}", {"team_label": label, "referrals": 0})
 
-    save_json(REF_FILE, referrals, push_to_github=True)
+        save_json(REF_FILE, referrals, push_to_github=True)
+        update_leaderboard(referrals)
     return redirect(url_for("progress", ref_id=ref_id))
 
 @app.route("/progress/<ref_id>", methods=["GET", "POST"])
 def progress(ref_id):
-    # Try quick sync but ignore failure
+    # Serve the last synced counts; refresh in the background if they are stale
     try:
-        fetch_contacts_and_update()
+        trigger_sync_if_stale()
     except Exception as e:
-        app.logger.warning("[WARN] Auto-sync failed: %s", e)
+        app.logger.warning("[WARN] Auto-sync trigger failed: %s", e)
+
+    last_synced_at = format_synced_at(get_last_synced_at())
+    return cached_html(("progress", ref_id, last_synced_at), lambda: render_progress_page(ref_id, last_synced_at))
 
-    users = load_json(DATA_FILE, [])
-    norm = normalize_ref_id(ref_id)
-    user = next((u for u in users if normalize_ref_id(u.get("ref_id", "")) == norm), None)
+def render_progress_page(ref_id, last_synced_at=None):
+    user = get_user(ref_id)
     if not user:
         return "Invalid referral ID", 404
 
@@ -800,7 +3156,7 @@ def progress(ref_id):
             }
 
         team_info["referrals"] = safe_int(team_info.get("referrals", 0))
-        referral_goal = 1000
+        referral_goal = referral_goal_for("solo")
 
     # -------------------- TEAM LOGIC --------------------
     else:
@@ -816,26 +3172,13 @@ def progress(ref_id):
             "referrals": 0
         })
         team_info["referrals"] = safe_int(team_info.get("referrals", 0))
+        referral_goal = referral_goal_for("team", team_number)
 
-        # Team 2 special goal
-        if team_number == 2:
-            referral_goal = 100000
-        else:
-            referral_goal = 10000
-
-    # -------------------- SORT GROUP TEAMS --------------------
-    try:
-        normalized_group_teams = {
-            str(k): {"team_label": v.get("team_label"), "referrals": safe_int(v.get("referrals", 0))}
-            for k, v in (group_data or {}).items()
-        }
-        group_teams = dict(sorted(
-            normalized_group_teams.items(),
-            key=lambda kv: kv[1]["referrals"],
-            reverse=True
-        ))
-    except Exception:
-        group_teams = group_data
+    # -------------------- RANKED GROUP TEAMS (precomputed at sync) --------------------
+    leaderboard = get_leaderboard()
+    team_group = group_key if group_key in leaderboard.get("index", {}) else "ALL"
+    user_rank = leaderboard_rank(leaderboard, *user_leaderboard_key(user, leaderboard))
+    group_teams = leaderboard_groups(leaderboard, only=team_group).get(team_group) or group_data
 
     # -------------------- HARDCODED CONTEST COUNTDOWN --------------------
     # Contest starts: 2025-11-10T00:00:00Z (yesterday)
@@ -855,48 +3198,53 @@ def progress(ref_id):
         referral_goal=referral_goal,
         TEAM_LINKS=TEAM_LINKS,
         SOLO_LINKS=SOLO_LINKS,
-        contest_end_iso=contest_end_iso
+        contest_end_iso=contest_end_iso,
+        user_rank=user_rank,
+        last_synced_at=last_synced_at
     )
     
+@app.route("/progress/<ref_id>/events")
+def progress_events(ref_id):
+    """Live count/rank updates for one user's label (text/event-stream)."""
+    user = get_user(ref_id)
+    if not user:
+        return "Invalid referral ID", 404
+    group, key = user_leaderboard_key(user, get_leaderboard())
+    return sse_response(sse_select_label(group, key))
+
+@app.route("/events")
+def leaderboard_events():
+    """Live leaderboard: a full snapshot, then the changed entries after each sync."""
+    return sse_response(sse_select_leaderboard)
+
 @app.route("/public", methods=["POST", "GET"])
 def public():
-    # Always fetch fresh data first (best-effort)
+    # Serve the last synced counts; refresh in the background if they are stale
     try:
-        result = fetch_contacts_and_update()
+        sync_started = trigger_sync_if_stale()
     except Exception as e:
-        result = {"status": "error", "message": str(e)}
+        app.logger.warning("[WARN] Auto-sync trigger failed: %s", e)
+        sync_started = False
 
     if request.args.get("format") == "json" or request.is_json:
+        result = dict(LAST_SYNC["result"] or {"status": "pending"})
+        result["last_synced_at"] = get_last_synced_at()
+        result["sync_started"] = sync_started
+        result["sync_in_progress"] = sync_in_progress()
         return jsonify(result)
 
-    referrals = load_json(REF_FILE, {})
-
-    sorted_refs = {}
-    for group, teams in (referrals or {}).items():
-        try:
-            if isinstance(teams, dict):
-                safe_teams = {}
-                for k, v in teams.items():
-                    ref_count = safe_int((v or {}).get("referrals", 0))
-                    safe_teams[str(k)] = {
-                        "team_label": (v or {}).get("team_label") or f"TEAM{k}",
-                        "referrals": ref_count
-                    }
-                sorted_list = sorted(safe_teams.items(), key=lambda kv: kv[1]["referrals"], reverse=True)
-                sorted_refs[group] = {k: v for k, v in sorted_list}
-            else:
-                sorted_refs[group] = teams
-        except Exception as e:
-            app.logger.warning(f"[WARN] Failed to sort group {group}: {e}")
-            sorted_refs[group] = teams
+    leaderboard = get_leaderboard()
+    sorted_refs = leaderboard_groups(leaderboard)
 
     # render leaderboard template
     return redirect(url_for("index"))
     """return render_template(
         "leaderboard.html",
         all_refs=sorted_refs,
+        top_teams=leaderboard.get("top", []),
         TEAM_LINKS=TEAM_LINKS,
-        SOLO_LINKS=SOLO_LINKS
+        SOLO_LINKS=SOLO_LINKS,
+        last_synced_at=format_synced_at(get_last_synced_at())
     )"""
 
 @app.route("/auth")
@@ -929,8 +3277,8 @@ def oauth2callback():
     except Exception as e:
         app.logger.error("Failed to write token to %s: %s", TOKEN_FILE, e)
 
-    # run an initial sync immediately after successful auth
-    fetch_contacts_and_update()
+    # kick off an initial sync right after successful auth (runs in the background)
+    trigger_sync(force=True)
     return redirect(url_for("public"))
 
 @app.route("/sync-now", methods=["POST", "GET"])
@@ -942,7 +3290,10 @@ def sync_now():
     else:
         app.logger.warning("ADMIN_KEY not set — /sync-now is unprotected in this environment.")
 
-    result = fetch_contacts_and_update()
+    # ?wait=0 triggers the sync and returns immediately; ?force=1 ignores SYNC_MIN_INTERVAL
+    wait = request.args.get("wait", "1") != "0"
+    force = request.args.get("force") == "1"
+    result = run_sync(wait=wait, force=force)
     if request.args.get("format") == "json" or request.is_json:
         return jsonify(result)
     return redirect(url_for("public"))
@@ -953,18 +3304,87 @@ def migrate_team_links():
         provided = request.args.get("key") or request.form.get("key")
         if not provided or provided != ADMIN_KEY:
             return abort(403, description="Forbidden: invalid admin key")
-    users = load_json(DATA_FILE, [])
     changed = 0
-    for u in users:
+    for u in list(all_users()):
         if "team_link" not in u or not u.get("team_link"):
             tn = u.get("team_number")
             if tn:
-                u["team_link"] = TEAM_LINKS.get(int(tn))
+                update_user(u.get("ref_id", ""), {"team_link": TEAM_LINKS.get(int(tn))})
                 changed += 1
     if changed > 0:
-        save_json(DATA_FILE, users, push_to_github=True)
+        compact_user_log(force=True)
     return jsonify({"status": "ok", "updated": changed})
 
+@app.route("/github-queue", methods=["POST", "GET"])
+def github_queue():
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.form.get("key")
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    result = {}
+    if request.args.get("flush") == "1":
+        result["flush"] = flush_github_queue()
+    result.update(github_queue_status())
+    return jsonify(result)
+
+@app.route("/sync-log", methods=["GET"])
+def sync_log():
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.form.get("key")
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    return jsonify({"syncs": list(SYNC_LOGS)})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if ADMIN_KEY:
+        # Prometheus scrape configs send the key as a bearer token (authorization: credentials)
+        auth = request.headers.get("Authorization", "")
+        provided = request.args.get("key") or (auth[7:] if auth.startswith("Bearer ") else None)
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    with _github_queue_cond:
+        queue_depth = len(_github_queue)
+    html_cache = html_cache_status()
+    gauges = {
+        "sync_in_progress": ("1 while a contact sync is running in this process.", int(sync_in_progress())),
+        "sync_last_success_timestamp_seconds": ("Unix time of the last successful sync.", get_last_synced_at() or 0),
+        "github_queue_depth": ("Files waiting for the next batched GitHub commit.", queue_depth),
+        "github_rate_limit_remaining": ("Last X-RateLimit-Remaining seen from GitHub (-1 unknown).",
+                                        -1 if GITHUB_RATE_LIMIT["remaining"] is None else GITHUB_RATE_LIMIT["remaining"]),
+        "html_cache_hits": ("Rendered pages served from the HTML cache.", html_cache["hits"]),
+        "html_cache_misses": ("Rendered pages that had to be rendered.", html_cache["misses"]),
+        "html_cache_evictions": ("HTML cache entries evicted to stay under HTML_CACHE_MAX_BYTES.",
+                                 html_cache["evictions"]),
+        "html_cache_bytes": ("Bytes of rendered pages held in the HTML cache.", html_cache["bytes"]),
+        "html_cache_entries": ("Rendered pages held in the HTML cache.", html_cache["entries"]),
+    }
+    return Response(render_metrics(gauges), mimetype="text/plain; version=0.0.4")
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.form.get("key")
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    entries = [{k: v for k, v in p.items() if k != "data"} for p in reversed(PROFILES)]
+    return jsonify({"profiles": entries, "ring_size": PROFILE_RING_SIZE})
+
+@app.route("/profiles/<int:profile_id>", methods=["GET"])
+def profile_download(profile_id):
+    """The captured profile as a pstats file (pstats.Stats / snakeviz), or ?format=text for a report."""
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.form.get("key")
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    entry = next((p for p in PROFILES if p["id"] == profile_id), None)
+    if entry is None:
+        return abort(404, description="Profile not found (the ring keeps the last PROFILE_RING_SIZE captures)")
+    if request.args.get("format") == "text":
+        return Response(profile_text(entry, sort=request.args.get("sort", "cumulative")), mimetype="text/plain")
+    return Response(entry["data"], mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.prof"})
+
 # ---------------------- Daily snapshot display & snapshot endpoint ----------------------
 
 
@@ -974,39 +3394,24 @@ def daily_progress():
     daily = read_daily_file()
     days = daily.get("days", [])
     if not days:
-        today_snapshot = build_today_snapshot()
-        append_daily_snapshot(today_snapshot)
+        if DAILY_SNAPSHOT_ENABLED:
+            run_daily_snapshot_job()  # closed days only: today is recorded after its cutoff
+        else:
+            append_daily_snapshot(build_today_snapshot())
         daily = read_daily_file()
         days = daily.get("days", [])
 
-    padded_days = list(days)[:]
-    while len(padded_days) < 30:
-        padded_days.append({"date": None, "counts": {}})
-
-    # helper: robust int conversion (safe to re-declare here)
-    def safe_int(v):
-        try:
-            return int(v)
-        except Exception:
-            try:
-                return int(float(v))
-            except Exception:
-                return 0
-
     refs = load_json(REF_FILE, {})
-    labels_set = set()
+    ref_labels = set()
     for k in (refs.get("ALL") or {}).keys():
         try:
-            labels_set.add(f"TEAM{int(k)}")
+            ref_labels.add(f"TEAM{int(k)}")
         except Exception:
-            labels_set.add(f"TEAM{str(k)}")
+            ref_labels.add(f"TEAM{str(k)}")
     for k in (refs.get("SOLO") or {}).keys():
-        labels_set.add(str(k))
-    for d in days:
-        for label in d.get("counts", {}).keys():
-            labels_set.add(str(label))
+        ref_labels.add(str(k))
 
-    users = load_json(DATA_FILE, []) or []
+    users = all_users()
     label_to_name = {}
     for u in users:
         lbl = (u.get("team_label") or "").strip()
@@ -1016,34 +3421,33 @@ def daily_progress():
         if tn is not None:
             label_to_name[f"TEAM{int(tn)}"] = label_to_name.get(f"TEAM{int(tn)}", f"Team {tn}")
 
-    # Build per-label rows (Day 1..30 counts + total)
-    rows = []
-    for label in sorted(labels_set):
-        day_counts = []
-        total = 0
-        for d in padded_days:
-            c = 0
-            if d.get("counts") and label in d["counts"]:
-                c = safe_int(d["counts"][label])
-            day_counts.append(c)
-            total += c
-        rows.append({"label": label, "name": label_to_name.get(label, label), "day_counts": day_counts, "total": total})
-
-    # latest recorded day index (0-based)
-    latest_index = max(0, len(days) - 1)
-
-    # sort rows for display by that latest day
-    rows_sorted_by_latest = sorted(rows, key=lambda r: r["day_counts"][latest_index], reverse=True)
-    totals_sorted = sorted(rows, key=lambda r: r["total"], reverse=True)
-    day_dates = [d.get("date") for d in padded_days]
-
-    # ----- NEW: compute daily_totals (Day 1..30 totals) and overall_total -----
-    daily_totals = []
-    for i in range(30):
-        day_sum = sum((row["day_counts"][i] if i < len(row["day_counts"]) else 0) for row in rows)
-        daily_totals.append(day_sum)
+    # Per-label rows (Day 1..30 counts + total) come from the precomputed matrix
+    mx = get_daily_matrix(daily)
+    stats = mx["stats"]
+    width = len(mx["dates"])
+
+    def row(i):
+        label = mx["labels"][i]
+        return {"label": label, "name": label_to_name.get(label, label),
+                "day_counts": stats["day_counts"][i], "total": stats["label_totals"][i]}
+
+    # labels only known from REF_FILE have no history: all-zero rows, ordered by label
+    # among the other zero rows (same order as a stable sort of the alphabetical list)
+    extra_rows = [{"label": l, "name": label_to_name.get(l, l), "day_counts": [0] * width, "total": 0}
+                  for l in sorted(ref_labels.difference(mx["index"]))]
+
+    def ordered(order, keys):
+        head = [row(i) for i in order if keys[i] > 0]
+        tail = [row(i) for i in order if keys[i] <= 0] + extra_rows
+        return head + sorted(tail, key=lambda r: r["label"])
+
+    rows_sorted_by_latest = ordered(stats["order_latest"], stats["latest"])
+    totals_sorted = ordered(stats["order_total"], stats["label_totals"])
+    latest_index = stats["latest_index"]
+    day_dates = mx["dates"]
+
+    daily_totals = stats["day_totals"][:DAILY_MIN_COLUMNS]
     overall_total = sum(daily_totals)
-    # -------------------------------------------------------------------------
 
     return render_template(
         "daily_progress.html",
@@ -1052,7 +3456,9 @@ def daily_progress():
         totals_sorted=totals_sorted,
         latest_index=latest_index,
         daily_totals=daily_totals,
-        overall_total=overall_total
+        overall_total=overall_total,
+        delta_totals=stats["delta_totals"][:DAILY_MIN_COLUMNS],
+        growth_rates=stats["growth"][:DAILY_MIN_COLUMNS]
     )
 
 @app.route("/daily-progress/snapshot", methods=["POST"])
@@ -1061,25 +3467,176 @@ def daily_progress_snapshot():
     pw = request.form.get("admin_password") or request.headers.get("X-Admin-Password", "")
     if pw != ADMIN_PASSWORD:
         return jsonify({"ok": False, "reason": "forbidden"}), 403
+    if DAILY_SNAPSHOT_ENABLED:
+        # the scheduler owns DAILY_FILE: record the current counts, write only closed days
+        run = run_daily_snapshot_job()
+        return jsonify({"ok": True, "reason": "scheduled", "dates": [t["date"] for t in run["snapshots"]],
+                        "unobserved": run["unobserved"]})
     snapshot = build_today_snapshot()
     ok, reason = append_daily_snapshot(snapshot)
     return jsonify({"ok": ok, "reason": reason, "date": snapshot["date"]})
 
 
+@app.route("/daily-progress/schedule", methods=["GET"])
+def daily_progress_schedule():
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.form.get("key")
+        if not provided or provided != ADMIN_KEY:
+            return abort(403, description="Forbidden: invalid admin key")
+    return jsonify(daily_schedule_status())
+
 @app.route("/download/<filename>")
 def download_file(filename):
     allowed = {"data.json", "referrals.json", "daily_refs.json"}
     if filename not in allowed:
         return "Not allowed", 403
-    
+
+    if STORAGE_BACKEND == "sqlite":
+        kind = {"data.json": "users", "referrals.json": "referrals", "daily_refs.json": "daily"}[filename]
+        return Response(
+            export_sqlite_json(kind),
+            mimetype="application/json",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
     return send_from_directory(
         "/var/data",
         filename,
         as_attachment=True
     )
 
+# ---------------------- JSON API (v1) ----------------------
+# Read-only endpoints served from the precomputed state (leaderboard view, user
+# store, daily file). Every response has a strong ETag and, where known, a
+# Last-Modified date, so clients can revalidate with If-None-Match /
+# If-Modified-Since and get a 304. `?fields=a,b` trims each object to those
+# keys; list endpoints take `?page=` / `?per_page=`.
+API_PER_PAGE = int(os.getenv("API_PER_PAGE", 50))
+API_MAX_PER_PAGE = int(os.getenv("API_MAX_PER_PAGE", 500))
+
+def _api_fields():
+    fields = request.args.get("fields")
+    return {f.strip() for f in fields.split(",") if f.strip()} if fields else None
+
+def _select_fields(obj, fields):
+    if not fields or not isinstance(obj, dict):
+        return obj
+    return {k: v for k, v in obj.items() if k in fields}
+
+def _paginate(items):
+    """Slice `items` by ?page= (1-based) and ?per_page=; returns (page_items, meta)."""
+    per_page = max(1, min(safe_int(request.args.get("per_page"), API_PER_PAGE) or API_PER_PAGE, API_MAX_PER_PAGE))
+    page = max(1, safe_int(request.args.get("page"), 1) or 1)
+    total = len(items)
+    start = (page - 1) * per_page
+    meta = {"page": page, "per_page": per_page, "total": total, "pages": (total + per_page - 1) // per_page}
+    return items[start:start + per_page], meta
+
+def api_response(payload, last_modified=None, status=200):
+    body = dumps_json(payload)
+    resp = Response(body, status=status, mimetype="application/json")
+    if status != 200:
+        return resp
+    resp.set_etag(hashlib.sha1(body).hexdigest())
+    if last_modified:
+        resp.last_modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+def _api_error(message, status):
+    return api_response({"error": message}, status=status)
+
+def referral_goal_for(reg_type, team_number=None):
+    if reg_type == "solo":
+        return 1000
+    # Team 2 special goal
+    return 100000 if team_number == 2 else 10000
+
+@app.route("/api/v1/progress/<ref_id>")
+def api_progress(ref_id):
+    user = get_user(ref_id)
+    if not user:
+        return _api_error("unknown ref_id", 404)
+    view = get_leaderboard()
+    group, key = user_leaderboard_key(user, view)
+    entry = leaderboard_rank(view, group, key) or {"referrals": 0, "rank": None, "gap": None, "total": None}
+    reg_type = "solo" if group == "SOLO" else "team"
+    payload = {
+        "ref_id": user.get("ref_id"),
+        "name": user.get("name"),
+        "registration_type": reg_type,
+        "group": group,
+        "team_label": user.get("team_label"),
+        "team_link": user.get("team_link"),
+        "referrals": entry["referrals"],
+        "rank": entry["rank"],
+        "gap": entry["gap"],
+        "rank_total": entry["total"],
+        "goal": referral_goal_for(reg_type, safe_int(key, None) if reg_type == "team" else None),
+        "last_synced_at": get_last_synced_at(),
+    }
+    return api_response(_select_fields(payload, _api_fields()), last_modified=view.get("generated_at"))
+
+@app.route("/api/v1/leaderboard")
+def api_leaderboard():
+    """Ranked entries of one group (?group=, default ALL), paginated, plus the global top list."""
+    view = get_leaderboard()
+    group = request.args.get("group", "ALL")
+    entries = (view.get("groups") or {}).get(group)
+    if entries is None:
+        return _api_error(f"unknown group {group}", 404)
+    fields = _api_fields()
+    page, meta = _paginate(entries)
+    payload = {
+        "group": group,
+        "groups": sorted((view.get("groups") or {}).keys()),
+        "generated_at": view.get("generated_at"),
+        "top": [_select_fields(e, fields) for e in view.get("top", [])],
+        "entries": [_select_fields(e, fields) for e in page],
+        "pagination": meta,
+    }
+    return api_response(payload, last_modified=view.get("generated_at"))
+
+@app.route("/api/v1/daily")
+def api_daily():
+    """Daily snapshots, newest first, paginated; ?labels=TEAM1,REF001 narrows the counts."""
+    history = read_daily_file().get("days", [])
+    days = list(reversed(history))
+    labels = request.args.get("labels")
+    labels = {l.strip() for l in labels.split(",") if l.strip()} if labels else None
+    page, meta = _paginate(days)
+    fields = _api_fields()
+    stats = get_daily_matrix({"days": history})["stats"]  # the same history, not a second read
+    last = len(days) - 1
+    out = []
+    for k, d in enumerate(page, start=(meta["page"] - 1) * meta["per_page"]):
+        col = last - k  # position in the chronological history
+        counts = daily_counts_at(history, col)
+        if labels is not None:
+            counts = {l: c for l, c in counts.items() if l in labels}
+        out.append(_select_fields({
+            "date": d.get("date"),
+            "counts": counts,
+            "total": sum(safe_int(c) for c in counts.values()),
+            "delta": stats["delta_totals"][col],
+            "growth": stats["growth"][col],
+        }, fields))
+    stat = _file_stat_key(DAILY_FILE)
+    return api_response({"days": out, "pagination": meta}, last_modified=stat[0] / 1e9 if stat else None)
+
+@app.route("/api/v1/users")
+def api_users():
+    """Registered users, paginated (admin only: contains names and links)."""
+    if ADMIN_KEY:
+        provided = request.args.get("key") or request.headers.get("X-Admin-Key")
+        if not provided or provided != ADMIN_KEY:
+            return _api_error("forbidden", 403)
+    fields = _api_fields()
+    page, meta = _paginate(all_users())
+    return api_response({"users": [_select_fields(u, fields) for u in page], "pagination": meta})
+
 # ---------------------- Start ----------------------
 if __name__ == "__main__":
-    threading.Thread(target=background_updater, daemon=True).start()
+    start_background_updater()
     app.logger.info("✅ Flask app running with GitHub-backed JSON and Google Contacts sync.")
     app.run(debug=True)
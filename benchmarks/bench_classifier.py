@@ -0,0 +1,71 @@
+"""
+Benchmark: legacy per-team/per-ref regex loop vs. the single-pass classifier.
+
+Builds a synthetic People API `connections` corpus, counts matches with both
+implementations, checks the counts agree and prints the timings.
+
+    python benchmarks/bench_classifier.py [--contacts 50000] [--seed 1]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from fakes import make_corpus  # noqa: E402
+
+def legacy_counts(contacts, groups, solo_max):
+    counts = {}
+    for contact in contacts:
+        for group, team_nums in groups.items():
+            for team_num in team_nums:
+                if app.contact_mentions_team(contact, group, team_num) or app.contact_mentions_team_local(contact, team_num):
+                    key = (group, f"TEAM{team_num}")
+                    counts[key] = counts.get(key, 0) + 1
+        for i in range(1, solo_max + 1):
+            if app.contact_mentions_ref(contact, i):
+                key = ("SOLO", f"REF{str(i).zfill(3)}")
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def classifier_counts(contacts, groups, solo_max):
+    counts = {}
+    for contact in contacts:
+        for key in app.classify_contact(contact, groups, solo_max):
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    groups = {"ALL": [1, 2, 3, 4, 5], "Group A": [1, 2]}
+    solo_max = app.SOLO_COUNT
+    contacts = make_corpus(args.contacts, args.seed)
+
+    t0 = time.perf_counter()
+    expected = legacy_counts(contacts, groups, solo_max)
+    legacy_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = classifier_counts(contacts, groups, solo_max)
+    new_s = time.perf_counter() - t0
+
+    if got != expected:
+        diff = {k: (expected.get(k), got.get(k)) for k in set(expected) | set(got) if expected.get(k) != got.get(k)}
+        print("MISMATCH (legacy, classifier):", diff)
+        return 1
+
+    print(f"contacts:   {len(contacts)}")
+    print(f"labels hit: {len(got)}  matches: {sum(got.values())}")
+    print(f"legacy:     {legacy_s:.3f}s  ({len(contacts) / legacy_s:,.0f} contacts/s)")
+    print(f"classifier: {new_s:.3f}s  ({len(contacts) / new_s:,.0f} contacts/s)")
+    print(f"speedup:    {legacy_s / new_s:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
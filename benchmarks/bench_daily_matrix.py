@@ -0,0 +1,104 @@
+"""
+Benchmark: the daily-progress computation at scale.
+
+Compares the legacy per-request label x day loop of `daily_progress` with the
+precomputed matrix (full build, build from the keyframe+delta history,
+one-column append, per-request assembly), for both the NumPy and the array
+backend, and checks that they produce the same rows and totals. Also prints the
+size of the history in the legacy and the keyframe+delta format.
+
+    python benchmarks/bench_daily_matrix.py [--labels 1000] [--days 365]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from fakes import make_daily_history  # noqa: E402
+
+def make_days(labels, days, seed=1):
+    names = [f"TEAM{i}" if i % 3 else f"REF{i:03d}" for i in range(1, labels + 1)]
+    return make_daily_history(names, days, seed)
+
+def legacy_rows(days):
+    """The pre-matrix daily_progress body: padded label x day loop, then re-summed columns."""
+    padded_days = list(days)
+    while len(padded_days) < 30:
+        padded_days.append({"date": None, "counts": {}})
+    labels_set = {str(label) for d in days for label in d.get("counts", {})}
+    rows = []
+    for label in sorted(labels_set):
+        day_counts, total = [], 0
+        for d in padded_days:
+            c = app.safe_int(d["counts"][label]) if d.get("counts") and label in d["counts"] else 0
+            day_counts.append(c)
+            total += c
+        rows.append({"label": label, "day_counts": day_counts, "total": total})
+    latest_index = max(0, len(days) - 1)
+    by_latest = sorted(rows, key=lambda r: r["day_counts"][latest_index], reverse=True)
+    by_total = sorted(rows, key=lambda r: r["total"], reverse=True)
+    daily_totals = [sum(r["day_counts"][i] for r in rows) for i in range(30)]
+    return by_latest, by_total, daily_totals
+
+def matrix_rows(mx):
+    stats = mx["stats"]
+    rows = [{"label": label, "day_counts": stats["day_counts"][i], "total": stats["label_totals"][i]}
+            for i, label in enumerate(mx["labels"])]
+    return ([rows[i] for i in stats["order_latest"]], [rows[i] for i in stats["order_total"]],
+            stats["day_totals"][:app.DAILY_MIN_COLUMNS])
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--labels", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    days = make_days(args.labels, args.days)
+    legacy_s, expected = timed(lambda: legacy_rows(days), args.repeat)
+    print(f"{args.labels} labels x {args.days} days")
+    legacy_bytes = len(app.dumps_json({"days": days}))
+    encoded_bytes = len(app.dumps_json(app.encode_daily_history(days)))
+    print(f"{'daily_refs.json size':<34} {legacy_bytes / 1024:>9.0f} KB legacy, {encoded_bytes / 1024:.0f} KB keyframes+deltas")
+    print(f"{'legacy loop (per request)':<34} {legacy_s * 1000:>9.1f} ms")
+
+    ok = True
+    backends = ("numpy", "array") if app.np is not None else ("array",)
+    for backend in backends:
+        app.DAILY_MATRIX_BACKEND = backend
+        build_s, mx = timed(lambda: app.build_daily_matrix(days[:-1]), args.repeat)
+
+        def append():
+            # as append_daily_snapshot: the cached history list grows by one day in place
+            history = days[:-1]
+            key_before = app._daily_key(history)
+            app._daily_matrix.update(key=key_before, days=history, matrix=app.build_daily_matrix(history))
+            history.append(days[-1])
+            t0 = time.perf_counter()
+            app._daily_matrix_appended(key_before, history, days[-1]["counts"])
+            return time.perf_counter() - t0
+        append_s = sum(append() for _ in range(args.repeat)) / args.repeat
+        read_s, got = timed(lambda: matrix_rows(app.get_daily_matrix({"days": days})), args.repeat)
+
+        encoded = app.encode_daily_history(days)["days"]
+        encoded_s, enc_mx = timed(lambda: app.build_daily_matrix(encoded), args.repeat)
+        same = got == expected and enc_mx["stats"] == app.build_daily_matrix(days)["stats"]
+        ok = ok and same
+        print(f"{backend + ' build (once)':<34} {build_s * 1000:>9.1f} ms")
+        print(f"{backend + ' build from keyframes+deltas':<34} {encoded_s * 1000:>9.1f} ms")
+        print(f"{backend + ' append one day':<34} {append_s * 1000:>9.1f} ms")
+        print(f"{backend + ' rows per request':<34} {read_s * 1000:>9.1f} ms   "
+              f"({legacy_s / read_s:.1f}x, results {'match' if same else 'DIFFER'})")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
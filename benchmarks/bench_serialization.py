@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: dump/load throughput and GitHub upload size for the JSON
+serialization modes (indent=4 as before, compact, and orjson when installed)
+on a 90-day daily_refs.json and a 100k-user data.json.
+
+    python benchmarks/bench_serialization.py [--users 100000] [--days 90] [--labels 40]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def make_daily(days, labels):
+    out = {"days": []}
+    for d in range(days):
+        counts = {f"TEAM{i}": d * 3 + i for i in range(1, 6)}
+        counts.update({f"REF{i:03d}": d * 2 + i for i in range(1, labels - 4)})
+        out["days"].append({"date": f"2025-{(d // 28) % 12 + 1:02d}-{d % 28 + 1:02d}", "counts": counts})
+    return out
+
+def make_users(n):
+    return [{
+        "name": f"User {i}", "ref_id": f"user_{i}", "registration_type": "solo", "assigned_number": i % 25 + 1,
+        "team_number": None, "team_label": f"REF{i % 25 + 1:03d}",
+        "team_link": "https://wa.link/b6kecz", "registered_at": 1762776525 + i,
+    } for i in range(n)]
+
+MODES = {
+    "json indent=4": (lambda d: json.dumps(d, indent=4).encode("utf-8"), json.loads),
+    "json compact": (lambda d: json.dumps(d, separators=(",", ":")).encode("utf-8"), json.loads),
+}
+if orjson is not None:
+    MODES["orjson compact"] = (orjson.dumps, orjson.loads)
+
+def bench(data, repeat):
+    rows = []
+    for name, (dump, load) in MODES.items():
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            raw = dump(data)
+        dump_s = (time.perf_counter() - t0) / repeat
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            load(raw)
+        load_s = (time.perf_counter() - t0) / repeat
+        rows.append((name, len(raw), len(base64.b64encode(raw)), dump_s, load_s))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--labels", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"app backend: {'orjson' if app._use_orjson() else 'json'}; pretty files: {sorted(app.JSON_PRETTY_FILES)}")
+    datasets = [
+        (f"daily_refs.json ({args.days} days x {args.labels} labels)", make_daily(args.days, args.labels), args.repeat * 20),
+        (f"data.json ({args.users} users)", make_users(args.users), args.repeat),
+    ]
+    for title, data, repeat in datasets:
+        print(f"\n{title}")
+        print(f"  {'mode':<16} {'bytes':>11} {'base64':>11} {'dump MB/s':>10} {'load MB/s':>10}")
+        for name, size, b64, dump_s, load_s in bench(data, repeat):
+            mb = size / 1e6
+            print(f"  {name:<16} {size:>11,} {b64:>11,} {mb / dump_s:>10.1f} {mb / load_s:>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark: registration and progress lookup at scale for the storage options.
+
+- json:   the original whole-file data.json flow (load, linear scan, append, rewrite)
+- jsonl:  the append-only user log + in-memory index (default backend), on the Render
+          disk (USER_LOG_PERSISTENT); without it a registration only queues data.json and
+          the export runs once per GitHub flush, timed separately
+- sqlite: STORAGE_BACKEND=sqlite
+
+    python benchmarks/bench_storage.py [--users 100000] [--ops 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import fakes  # noqa: E402
+
+def new_user(i):
+    return {"name": f"New {i}", "ref_id": f"new_{i}", "registration_type": "solo", "assigned_number": 1,
+            "team_number": None, "team_label": "REF001", "team_link": None, "registered_at": int(time.time())}
+
+def timed(fn, ops):
+    t0 = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return (time.perf_counter() - t0) / ops
+
+def bench_json(path, ops, n):
+    def lookup(i):
+        with open(path) as f:
+            users = json.load(f)
+        key = f"user_{random.randrange(n)}"
+        next((u for u in users if app.normalize_ref_id(u.get("ref_id", "")) == key), None)
+
+    def register(i):
+        with open(path) as f:
+            users = json.load(f)
+        key = f"new_{i}"
+        if next((u for u in users if app.normalize_ref_id(u.get("ref_id", "")) == key), None) is None:
+            users.append(new_user(i))
+            with open(path, "w") as f:
+                json.dump(users, f, indent=4)
+
+    return timed(register, ops), timed(lookup, ops)
+
+def bench_store(ops, n):
+    app.get_user("warmup")  # index build / connection setup is paid once at startup
+    lookup = lambda i: app.get_user(f"user_{random.randrange(n)}")
+    register = lambda i: app.add_user(new_user(i))
+    return timed(register, ops), timed(lookup, ops)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--json-ops", type=int, default=5, help="the whole-file flow is slow; fewer ops")
+    args = parser.parse_args()
+
+    users = fakes.make_users(args.users, solo_count=app.SOLO_COUNT)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data.json")
+        with open(data_file, "w") as f:
+            json.dump(users, f, indent=4)
+        app.DATA_FILE = data_file
+        app.GITHUB_TOKEN = None
+
+        results["json"] = bench_json(data_file, args.json_ops, args.users)
+
+        with open(data_file, "w") as f:
+            json.dump(users, f, indent=4)
+        app.USER_LOG_FILE = os.path.join(tmp, "users.jsonl")
+        app.STORAGE_BACKEND = "json"
+        t0 = time.perf_counter()
+        app.get_user("warmup")
+        startup = time.perf_counter() - t0
+        app.USER_LOG_PERSISTENT = True
+        results["jsonl"] = bench_store(args.ops, args.users)
+
+        # no disk: registrations mark data.json for the flusher (held off here) instead of writing it
+        app.USER_LOG_PERSISTENT = False
+        app.GITHUB_TOKEN, app.GITHUB_REPO = "bench-token", "bench/referrals"
+        app._github_flusher_started = True
+        app.get_user("warmup")
+        register = lambda i: app.add_user(new_user(args.ops + i))
+        results["jsonl-nodisk"] = (timed(register, args.ops), results["jsonl"][1])
+        assert app.github_push_pending(app.DATA_FILE)
+        t0 = time.perf_counter()
+        app._export_users_before_flush({app.DATA_FILE: "bench"})
+        export = time.perf_counter() - t0
+        with app._github_queue_cond:
+            app._github_queue.clear()
+        app.GITHUB_TOKEN = None
+
+        app.STORAGE_BACKEND = "sqlite"
+        app.SQLITE_DB_FILE = os.path.join(tmp, "referrals.db")
+        app.sqlite_save("users", users)
+        results["sqlite"] = bench_store(args.ops, args.users)
+
+    print(f"users: {args.users}  (jsonl index rebuild at startup: {startup * 1000:.0f} ms, "
+          f"data.json export per GitHub flush without a disk: {export * 1000:.0f} ms)")
+    print(f"{'backend':<12} {'register ms/op':>15} {'lookup ms/op':>13}")
+    for name, (reg, look) in results.items():
+        print(f"{name:<12} {reg * 1000:>15.3f} {look * 1000:>13.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark: peak memory and wall time of a full contact sync, streamed (pages
+classified as they arrive, the next page prefetched meanwhile) vs. collected
+(every page downloaded into one list first, then classified: the pipeline
+before streaming, reproduced with SYNC_PREFETCH_PAGES=0 and a materializing
+stream_connections).
+
+Each mode runs in its own subprocess so the peak RSS (ru_maxrss) is its own.
+The People API is a FakePeopleService that sleeps --page-latency per page.
+
+    python benchmarks/bench_sync_stream.py [--contacts 200000] [--page-latency 0.05]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import fakes  # noqa: E402
+
+MODES = ("collect", "stream")
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+def run_mode(args):
+    tmp = tempfile.mkdtemp(prefix="referral-bench-")
+    try:
+        people = fakes.FakePeopleService(total=args.contacts, latency=args.page_latency)
+        fakes.isolate_app(app, tmp, people=people)
+        app._write_user_log(fakes.make_users(args.users, solo_count=app.SOLO_COUNT, teams=7))
+        app.all_users()
+        if args.mode == "collect":
+            app.SYNC_PREFETCH_PAGES = 0
+            stream_connections = app.stream_connections
+
+            def collected(service, sync_token=None, info=None):
+                contacts = list(stream_connections(service, sync_token, info))
+                yield from contacts
+            app.stream_connections = collected
+
+        before = rss_mb()
+        t0 = time.perf_counter()
+        res = app.fetch_contacts_and_update(full=True)
+        wall = time.perf_counter() - t0
+        with open(app.REF_FILE, "rb") as f:
+            digest = hash(f.read())
+        return {"mode": args.mode, "status": res.get("status"), "fetched": res.get("fetched"), "wall_s": wall,
+                "rss_before_mb": before, "peak_rss_mb": peak_rss_mb(), "phases_ms": res.get("phases_ms"),
+                "referrals": digest}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--page-latency", type=float, default=0.05, help="seconds per People API page")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return 0
+
+    results = {}
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    for mode in MODES:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode,
+                              "--contacts", str(args.contacts), "--users", str(args.users),
+                              "--page-latency", str(args.page_latency)],
+                             capture_output=True, text=True, env=env, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    pages = -(-args.contacts // app.SYNC_PAGE_SIZE)
+    print(f"contacts: {args.contacts}  pages: {pages}  page latency: {args.page_latency * 1000:.0f} ms")
+    print(f"{'mode':<9} {'wall s':>8} {'peak RSS MB':>12} {'sync growth MB':>15}   phases ms")
+    for mode in MODES:
+        r = results[mode]
+        growth = r["peak_rss_mb"] - r["rss_before_mb"]
+        phases = "  ".join(f"{k} {v}" for k, v in (r["phases_ms"] or {}).items())
+        print(f"{mode:<9} {r['wall_s']:>8.2f} {r['peak_rss_mb']:>12.1f} {growth:>15.1f}   {phases}")
+    c, s = results["collect"], results["stream"]
+    print(f"stream vs collect: wall {(s['wall_s'] - c['wall_s']) / c['wall_s'] * 100:+.0f}%, "
+          f"sync memory growth {(s['peak_rss_mb'] - s['rss_before_mb']) - (c['peak_rss_mb'] - c['rss_before_mb']):+.1f} MB")
+    same = c["status"] == s["status"] == "ok" and c["referrals"] == s["referrals"] and c["fetched"] == s["fetched"]
+    print("referral counts " + ("match" if same else "DIFFER"))
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Local stand-ins shared by the benchmark scripts: a synthetic People API
+`connections` corpus, a fake People service (paged like people.connections.list),
+a fake GitHub contents + Git Data API served over HTTP on 127.0.0.1, synthetic
+users and daily history, and helpers to point `app` at a scratch directory.
+
+Scripts in this directory import it as `import fakes` (the script's own directory
+is first on sys.path).
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIRST = ["Ada", "Bola", "Chi", "Dayo", "Emeka", "Funke", "Gbenga", "Halima", "Ife", "Jide"]
+TAGS = [
+    "team {n}", "TEAM{n}", "Team-0{n}", "team_{n}", "(team {n})", "team {n}!", "myteam{n}",
+    "ref {r}", "REF0{r}", "Ref-{r}", "ref_00{r}", "ref{r}.", "REF {r}0", "team {n}{n}",
+    "", "", "", "", "no tag", "t e a m {n}",
+]
+
+# ---------------------- Contacts ----------------------
+def make_contact(rnd, idx, teams=7, refs=30):
+    n = rnd.randint(0, teams)
+    r = rnd.randint(0, refs)
+    tag = rnd.choice(TAGS).format(n=n, r=r)
+    contact = {
+        "resourceName": f"people/c{idx}",
+        "etag": f"%E{idx}",
+        "names": [{"displayName": f"{rnd.choice(FIRST)} {tag}".strip()}],
+    }
+    roll = rnd.random()
+    if roll < 0.2:
+        contact["biographies"] = [{"value": rnd.choice(TAGS).format(n=n, r=r)}]
+    elif roll < 0.3:
+        contact["organizations"] = [{"name": "Group A", "title": rnd.choice(TAGS).format(n=n, r=r)}]
+    elif roll < 0.4:
+        contact["userDefined"] = [{"key": "src", "value": rnd.choice(TAGS).format(n=n, r=r)}]
+    return contact
+
+def make_corpus(size, seed=1):
+    rnd = random.Random(seed)
+    return [make_contact(rnd, i) for i in range(size)]
+
+def make_contacts_range(start, stop, seed=1, teams=7):
+    """Contacts start..stop-1, identical on every call (each page is generated independently)."""
+    rnd = random.Random(f"{seed}:{start}")
+    return [make_contact(rnd, i, teams=teams) for i in range(start, stop)]
+
+class _Request:
+    def __init__(self, execute):
+        self._execute = execute
+
+    def execute(self):
+        return self._execute()
+
+class FakePeopleService:
+    """
+    Stand-in for build("people", "v1").people().connections(). Serves `total`
+    synthetic contacts (generated page by page, like parsing a fresh response
+    body) or the given `contacts`, pageSize at a time, sleeping `latency`
+    seconds per page to model the network. A call with a syncToken returns
+    `changed` (a list of contacts) instead, in one or more pages.
+    """
+
+    def __init__(self, total=0, contacts=None, changed=None, latency=0.0, seed=1, teams=7):
+        self.total = len(contacts) if contacts is not None else total
+        self.contacts = contacts
+        self.changed = changed or []
+        self.latency = latency
+        self.seed = seed
+        self.teams = teams
+        self.pages_served = 0
+        self.sync_tokens = 0
+
+    def people(self):
+        return self
+
+    def connections(self):
+        return self
+
+    def list(self, resourceName=None, personFields=None, pageSize=2000, pageToken=None,
+             requestSyncToken=False, syncToken=None):
+        return _Request(lambda: self._page(int(pageToken or 0), int(pageSize), syncToken))
+
+    def _page(self, start, size, sync_token):
+        if self.latency:
+            time.sleep(self.latency)
+        self.pages_served += 1
+        if sync_token:
+            total, source = len(self.changed), self.changed
+        else:
+            total, source = self.total, self.contacts
+        stop = min(total, start + size)
+        if source is not None:
+            connections = [dict(c) for c in source[start:stop]]
+        else:
+            connections = make_contacts_range(start, stop, self.seed, self.teams)
+        page = {"connections": connections, "totalItems": total}
+        if stop < total:
+            page["nextPageToken"] = str(stop)
+        else:
+            self.sync_tokens += 1
+            page["nextSyncToken"] = f"sync-{self.sync_tokens}"
+        return page
+
+def edit_contacts(count, total, seed=2, teams=7):
+    """`count` contacts from a corpus of `total` with a new etag and a new tag (for incremental syncs)."""
+    rnd = random.Random(seed)
+    out = []
+    for idx in rnd.sample(range(total), min(count, total)):
+        contact = make_contact(rnd, idx, teams=teams)
+        contact["etag"] = f"%E{idx}-v{seed}"
+        out.append(contact)
+    return out
+
+# ---------------------- Users & daily history ----------------------
+def make_users(n, solo_count=25, team_every=4, teams=5):
+    users = []
+    for i in range(n):
+        reg_type = "team" if i % team_every == 0 else "solo"
+        num = (i % teams) + 1 if reg_type == "team" else (i % solo_count) + 1
+        users.append({
+            "name": f"User {i}",
+            "ref_id": f"user_{i}",
+            "registration_type": reg_type,
+            "assigned_number": num,
+            "team_number": num if reg_type == "team" else None,
+            "team_label": f"TEAM{num}" if reg_type == "team" else f"REF{num:03d}",
+            "team_link": None,
+            "registered_at": 1762776525 + i,
+        })
+    return users
+
+def make_daily_history(labels, days, seed=1):
+    """Cumulative per-label counts for `days` days, in the legacy {"date", "counts"} shape."""
+    rnd = random.Random(seed)
+    totals = dict.fromkeys(labels, 0)
+    history = []
+    for d in range(days):
+        for name in labels:
+            totals[name] += rnd.choice((0, 0, 1, 2, 5))
+        history.append({"date": f"day-{d:04d}", "counts": dict(totals)})
+    return history
+
+# ---------------------- Fake GitHub ----------------------
+_GITHUB_PATH = re.compile(r"^/repos/([^/]+/[^/]+)/(contents|git)/(.*)$")
+
+class FakeGitHub:
+    """
+    The slice of the GitHub REST API the app uses, served from memory on
+    127.0.0.1: contents GET (with ETag / If-None-Match) and PUT, and the Git
+    Data API calls of a batched commit (ref, commit, tree, commit, ref update).
+    Every request sleeps `latency` seconds first.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.files = {}        # path -> bytes
+        self.trees = {}        # tree sha -> [{"path", "content"}]
+        self.commits = {"c0": "t0"}
+        self.head = "c0"
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _sha(data):
+        return hashlib.sha1(data).hexdigest()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None, headers=None):
+                raw = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.send_header("X-RateLimit-Remaining", "4999")
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            def _route(self, method):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlsplit(self.path)
+                m = _GITHUB_PATH.match(url.path)
+                with fake.lock:
+                    key = f"{method} {m.group(2) if m else '?'}"
+                    fake.calls[key] = fake.calls.get(key, 0) + 1
+                if not m:
+                    return self._send(404, {"message": "Not Found"})
+                kind, rest = m.group(2), m.group(3)
+                if kind == "contents":
+                    return self._contents(method, rest, parse_qs(url.query))
+                return self._git(method, rest)
+
+            def _contents(self, method, path, query):
+                if method == "GET":
+                    with fake.lock:
+                        data = fake.files.get(path)
+                    if data is None:
+                        return self._send(404, {"message": "Not Found"})
+                    sha = fake._sha(data)
+                    etag = f'"{sha}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, headers={"ETag": etag})
+                    return self._send(200, {"sha": sha, "encoding": "base64",
+                                            "content": base64.encodebytes(data).decode()}, {"ETag": etag})
+                if method == "PUT":
+                    data = base64.b64decode(self._body().get("content", ""))
+                    with fake.lock:
+                        fake.files[path] = data
+                    return self._send(201, {"content": {"sha": fake._sha(data)}, "commit": {"sha": fake._sha(data)}})
+                return self._send(405, {"message": "Method Not Allowed"})
+
+            def _git(self, method, rest):
+                with fake.lock:
+                    if method == "GET" and rest.startswith("ref/heads/"):
+                        return self._send(200, {"object": {"sha": fake.head}})
+                    if method == "GET" and rest.startswith("commits/"):
+                        return self._send(200, {"tree": {"sha": fake.commits.get(rest.split("/", 1)[1], "t0")}})
+                    if method == "POST" and rest == "trees":
+                        entries = self._body().get("tree", [])
+                        sha = f"t{len(fake.trees) + 1}"
+                        fake.trees[sha] = entries
+                        return self._send(201, {"sha": sha})
+                    if method == "POST" and rest == "commits":
+                        body = self._body()
+                        sha = f"c{len(fake.commits)}"
+                        fake.commits[sha] = body.get("tree")
+                        return self._send(201, {"sha": sha})
+                    if method == "PATCH" and rest.startswith("refs/heads/"):
+                        sha = self._body().get("sha")
+                        for entry in fake.trees.get(fake.commits.get(sha), []):
+                            fake.files[entry["path"]] = entry["content"].encode("utf-8")
+                        fake.head = sha
+                        return self._send(200, {"object": {"sha": sha}})
+                return self._send(404, {"message": "Not Found"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_PATCH(self):
+                self._route("PATCH")
+
+        return Handler
+
+# ---------------------- App wiring ----------------------
+APP_FILES = {
+    "DATA_FILE": "data.json",
+    "REF_FILE": "referrals.json",
+    "DAILY_FILE": "daily_refs.json",
+    "USER_LOG_FILE": "users.jsonl",
+    "TOKEN_FILE": "token.json",
+    "SYNC_STATE_FILE": "sync_state.json",
+    "CLASSIFY_CACHE_FILE": "classify_cache.json",
+    "LEADERBOARD_FILE": "leaderboard.json",
+    "DAILY_SCHEDULE_FILE": "daily_schedule.json",
+    "UPDATER_LOCK_FILE": "updater.lock",
+    "SYNC_LOCK_FILE": "sync.lock",
+    "SQLITE_DB_FILE": "referrals.db",
+}
+
+def isolate_app(app, workdir, people=None, github=None):
+    """
+    Point every file `app` writes into `workdir` (relative names, as in a local
+    checkout), with Google credentials answered by `people` (a FakePeopleService)
+    and GitHub either off or served by `github` (a started FakeGitHub).
+    """
+    os.chdir(workdir)
+    for name, filename in APP_FILES.items():
+        setattr(app, name, filename)
+    app.invalidate_json_cache()
+    if people is not None:
+        app.get_credentials = lambda: object()
+        app.build = lambda *a, **k: people
+    if github is not None:
+        app.GITHUB_TOKEN = "fake-token"
+        app.GITHUB_REPO = "bench/referrals"
+        app.GITHUB_API_URL = github.url
+        app.GITHUB_RETRY_BACKOFF = 0.01
+    else:
+        app.GITHUB_TOKEN = None
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
@@ -0,0 +1,257 @@
+"""
+Load test: the referral app's hot paths against local stand-ins, reporting
+latency percentiles and throughput per scenario.
+
+Scenarios (all by default, or pick with --scenario):
+
+- sync:     fetch_contacts_and_update, one full sync of --contacts contacts and
+            incremental syncs of --changed edited contacts (FakePeopleService)
+- register: a burst of --burst POST /register from --threads threads
+- progress: --reads GET /progress/<ref_id> for random users from --threads threads
+- daily:    --reads GET /daily-progress over --days days of history
+
+Requests go through Flask's test client, so the numbers are the app's own
+cost without HTTP parsing. --github serves GitHub from a local FakeGitHub
+(reads revalidated by ETag, writes batched into commits); otherwise GitHub is
+off. --out saves the results as JSON; --baseline compares with a saved run.
+
+    python benchmarks/load_test.py [--scale small|medium|large] [--scenario progress]
+        [--users N] [--contacts N] [--github] [--out run.json] [--baseline base.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import fakes  # noqa: E402
+
+SCALES = {
+    "small": {"users": 1000, "contacts": 10000},
+    "medium": {"users": 10000, "contacts": 50000},
+    "large": {"users": 100000, "contacts": 200000},
+}
+SCENARIOS = ("sync", "register", "progress", "daily")
+
+def summarize(name, latencies, wall, **extra):
+    ops = len(latencies)
+    result = {
+        "scenario": name,
+        "ops": ops,
+        "p50_ms": round(fakes.percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(fakes.percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(fakes.percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput": round(ops / wall, 1) if wall > 0 else 0.0,
+    }
+    result.update(extra)
+    return result
+
+def run_threads(threads, total, op):
+    """Run op(i) for i in range(total) across `threads` threads; returns (latencies, wall, errors)."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        mine = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                ok = op(i)
+            except Exception as e:
+                ok = False
+                errors.append(repr(e))
+            mine.append(time.perf_counter() - t0)
+            if ok is False and not errors:
+                errors.append(f"op {i} failed")
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for th in workers:
+        th.start()
+    for th in workers:
+        th.join()
+    return latencies, time.perf_counter() - t0, errors
+
+# ---------------------- Scenarios ----------------------
+def scenario_sync(args, people):
+    latencies, results = [], []
+    t0 = time.perf_counter()
+    res = app.fetch_contacts_and_update(full=True)
+    latencies.append(time.perf_counter() - t0)
+    results.append(res)
+    full = summarize("sync full", latencies, sum(latencies), contacts=args.contacts,
+                     contacts_per_s=round(args.contacts / latencies[0], 1), phases_ms=res.get("phases_ms"))
+
+    latencies = []
+    for i in range(args.repeat):
+        people.changed = fakes.edit_contacts(args.changed, args.contacts, seed=10 + i)
+        t0 = time.perf_counter()
+        res = app.fetch_contacts_and_update()
+        latencies.append(time.perf_counter() - t0)
+        results.append(res)
+    incremental = summarize("sync incremental", latencies, sum(latencies), changed=args.changed,
+                            phases_ms=res.get("phases_ms"))
+    errors = [r for r in results if r.get("status") != "ok"]
+    return [full, incremental], errors
+
+def scenario_register(args, client):
+    password = os.getenv("ADMIN_PASSWORD", "ContactBatch321!")
+    run_id = int(time.time() * 1000) % 100000
+
+    def op(i):
+        r = client.post("/register", data={
+            "admin_password": password,
+            "name": f"bench {run_id} {i}",
+            "registration_type": "team" if i % 4 == 0 else "solo",
+        })
+        return r.status_code == 302
+
+    latencies, wall, errors = run_threads(args.threads, args.burst, op)
+    return [summarize("register burst", latencies, wall, threads=args.threads)], errors
+
+def scenario_progress(args, client, users):
+    rnd = random.Random(3)
+    ref_ids = [rnd.choice(users)["ref_id"] for _ in range(args.reads)]
+
+    def op(i):
+        return client.get(f"/progress/{ref_ids[i]}").status_code == 200
+
+    latencies, wall, errors = run_threads(args.threads, args.reads, op)
+    return [summarize("progress read", latencies, wall, threads=args.threads)], errors
+
+def scenario_daily(args, client):
+    labels = sorted({u["team_label"] for u in app.all_users()})
+    labels += [f"TEAM{i}" for i in range(len(labels) + 1, args.labels + 1)] if args.labels > len(labels) else []
+    history = fakes.make_daily_history(labels, args.days)
+    app.save_json(app.DAILY_FILE, app.encode_daily_history(history), push_to_github=False)
+
+    def op(i):
+        return client.get("/daily-progress").status_code == 200
+
+    first_t0 = time.perf_counter()
+    op(-1)
+    first = time.perf_counter() - first_t0
+    latencies, wall, errors = run_threads(args.threads, args.reads, op)
+    return [summarize("daily-progress read", latencies, wall, threads=args.threads, labels=len(labels),
+                      days=args.days, first_ms=round(first * 1000, 2))], errors
+
+# ---------------------- Reporting ----------------------
+def print_results(results, baseline=None):
+    base = {r["scenario"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<22} {'ops':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'ops/s':>10}")
+    for r in results:
+        print(f"{r['scenario']:<22} {r['ops']:>7} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}"
+              f" {r['max_ms']:>9.2f} {r['throughput']:>10.1f}")
+        b = base.get(r["scenario"])
+        if b:
+            def change(key):
+                return f"{(r[key] - b[key]) / b[key] * 100:+.0f}%" if b[key] else "n/a"
+            print(f"{'  vs baseline':<22} {'':>7} {change('p50_ms'):>9} {change('p95_ms'):>9} {change('p99_ms'):>9}"
+                  f" {change('max_ms'):>9} {change('throughput'):>10}")
+        if r.get("phases_ms"):
+            print(f"{'  phases ms':<22} " + "  ".join(f"{k} {v}" for k, v in r["phases_ms"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default: all")
+    parser.add_argument("--users", type=int, help="registered users (default: from --scale)")
+    parser.add_argument("--contacts", type=int, help="contacts in the address book (default: from --scale)")
+    parser.add_argument("--changed", type=int, default=200, help="contacts edited before each incremental sync")
+    parser.add_argument("--repeat", type=int, default=5, help="incremental syncs")
+    parser.add_argument("--burst", type=int, default=500, help="registrations in the burst")
+    parser.add_argument("--reads", type=int, default=2000, help="page reads per read scenario")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--days", type=int, default=120, help="days of daily history")
+    parser.add_argument("--labels", type=int, default=0, help="pad the daily history to this many labels")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="seconds per People API page")
+    parser.add_argument("--github", action="store_true", help="serve GitHub from a local fake")
+    parser.add_argument("--github-latency", type=float, default=0.0, help="seconds per fake GitHub request")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with results saved by --out")
+    args = parser.parse_args()
+    args.users = args.users or SCALES[args.scale]["users"]
+    args.contacts = args.contacts or SCALES[args.scale]["contacts"]
+    scenarios = args.scenario or list(SCENARIOS)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app.app.logger.setLevel(logging.WARNING)
+    app.UPDATE_INTERVAL = 10 ** 9          # progress reads never trigger a background sync
+    app.DAILY_SNAPSHOT_ENABLED = False
+    app.GITHUB_FLUSH_WINDOW = 0.2
+
+    tmp = tempfile.mkdtemp(prefix="referral-bench-")
+    cwd = os.getcwd()
+    github = fakes.FakeGitHub(latency=args.github_latency).start() if args.github else None
+    people = fakes.FakePeopleService(total=args.contacts, latency=args.page_latency)
+    try:
+        fakes.isolate_app(app, tmp, people=people, github=github)
+        users = fakes.make_users(args.users, solo_count=app.SOLO_COUNT)
+        app._write_user_log(users)
+        client = app.app.test_client()
+        print(f"users: {args.users}  contacts: {args.contacts}  threads: {args.threads}"
+              f"  github: {'fake' if github else 'off'}  scenarios: {', '.join(scenarios)}")
+
+        results, errors = [], []
+        if "sync" in scenarios:
+            r, e = scenario_sync(args, people)
+            results += r
+            errors += e
+        elif app.fetch_contacts_and_update(full=True).get("status") != "ok":
+            errors.append("setup sync failed")
+        if "register" in scenarios:
+            r, e = scenario_register(args, client)
+            results += r
+            errors += e
+        if "progress" in scenarios:
+            r, e = scenario_progress(args, client, users)
+            results += r
+            errors += e
+        if "daily" in scenarios:
+            r, e = scenario_daily(args, client)
+            results += r
+            errors += e
+        if github:
+            app.flush_github_queue()
+
+        baseline = None
+        if args.baseline:
+            with open(os.path.join(cwd, args.baseline)) as f:
+                baseline = json.load(f)
+        print_results(results, baseline)
+        if github:
+            print("fake GitHub calls: " + ", ".join(f"{k} {v}" for k, v in sorted(github.calls.items())))
+        if args.out:
+            with open(os.path.join(cwd, args.out), "w") as f:
+                json.dump({"args": vars(args), "at": int(time.time()), "results": results}, f, indent=2)
+        if errors:
+            print(f"ERRORS ({len(errors)}):")
+            for e in errors[:10]:
+                print("  ", e)
+            return 1
+        return 0
+    finally:
+        os.chdir(cwd)
+        if github:
+            github.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Load test: many idle Server-Sent Events subscribers on /events and
+/progress/<ref_id>/events against the shipped gunicorn.conf.py, with
+leaderboard updates published while they are connected. Reports connect time,
+how many streams the worker admitted and how many it turned away with 503
+(SSE_MAX_SUBSCRIBERS), per-update fan-out latency (publish -> last admitted
+subscriber received it) and /api/v1/leaderboard latency while the streams are open.
+
+gunicorn runs in a subprocess from a scratch directory (a three-line WSGI module
+there points the app's files at it); updates are published the way a sync
+publishes them, by rewriting leaderboard.json there, which the worker's SSE
+watcher picks up. Subscribers are plain non-blocking sockets
+driven from one selector loop, so thousands fit in this process.
+
+    python benchmarks/sse_load.py [--subscribers 1000] [--cap 500] [--worker-class gevent]
+"""
+import argparse
+import http.client
+import os
+import selectors
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import fakes  # noqa: E402
+
+TEAMS = 5
+WSGI_MODULE = "sse_load_app"
+
+def referrals(step):
+    return {
+        "ALL": {str(t): {"team_label": f"TEAM{t}", "referrals": step * t + t} for t in range(1, TEAMS + 1)},
+        "SOLO": {"REF001": {"team_label": "REF001", "referrals": step}},
+    }
+
+class Subscriber:
+    def __init__(self, port, path):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n".encode())
+        self.sock.setblocking(False)
+        self.status = None
+        self.closed = False
+        self.tail = b""
+        self.snapshots = 0
+        self.updates = 0
+
+    def on_readable(self):
+        try:
+            data = self.sock.recv(65536)
+        except ConnectionError:
+            data = b""
+        if not data:
+            self.closed = True
+            return False
+        if self.status is None:
+            self.status = int(data.split(b" ", 2)[1])
+        buf = self.tail + data
+        self.snapshots += buf.count(b"event: snapshot")
+        self.updates += buf.count(b"event: update")
+        # keep less than one marker, so a marker split across reads is counted exactly once
+        self.tail = buf[-(len(b"event: snapshot") - 1):]
+        return True
+
+    @property
+    def settled(self):
+        return self.snapshots > 0 or self.status == 503 or self.closed
+
+def pump(sel, until, deadline):
+    while not until() and time.perf_counter() < deadline:
+        for key, _ in sel.select(timeout=0.05):
+            if not key.data.on_readable():
+                sel.unregister(key.fileobj)
+
+def get(port, path, timeout=30):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    finally:
+        conn.close()
+
+def start_gunicorn(workdir, port, args):
+    with open(os.path.join(workdir, WSGI_MODULE + ".py"), "w") as f:
+        f.write("import os, app, fakes\nfakes.isolate_app(app, os.getcwd())\napplication = app.app\n")
+    env = dict(os.environ,
+               SSE_POLL_INTERVAL="0.1", SSE_HEARTBEAT="60", SSE_MAX_SUBSCRIBERS=str(args.cap),
+               GUNICORN_WORKER_CLASS=args.worker_class, WEB_CONCURRENCY=str(args.workers),
+               UPDATE_INTERVAL=str(10 ** 10), DAILY_SNAPSHOT_ENABLED="0")
+    for name in ("GITHUB_PAT", "RENDER_DATA_DIR"):
+        env.pop(name, None)
+    proc = subprocess.Popen(["gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+                             "--pythonpath", f"{ROOT},{os.path.join(ROOT, 'benchmarks')}", "--chdir", workdir,
+                             "-b", f"127.0.0.1:{port}", "--log-level", "warning", f"{WSGI_MODULE}:application"],
+                            env=env, cwd=workdir)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            if get(port, "/api/v1/leaderboard", timeout=1) == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not come up")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--cap", type=int, default=0, help="SSE_MAX_SUBSCRIBERS per worker (0 = gunicorn.conf.py default)")
+    parser.add_argument("--worker-class", default="gevent", help="GUNICORN_WORKER_CLASS (gevent or gthread)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--api-requests", type=int, default=50, help="/api/v1/leaderboard calls while streams are open")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each fan-out")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="referral-sse-")
+    cwd = os.getcwd()
+    fakes.isolate_app(app, tmp)
+    app.save_json(app.REF_FILE, referrals(0), push_to_github=False)
+    app.update_leaderboard(referrals(0))
+    app.add_user({"name": "load", "ref_id": "load", "registration_type": "team",
+                  "team_number": 1, "team_label": "TEAM1"})
+    port = free_port()
+    proc = start_gunicorn(tmp, port, args)
+    sel = selectors.DefaultSelector()
+    subs = []
+    try:
+        t0 = time.perf_counter()
+        for i in range(args.subscribers):
+            sub = Subscriber(port, "/events" if i % 2 else "/progress/load/events")
+            sel.register(sub.sock, selectors.EVENT_READ, sub)
+            subs.append(sub)
+        pump(sel, lambda: all(s.settled for s in subs), time.perf_counter() + args.timeout)
+        connect = time.perf_counter() - t0
+        admitted = [s for s in subs if s.snapshots]
+        rejected = sum(1 for s in subs if s.status == 503)
+
+        api, api_errors = [], 0
+        for _ in range(args.api_requests):
+            t0 = time.perf_counter()
+            try:
+                api_errors += get(port, "/api/v1/leaderboard") != 200
+            except OSError:
+                api_errors += 1
+            api.append(time.perf_counter() - t0)
+
+        fanout = []
+        for step in range(1, args.updates + 1):
+            t0 = time.perf_counter()
+            app.update_leaderboard(referrals(step))
+            pump(sel, lambda: all(s.updates >= step for s in admitted), t0 + args.timeout)
+            fanout.append(time.perf_counter() - t0)
+        delivered = sum(s.updates for s in admitted)
+    finally:
+        for s in subs:
+            s.sock.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:  # idle streams only notice a closed socket at the next heartbeat
+            proc.kill()
+            proc.wait()
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"gunicorn {args.worker_class} x{args.workers}  subscribers: {args.subscribers}"
+          f"  admitted: {len(admitted)}  rejected 503: {rejected}  settled in {connect:.2f}s")
+    print(f"updates: {args.updates}  events delivered: {delivered}/{args.updates * len(admitted)}")
+    print(f"fan-out ms  p50 {fakes.percentile(fanout, 50) * 1000:.1f}  p95 {fakes.percentile(fanout, 95) * 1000:.1f}"
+          f"  max {max(fanout) * 1000:.1f}")
+    print(f"/api/v1/leaderboard ms while streaming  p50 {fakes.percentile(api, 50) * 1000:.1f}"
+          f"  p95 {fakes.percentile(api, 95) * 1000:.1f}  max {max(api) * 1000:.1f}  errors {api_errors}")
+    ok = (admitted and len(admitted) + rejected == args.subscribers and not api_errors
+          and delivered == args.updates * len(admitted))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Stress: hammer /register from several threads while syncs rewrite REF_FILE,
+with readers parsing the JSON files the whole time. Checks that no registration
+is lost, that readers never see a torn file, and that after a final sync every
+registered label is present in REF_FILE.
+
+    python benchmarks/stress_writes.py [--threads 8] [--per-thread 25]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+from fakes import FakePeopleService  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--per-thread", type=int, default=25)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(ROOT, "data.json"), os.path.join(tmp, "data.json"))
+        os.chdir(tmp)
+        app.GITHUB_TOKEN = None
+        app.REF_FILE = os.path.join(tmp, "referrals.json")
+        app.DATA_FILE = "data.json"
+        app.USER_LOG_FILE = os.path.join(tmp, "users.jsonl")
+        app.TOKEN_FILE = os.path.join(tmp, "token.json")
+        app.SYNC_STATE_FILE = os.path.join(tmp, "sync_state.json")
+        app.CLASSIFY_CACHE_FILE = os.path.join(tmp, "classify_cache.json")
+        app.get_credentials = lambda: object()
+        app.build = lambda *a, **k: FakePeopleService()
+
+        client = app.app.test_client()
+        errors = []
+        done = threading.Event()
+
+        def registrar(t):
+            for i in range(args.per_thread):
+                reg_type = "team" if i % 2 else "solo"
+                r = client.post("/register", data={
+                    "admin_password": os.getenv("ADMIN_PASSWORD", "ContactBatch321!"),
+                    "name": f"stress {t} {i}",
+                    "registration_type": reg_type,
+                })
+                if r.status_code != 302:
+                    errors.append(f"register {t}/{i}: HTTP {r.status_code}")
+
+        def syncer():
+            while not done.is_set():
+                res = app.fetch_contacts_and_update(full=True)
+                if res.get("status") != "ok":
+                    errors.append(f"sync: {res}")
+
+        def reader():
+            while not done.is_set():
+                for path in (app.REF_FILE, os.path.join(tmp, "data.json")):
+                    try:
+                        with open(path) as f:
+                            json.load(f)
+                    except FileNotFoundError:
+                        pass
+                    except ValueError as e:
+                        errors.append(f"torn read of {path}: {e}")
+
+        workers = [threading.Thread(target=registrar, args=(t,)) for t in range(args.threads)]
+        background = [threading.Thread(target=syncer), threading.Thread(target=reader)]
+        for th in background + workers:
+            th.start()
+        for th in workers:
+            th.join()
+        done.set()
+        for th in background:
+            th.join()
+
+        expected = {app.normalize_ref_id(f"stress {t} {i}") for t in range(args.threads) for i in range(args.per_thread)}
+        registered = {u.get("ref_id") for u in app.all_users()}
+        missing = expected - registered
+        if missing:
+            errors.append(f"{len(missing)} registrations lost, e.g. {sorted(missing)[:3]}")
+
+        app.fetch_contacts_and_update(full=True)
+        with open(app.REF_FILE) as f:
+            refs = json.load(f)
+        labels = {v["team_label"] for group in refs.values() for v in group.values()}
+        stress_labels = {u["team_label"] for u in app.all_users() if u.get("ref_id") in expected}
+        if stress_labels - labels:
+            errors.append(f"labels missing from REF_FILE: {sorted(stress_labels - labels)}")
+
+        print(f"registrations: {len(expected)}  users now: {len(app.all_users())}")
+        if errors:
+            print("FAILED:")
+            for e in errors[:20]:
+                print("  ", e)
+            return 1
+        print("OK: no lost registrations, no torn reads")
+        return 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+# gunicorn.conf.py (picked up automatically by `gunicorn app:app`)
+import os
+
+# SSE streams (/events, /progress/<ref_id>/events) stay open for minutes. Under
+# gthread each one pins a thread, so a few dozen open tabs starve the worker; the
+# gevent worker serves them as greenlets (app.py keeps flock/sqlite waits off the
+# hub) and caps them per worker at SSE_MAX_SUBSCRIBERS, answering 503 above it.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+threads = int(os.getenv("GUNICORN_THREADS", 32))  # gthread only
+
+
+def post_worker_init(worker):
+    # every worker runs the updater loop; only the flock leader actually syncs
+    from app import start_background_updater
+    start_background_updater()
+
+
+def worker_exit(server, worker):
+    # export this worker's view of the user log, then push every GitHub write it still has queued
+    from app import flush_on_exit
+    flush_on_exit()
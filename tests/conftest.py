@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import app as app_module  # noqa: E402
+import fakes  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app module with every file it writes inside tmp_path and GitHub switched off."""
+    monkeypatch.chdir(tmp_path)
+    for name, filename in fakes.APP_FILES.items():
+        monkeypatch.setattr(app_module, name, filename)
+    monkeypatch.setattr(app_module, "GITHUB_TOKEN", None)
+    monkeypatch.setattr(app_module, "_github_flusher_started", True)  # tests flush explicitly
+    monkeypatch.setattr(app_module, "DAILY_SNAPSHOT_ENABLED", False)
+    monkeypatch.setattr(app_module, "_user_store", {"users": [], "by_ref": {}, "counts": {}, "offset": 0, "ino": None,
+                                                    "compacted_key": None, "compacted_at": 0, "lock_depth": 0})
+    app_module.invalidate_json_cache()
+    with app_module._github_queue_cond:
+        app_module._github_queue.clear()
+    yield app_module
+    with app_module._github_queue_cond:
+        app_module._github_queue.clear()
+    app_module.invalidate_json_cache()
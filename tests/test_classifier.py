@@ -0,0 +1,32 @@
+"""classify_contact must count exactly what the per-team / per-ref regex matchers it replaced counted."""
+import pytest
+
+import fakes
+
+GROUPS = {"ALL": [1, 2, 3, 4, 5], "Group A": [1, 2]}  # as in benchmarks/bench_classifier.py
+
+
+def _legacy_counts(app, contacts, solo_max):
+    counts = {}
+    for contact in contacts:
+        for group, team_nums in GROUPS.items():
+            for team_num in team_nums:
+                if app.contact_mentions_team(contact, group, team_num) or app.contact_mentions_team_local(contact, team_num):
+                    key = (group, f"TEAM{team_num}")
+                    counts[key] = counts.get(key, 0) + 1
+        for i in range(1, solo_max + 1):
+            if app.contact_mentions_ref(contact, i):
+                key = ("SOLO", f"REF{str(i).zfill(3)}")
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_classifier_matches_the_legacy_matchers(app, seed):
+    contacts = fakes.make_corpus(3000, seed)
+    counts = {}
+    for contact in contacts:
+        for key in app.classify_contact(contact, GROUPS, app.SOLO_COUNT):
+            counts[key] = counts.get(key, 0) + 1
+    assert counts == _legacy_counts(app, contacts, app.SOLO_COUNT)
+    assert sum(counts.values()) > len(contacts) // 10  # the corpus actually exercises the matchers
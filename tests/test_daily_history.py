@@ -0,0 +1,51 @@
+"""Keyframe + delta encoding of DAILY_FILE and the caches built on it."""
+
+
+def _history(app):
+    return {date: dict(counts) for date, counts in app.iter_daily_counts(app.read_daily_file()["days"])}
+
+
+def test_reencoded_legacy_history_does_not_reuse_the_legacy_index(app):
+    legacy = [{"date": "2026-01-01", "counts": {"A": 1}},
+              {"date": "2026-01-02", "counts": {"A": 1, "B": 2}},
+              {"date": "2026-01-03", "counts": {"A": 5, "B": 2}}]
+    app.save_json(app.DAILY_FILE, {"days": legacy}, push_to_github=False)
+    days = app.read_daily_file()["days"]
+    app.daily_index(days)  # every legacy day is a keyframe
+    app.get_daily_matrix()
+
+    # re-encoded on append into a list of the same length and end dates, with only day 1 a keyframe
+    assert app.append_daily_snapshot({"date": "2026-01-04", "counts": {"A": 6}}) == (True, "saved")
+    assert app.read_daily_file()["format"] == app.DAILY_FORMAT
+    assert _history(app)["2026-01-04"] == {"A": 6}
+    assert app.get_daily_matrix()["stats"] == app.build_daily_matrix(app.read_daily_file()["days"])["stats"]
+
+
+def test_daily_progress_renders_delta_totals_and_growth(app):
+    for date, counts in (("2026-01-01", {"A": 4, "B": 6}), ("2026-01-02", {"A": 9, "B": 6}),
+                         ("2026-01-03", {"A": 9, "B": 8})):
+        app.append_daily_snapshot({"date": date, "counts": counts})
+    page = app.app.test_client().get("/daily-progress").get_data(as_text=True)
+    deltas = [10, 5, 2] + [0] * 27
+    assert f"const DELTA_TOTALS = {deltas};".replace(" ", "") in page.replace(" ", "")
+    assert "const GROWTH_RATES = [null, 0.5, 0.1333" in page
+
+
+def test_api_daily_stats_come_from_the_history_it_lists(app, monkeypatch):
+    for date, counts in (("2026-01-01", {"A": 4}), ("2026-01-03", {"A": 9})):
+        app.append_daily_snapshot({"date": date, "counts": counts})
+    read = app.read_daily_file
+    calls = []
+
+    def read_daily_file():
+        daily = read()
+        if not calls:  # another worker rewrites the file right after the request read it
+            calls.append(1)
+            backfilled = [{"date": "2026-01-01", "counts": {"A": 4}}, {"date": "2026-01-02", "counts": {"A": 8}},
+                          {"date": "2026-01-03", "counts": {"A": 9}}]
+            app.save_json(app.DAILY_FILE, {"days": backfilled}, push_to_github=False)
+        return daily
+
+    monkeypatch.setattr(app, "read_daily_file", read_daily_file)
+    days = app.app.test_client().get("/api/v1/daily").get_json()["days"]
+    assert [(d["date"], d["delta"]) for d in days] == [("2026-01-03", 5), ("2026-01-01", 4)]
@@ -0,0 +1,49 @@
+"""The daily snapshot scheduler writes each closed day once, from counts observed before its cutoff."""
+from datetime import datetime, timezone
+
+import pytest
+
+
+def _ts(day, hour, minute=0):
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+def _recorded(app):
+    return {date: dict(counts) for date, counts in app.iter_daily_counts(app.read_daily_file().get("days", []))}
+
+
+@pytest.fixture
+def scheduler(app, monkeypatch):
+    monkeypatch.setattr(app, "DAILY_SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(app, "DAILY_SNAPSHOT_CUTOFF", "23:55")
+    return app
+
+
+def test_first_run_does_not_label_todays_counts_as_yesterday(scheduler):
+    run = scheduler.run_daily_snapshot_job(now=_ts(10, 9), counts={"TEAM1": 4})
+    assert run["snapshots"] == [] and run["unobserved"] == ["2026-03-09"]
+    assert _recorded(scheduler) == {}
+
+    scheduler.run_daily_snapshot_job(now=_ts(10, 23, 0), counts={"TEAM1": 6})
+    scheduler.run_daily_snapshot_job(now=_ts(11, 8), counts={"TEAM1": 9})
+    assert _recorded(scheduler) == {"2026-03-10": {"TEAM1": 6}}  # last sync before 03-10's cutoff
+
+
+def test_unobserved_days_are_not_backfilled(scheduler):
+    scheduler.run_daily_snapshot_job(now=_ts(10, 12), counts={"TEAM1": 1})
+    scheduler.run_daily_snapshot_job(now=_ts(11, 12), counts={"TEAM1": 2})
+    # down from 03-11 12:00 until 03-15
+    run = scheduler.run_daily_snapshot_job(now=_ts(15, 12), counts={"TEAM1": 7})
+    assert [t["date"] for t in run["snapshots"]] == ["2026-03-11"]
+    assert run["unobserved"] == ["2026-03-12", "2026-03-13", "2026-03-14"]
+    assert _recorded(scheduler) == {"2026-03-10": {"TEAM1": 1}, "2026-03-11": {"TEAM1": 2}}
+
+
+def test_manual_and_lazy_paths_leave_today_to_the_scheduler(scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler, "_snapshot_counts", lambda: {"TEAM1": 3})
+    client = scheduler.app.test_client()
+    resp = client.post("/daily-progress/snapshot", headers={"X-Admin-Password": "ContactBatch321!"})
+    assert resp.get_json()["reason"] == "scheduled"
+    assert client.get("/daily-progress").status_code == 200
+    assert _recorded(scheduler) == {}  # today is still open
+    assert len(scheduler.daily_schedule_status()["observed_days"]) == 1  # counted once today closes
@@ -0,0 +1,107 @@
+"""_github_request against a local stub server: retries on 5xx, waits out rate limits, refuses calls meanwhile."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StubGitHub:
+    """Answers each request with the next scripted (status, headers); 200 once the script runs out."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.calls += 1
+                status, headers = stub.script.pop(0) if stub.script else (200, {})
+                body = b'{"message": "API rate limit exceeded"}' if status == 403 else b"{}"
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/repos/owner/repo/contents/x.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def github(app, monkeypatch):
+    """Start a stub with a script; time.sleep is recorded and advances time.time instead of waiting."""
+    sleeps = []
+    real_time = time.time
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(app.time, "sleep", fake_sleep)
+    monkeypatch.setattr(app.time, "time", lambda: real_time() + sum(sleeps))
+    monkeypatch.setattr(app, "GITHUB_RATE_LIMIT", {"remaining": None, "reset": None})
+    monkeypatch.setattr(app, "GITHUB_MAX_RETRIES", 3)
+    monkeypatch.setattr(app, "GITHUB_RETRY_BACKOFF", 0.5)
+    monkeypatch.setattr(app, "GITHUB_RATE_LIMIT_MAX_WAIT", 30)
+    stubs = []
+
+    def start(*script):
+        stub = StubGitHub(script)
+        stubs.append(stub)
+        return stub
+
+    start.sleeps = sleeps
+    yield start
+    for stub in stubs:
+        stub.close()
+
+
+def test_5xx_is_retried_with_backoff(app, github):
+    stub = github((502, {}), (502, {}))
+    assert app._github_request("GET", stub.url).status_code == 200
+    assert stub.calls == 3
+    assert github.sleeps == [0.5, 1.0]
+
+
+def test_5xx_gives_up_after_max_retries(app, github):
+    stub = github(*[(503, {})] * 10)
+    assert app._github_request("GET", stub.url).status_code == 503
+    assert stub.calls == app.GITHUB_MAX_RETRIES + 1
+
+
+def test_exhausted_rate_limit_waits_for_reset(app, github):
+    reset = int(app.time.time()) + 5
+    stub = github((403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}))
+    assert app._github_request("GET", stub.url).status_code == 200
+    assert stub.calls == 2
+    assert len(github.sleeps) == 1 and 3 < github.sleeps[0] <= 5
+
+
+def test_retry_after_is_honoured(app, github):
+    stub = github((429, {"Retry-After": "7"}))
+    assert app._github_request("GET", stub.url).status_code == 200
+    assert stub.calls == 2
+    assert github.sleeps == [7]
+
+
+def test_calls_are_refused_while_rate_limited(app, github):
+    reset = int(app.time.time()) + 3600
+    stub = github((403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}))
+    # the reset is further away than GITHUB_RATE_LIMIT_MAX_WAIT: the 403 comes back unretried
+    assert app._github_request("GET", stub.url).status_code == 403
+    assert stub.calls == 1
+    # and later calls fail fast without reaching GitHub until the window resets
+    with pytest.raises(RuntimeError, match="rate limit"):
+        app._github_request("GET", stub.url)
+    assert stub.calls == 1
+    assert github.sleeps == []
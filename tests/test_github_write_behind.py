@@ -0,0 +1,73 @@
+"""load_json must not replace a save that is still waiting for its GitHub push."""
+import json
+
+
+def _github_stub(app, monkeypatch, files):
+    """GitHub as a dict: fetch serves `files`, a batched commit updates it."""
+    monkeypatch.setattr(app, "GITHUB_TOKEN", "test-token")
+    monkeypatch.setattr(app, "GITHUB_REPO", "owner/repo")
+    monkeypatch.setattr(app, "JSON_CACHE_GITHUB_TTL", 0)  # every read would revalidate
+
+    def fetch(repo, path, branch=None, etag=None):
+        if path not in files:
+            return None
+        return {"status": 200, "content": files[path], "etag": None, "branch": "master"}
+
+    def commit(repo, pushed, message, branch="master"):
+        files.update(pushed)
+        return "sha"
+
+    monkeypatch.setattr(app, "_github_fetch_file", fetch)
+    monkeypatch.setattr(app, "_github_commit_files", commit)
+
+
+def _dates(app):
+    return [d["date"] for d in app.read_daily_file()["days"]]
+
+
+def test_pending_save_survives_revalidation(app, monkeypatch):
+    remote = {app.DAILY_FILE: json.dumps({"days": [{"date": "2026-01-01", "counts": {"A": 1}}]}).encode()}
+    _github_stub(app, monkeypatch, remote)
+
+    assert app.append_daily_snapshot({"date": "2026-01-02", "counts": {"A": 2}}) == (True, "saved")
+    assert app.github_push_pending(app.DAILY_FILE)
+    # GitHub still has only 01-01; the queued save must win
+    assert _dates(app) == ["2026-01-01", "2026-01-02"]
+
+    assert app.append_daily_snapshot({"date": "2026-01-03", "counts": {"A": 3}}) == (True, "saved")
+    assert _dates(app) == ["2026-01-01", "2026-01-02", "2026-01-03"]
+
+    assert app.flush_github_queue()["ok"]
+    assert not app.github_push_pending(app.DAILY_FILE)
+    assert [d["date"] for d in json.loads(remote[app.DAILY_FILE])["days"]] == ["2026-01-01", "2026-01-02", "2026-01-03"]
+    assert _dates(app) == ["2026-01-01", "2026-01-02", "2026-01-03"]
+
+
+def test_failed_push_keeps_local_copy_authoritative(app, monkeypatch):
+    remote = {app.REF_FILE: b'{"ALL": {}}'}
+    _github_stub(app, monkeypatch, remote)
+
+    def failing_commit(repo, pushed, message, branch="master"):
+        raise RuntimeError("GitHub down")
+
+    app.save_json(app.REF_FILE, {"ALL": {"1": {"team_label": "TEAM1", "referrals": 5}}})
+    monkeypatch.setattr(app, "_github_commit_files", failing_commit)
+    assert "error" in app.flush_github_queue()
+    assert app.github_push_pending(app.REF_FILE)  # re-queued
+    assert app.load_json(app.REF_FILE, {})["ALL"]["1"]["referrals"] == 5
+
+
+def test_reads_during_flush_use_the_local_copy(app, monkeypatch):
+    remote = {app.REF_FILE: b'{"ALL": {}}'}
+    _github_stub(app, monkeypatch, remote)
+    seen = []
+
+    def slow_commit(repo, pushed, message, branch="master"):
+        seen.append(app.load_json(app.REF_FILE, {}))  # another thread reading mid-push
+        remote.update(pushed)
+        return "sha"
+
+    app.save_json(app.REF_FILE, {"ALL": {"1": {"team_label": "TEAM1", "referrals": 7}}})
+    monkeypatch.setattr(app, "_github_commit_files", slow_commit)
+    assert app.flush_github_queue()["ok"]
+    assert seen[0]["ALL"]["1"]["referrals"] == 7
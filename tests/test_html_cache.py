@@ -0,0 +1,28 @@
+"""The rendered-page cache and the data version it is keyed on."""
+
+
+def test_data_version_is_bumped_after_the_new_data_is_readable(app, monkeypatch):
+    app.save_json(app.REF_FILE, {"ALL": {}}, push_to_github=False)
+    seen = []
+    bump = app.bump_data_version
+
+    def bump_data_version():
+        seen.append(app.load_json(app.REF_FILE, {}))
+        bump()
+
+    monkeypatch.setattr(app, "bump_data_version", bump_data_version)
+    app.save_json(app.REF_FILE, {"ALL": {"1": {"referrals": 2}}}, push_to_github=False)
+    assert seen == [{"ALL": {"1": {"referrals": 2}}}]
+
+
+def test_cache_counters_are_exported_on_metrics(app, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_KEY", None)
+    app.bump_data_version()  # a page cached by an earlier test is stale
+    before = app.html_cache_status()
+    client = app.app.test_client()
+    client.get("/")
+    client.get("/")
+    lines = client.get("/metrics").get_data(as_text=True).splitlines()
+    assert f"html_cache_hits {before['hits'] + 1}" in lines
+    assert f"html_cache_misses {before['misses'] + 1}" in lines
+    assert any(line.startswith("html_cache_evictions ") for line in lines)
@@ -0,0 +1,97 @@
+"""An incremental sync (edits + deletes since the sync token) must land where a full resync does."""
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import fakes
+
+TOTAL = 600
+
+
+class ExpiringPeopleService(fakes.FakePeopleService):
+    """Rejects the sync token with a 410 once `expire_at` changed contacts have been served."""
+
+    def __init__(self, expire_at=0, **kwargs):
+        super().__init__(**kwargs)
+        self.expire_at = expire_at
+
+    def _page(self, start, size, sync_token):
+        if sync_token and start >= self.expire_at:
+            resp = httplib2.Response({"status": 410})
+            resp.reason = "Gone"
+            raise HttpError(resp, b'{"error": {"code": 410, "status": "EXPIRED_SYNC_TOKEN"}}')
+        return super()._page(start, size, sync_token)
+
+
+@pytest.fixture
+def people(app, monkeypatch):
+    """Point the sync at a fake People service; returns a setter for the service the next sync uses."""
+    monkeypatch.setattr(app, "SYNC_PAGE_SIZE", 50)
+    monkeypatch.setattr(app, "get_credentials", lambda: object())
+    app._write_user_log(fakes.make_users(40, solo_count=app.SOLO_COUNT, teams=7))
+    current = {}
+    monkeypatch.setattr(app, "build", lambda *a, **k: current["service"])
+
+    def use(service):
+        current["service"] = service
+        return service
+    return use
+
+
+def _changes(corpus):
+    """Edits, deletes and additions against `corpus`, and the corpus after them."""
+    edits = fakes.edit_contacts(60, TOTAL, seed=2)
+    deleted = [{"resourceName": c["resourceName"], "etag": c["etag"] + "-del", "metadata": {"deleted": True}}
+               for c in corpus[5:TOTAL:25]]
+    added = fakes.make_contacts_range(TOTAL, TOTAL + 30, seed=3)
+    after = {c["resourceName"]: c for c in corpus}
+    after.update((c["resourceName"], c) for c in edits)
+    for c in deleted:
+        after.pop(c["resourceName"], None)
+    after.update((c["resourceName"], c) for c in added)
+    return edits + deleted + added, list(after.values())
+
+
+def _referrals(app):
+    with open(app.REF_FILE, "rb") as f:
+        return json.load(f)
+
+
+def test_edits_and_deletes_match_a_full_resync(app, people):
+    corpus = fakes.make_corpus(TOTAL)
+    people(fakes.FakePeopleService(contacts=corpus))
+    assert app.fetch_contacts_and_update()["mode"] == "full"
+    before = _referrals(app)
+
+    changed, after = _changes(corpus)
+    service = people(fakes.FakePeopleService(contacts=after, changed=changed))
+    res = app.fetch_contacts_and_update()
+    assert (res["status"], res["mode"], res["fetched"]) == ("ok", "incremental", len(changed))
+    assert service.pages_served == -(-len(changed) // app.SYNC_PAGE_SIZE)
+    incremental = _referrals(app)
+    assert incremental != before
+
+    people(fakes.FakePeopleService(contacts=after))
+    assert app.fetch_contacts_and_update(full=True)["mode"] == "full"
+    assert incremental == _referrals(app)
+    assert any(e["referrals"] for group in incremental.values() for e in group.values())
+
+
+@pytest.mark.parametrize("expire_at", [0, 50], ids=["first-page", "mid-stream"])
+def test_expired_sync_token_falls_back_to_a_full_sync(app, people, expire_at):
+    corpus = fakes.make_corpus(TOTAL)
+    people(fakes.FakePeopleService(contacts=corpus))
+    app.fetch_contacts_and_update()
+
+    changed, after = _changes(corpus)
+    service = people(ExpiringPeopleService(expire_at=expire_at, contacts=after, changed=changed))
+    res = app.fetch_contacts_and_update()
+    assert (res["status"], res["mode"], res["fetched"]) == ("ok", "full", len(after))
+    assert app.load_sync_state()["sync_token"] == f"sync-{service.sync_tokens}"
+    fallback = _referrals(app)
+
+    people(fakes.FakePeopleService(contacts=after))
+    app.fetch_contacts_and_update(full=True)
+    assert fallback == _referrals(app)
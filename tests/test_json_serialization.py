@@ -0,0 +1,15 @@
+"""dumps_json output must not depend on whether orjson is installed."""
+import json
+
+import pytest
+
+DATA = [{"name": "Wale", "ref_id": "wale", "team_number": 1, "tags": ["a", "é"]}]
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+def test_pretty_output_matches_the_checked_in_format(app, monkeypatch, backend):
+    if backend == "orjson" and app.orjson is None:
+        pytest.skip("orjson not installed")
+    monkeypatch.setattr(app, "JSON_BACKEND", backend)
+    assert app.dumps_json(DATA, pretty=True) == json.dumps(DATA, indent=4).encode("utf-8")
+    assert json.loads(app.dumps_json(DATA)) == DATA
@@ -0,0 +1,21 @@
+"""Live-update streams: lock ordering between the SSE state and the referral file."""
+import threading
+
+
+def test_first_subscriber_does_not_hold_sse_lock_while_loading(app, monkeypatch):
+    monkeypatch.setattr(app, "_sse_state", dict(app._sse_state, view=None, stat=None))
+    app.update_leaderboard({"ALL": {"1": {"team_label": "TEAM1", "referrals": 1}}})
+    app._sse_state["view"] = None
+    load = app.get_leaderboard
+
+    def get_leaderboard():
+        # meanwhile register holds the REF_FILE lock and publishes its new leaderboard
+        writer = threading.Thread(target=app.publish_leaderboard, args=({"groups": {}},))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive(), "publish blocked on _sse_cond held by the subscriber"
+        return load()
+
+    monkeypatch.setattr(app, "get_leaderboard", get_leaderboard)
+    app._sse_start_watcher()
+    assert app._sse_state["view"] is not None
@@ -0,0 +1,43 @@
+"""Workers other than the updater leader must not run syncs alongside it."""
+import fcntl
+import time
+
+import pytest
+
+
+@pytest.fixture
+def coordinator(app, monkeypatch):
+    monkeypatch.setattr(app, "LAST_SYNC", {"at": None, "result": None, "started_at": None, "finished_at": None})
+    monkeypatch.setattr(app, "_updater_lock_fd", None)
+    calls = []
+
+    def fake_sync(**kwargs):
+        calls.append(kwargs)
+        return {"status": "ok"}
+
+    monkeypatch.setattr(app, "fetch_contacts_and_update", fake_sync)
+    return calls
+
+
+def test_sync_skipped_while_another_process_holds_the_lock(app, coordinator):
+    with open(app.SYNC_LOCK_FILE, "a") as other_worker:
+        fcntl.flock(other_worker.fileno(), fcntl.LOCK_EX)
+        assert app.run_sync(force=True)["status"] == "in-progress"
+    assert coordinator == []
+    assert app.run_sync(force=True)["status"] == "ok"
+    assert len(coordinator) == 1
+
+
+def test_followers_wait_past_the_leaders_schedule(app, coordinator, monkeypatch):
+    monkeypatch.setattr(app, "trigger_sync", lambda force=False: True)
+    due = time.time() - app.UPDATE_INTERVAL - 1
+    monkeypatch.setattr(app, "get_last_synced_at", lambda: due)
+    assert not app.trigger_sync_if_stale()  # the leader is about to sync
+
+    monkeypatch.setattr(app, "get_last_synced_at",
+                        lambda: time.time() - app.UPDATE_INTERVAL - app.UPDATER_POLL_INTERVAL - app.SYNC_STALE_MARGIN - 1)
+    assert app.trigger_sync_if_stale()  # the leader missed its slot
+
+    monkeypatch.setattr(app, "get_last_synced_at", lambda: due)
+    monkeypatch.setattr(app, "_updater_lock_fd", -1)
+    assert app.trigger_sync_if_stale()  # the leader itself keeps the plain interval
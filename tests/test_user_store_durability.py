@@ -0,0 +1,76 @@
+"""Without the Render disk, registrations must reach GitHub's data.json before a redeploy wipes users.jsonl."""
+import json
+import os
+
+import pytest
+
+
+def _github_stub(app, monkeypatch, remote):
+    monkeypatch.setattr(app, "GITHUB_TOKEN", "test-token")
+    monkeypatch.setattr(app, "GITHUB_REPO", "owner/repo")
+
+    def fetch(repo, path, branch=None, etag=None):
+        if path not in remote:
+            return None
+        return {"status": 200, "content": remote[path], "etag": None, "branch": "master"}
+
+    def commit(repo, pushed, message, branch="master"):
+        remote.update(pushed)
+        return "sha"
+
+    monkeypatch.setattr(app, "_github_fetch_file", fetch)
+    monkeypatch.setattr(app, "_github_commit_files", commit)
+
+
+def _user(ref_id, number):
+    return {"name": ref_id, "ref_id": ref_id, "registration_type": "team", "team_number": number,
+            "team_label": f"TEAM{number}"}
+
+
+def test_registrations_queue_a_data_export_without_a_disk(app, monkeypatch):
+    remote = {}
+    _github_stub(app, monkeypatch, remote)
+    monkeypatch.setattr(app, "USER_LOG_PERSISTENT", False)
+
+    app.add_user(_user("alice", 1))
+    app.add_user(_user("bob", 2))
+    app.update_user("bob", {"team_label": "TEAM2B"})
+    assert app.github_push_pending(app.DATA_FILE)  # one coalesced push for all three writes
+    with open(app.DATA_FILE, "rb") as f:
+        assert json.load(f) == []  # exported by the flush, not by each registration
+    assert app.flush_github_queue()["ok"]
+    users = json.loads(remote[app.DATA_FILE])
+    assert [(u["ref_id"], u["team_label"]) for u in users] == [("alice", "TEAM1"), ("bob", "TEAM2B")]
+
+    # redeploy: the log is gone, the new instance seeds it from GitHub's copy
+    os.remove(app.USER_LOG_FILE)
+    os.remove(app.DATA_FILE)
+    app._user_store.update(users=[], by_ref={}, counts={}, offset=0, ino=None)
+    app.invalidate_json_cache()
+    assert app.get_user("bob")["team_label"] == "TEAM2B"
+
+
+def test_add_user_does_not_write_data_file(app, monkeypatch):
+    _github_stub(app, monkeypatch, {})
+    monkeypatch.setattr(app, "USER_LOG_PERSISTENT", False)
+    monkeypatch.setattr(app, "save_json", lambda *a, **k: pytest.fail("add_user rewrote DATA_FILE"))
+
+    app.add_user(_user("dave", 4))
+    app.update_user("dave", {"team_label": "TEAM4B"})
+    assert app.github_push_pending(app.DATA_FILE)
+
+
+def test_persistent_log_is_exported_on_exit(app, monkeypatch):
+    remote = {}
+    _github_stub(app, monkeypatch, remote)
+    monkeypatch.setattr(app, "USER_LOG_PERSISTENT", True)
+
+    app.add_user(_user("carol", 3))
+    assert app.DATA_FILE not in remote and not app.github_push_pending(app.DATA_FILE)
+    assert app.flush_on_exit()["ok"]
+    assert [u["ref_id"] for u in json.loads(remote[app.DATA_FILE])] == ["carol"]
+
+
+def test_exit_without_the_log_writes_nothing(app, tmp_path):
+    app.flush_on_exit()  # e.g. a CLI command or a test run that never touched the user store
+    assert not (tmp_path / app.DATA_FILE).exists() and not (tmp_path / app.USER_LOG_FILE).exists()